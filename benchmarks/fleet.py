@@ -0,0 +1,106 @@
+"""Synthetic device fleet shared by the benchmark stand-ins.
+
+Device N (1-based) is derived from its number alone, so the stand-in Netbox and the simulated
+SNMP agents agree on every device without exchanging any state.
+"""
+
+# SNMPv3 credentials the simulated agents accept
+SNMP_USER = "bench"
+SNMP_AUTH = "benchauth123"
+SNMP_PRIV = "benchpriv123"
+
+# Device role and site every synthetic device is in
+ROLE = "production-switches"
+SITE = "bench-site"
+
+# Hardware models; each is one Netbox device type
+MODELS = ["C9300-48P", "C9200L-24T", "C9500-16X"]
+SOFTWARE_VERSION = "17.9.4"
+
+# OIDs configured on every synthetic device type (standard MIB-II / ENTITY-MIB objects)
+OIDS = {
+    "snmp_sn_oid": "1.3.6.1.2.1.47.1.1.1.1.11.1",
+    "snmp_sysname_oid": "1.3.6.1.2.1.1.5.0",
+    "snmp_hwmodel_oid": "1.3.6.1.2.1.47.1.1.1.1.13.1",
+    "snmp_swversion_oid": "1.3.6.1.2.1.47.1.1.1.1.10.1",
+    "snmp_sysuptime_oid": "1.3.6.1.2.1.1.3.0",
+}
+
+# Access ports of every synthetic device, GigabitEthernet1/0/1 to 1/0/PORTS (ifIndex 1 to PORTS)
+PORTS = 48
+
+# ifTable/ifXTable column OIDs the simulated agents answer for every port
+IF_COLUMNS = {
+    "descr": "1.3.6.1.2.1.2.2.1.2",
+    "type": "1.3.6.1.2.1.2.2.1.3",
+    "admin_status": "1.3.6.1.2.1.2.2.1.7",
+    "oper_status": "1.3.6.1.2.1.2.2.1.8",
+    "name": "1.3.6.1.2.1.31.1.1.1.1",
+    "speed": "1.3.6.1.2.1.31.1.1.1.15",
+    "alias": "1.3.6.1.2.1.31.1.1.1.18",
+}
+
+# Every VC_SIZE consecutive devices starting at a multiple of VC_EVERY form a virtual chassis
+VC_EVERY = 20
+VC_SIZE = 2
+
+# Largest fleet device_ip() can address
+MAX_DEVICES = 65535 * 254
+
+
+def device_ip(number: int) -> str:
+    """Loopback address of device N. Linux routes all of 127.0.0.0/8 to lo, so each device gets
+    its own address without any interface setup.
+    """
+    high, low = divmod(number, 65536)
+    return f"127.{high + 1}.{low >> 8}.{low & 255}"
+
+
+def device_number(ip: str) -> int:
+    """Inverse of device_ip()."""
+    _, high, mid, low = (int(part) for part in ip.split("."))
+    return (high - 1) * 65536 + (mid << 8) + low
+
+
+def model_id(number: int) -> int:
+    return number % len(MODELS) + 1
+
+
+def vc_id(number: int) -> int:
+    """Virtual chassis id of device N, or None. The lowest-numbered member is the master."""
+    if number % VC_EVERY < VC_SIZE:
+        return number // VC_EVERY + 1
+    return None
+
+
+def device_values(number: int) -> dict:
+    """Values device N reports over SNMP, keyed like the Netbox OID custom fields."""
+    return {
+        "snmp_sn_oid": f"SN{number:08}",
+        "snmp_sysname_oid": f"bench-sw{number:05}.bench.local",
+        "snmp_hwmodel_oid": MODELS[model_id(number) - 1],
+        "snmp_swversion_oid": SOFTWARE_VERSION,
+        "snmp_sysuptime_oid": 100 * (3600 + number),
+    }
+
+
+def interface_id(number: int, port: int) -> int:
+    """Netbox id of device N's port."""
+    return (number - 1) * PORTS + port
+
+
+def interface_values(number: int, port: int) -> dict:
+    """What device N reports for one port, keyed like IF_COLUMNS. Netbox holds the same data.
+
+    Every 12th port is shut down; odd ports are cabled and up, even ports uncabled and down.
+    """
+    enabled = port % 12 != 0
+    return {
+        "descr": f"GigabitEthernet1/0/{port}",
+        "type": 6,
+        "admin_status": 1 if enabled else 2,
+        "oper_status": 1 if enabled and port % 2 else 2,
+        "name": f"Gi1/0/{port}",
+        "speed": 1000,
+        "alias": f"bench-sw{number:05} port {port}",
+    }
@@ -0,0 +1,238 @@
+"""Offline benchmarks of the entry points against a stand-in Netbox and a simulated SNMPv3 fleet.
+
+Each run starts the stand-ins in their own processes, runs one entry point's main() in a fresh
+process (so its peak RSS is its own) and reports devices/sec, HTTP requests served, SNMP packets
+exchanged and peak RSS. Linux only: the simulated devices live on 127.0.0.0/8 addresses.
+
+    python benchmarks/run_benchmarks.py -scenario 1k
+    python benchmarks/run_benchmarks.py -scenario 10k -target compliance -mode async -concurrency 100
+    python benchmarks/run_benchmarks.py -scenario 1k -latency 0.02 -loss 0.01 -dead 0.02 -out bench.json
+    python benchmarks/run_benchmarks.py -scenario 1k -target compliance -interfaces -max_repetitions 50
+"""
+
+# Standard Library
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import resource
+import socket
+import sys
+import tempfile
+import time
+import urllib.request
+
+BENCHMARKS_PATH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS_PATH)
+sys.path.insert(0, os.path.join(BENCHMARKS_PATH, "..", "src"))
+
+# Custom imports
+import fleet
+import snmp_fleet
+import standin_netbox
+
+# Fleet size of each named scenario
+SCENARIOS = {"1k": 1000, "10k": 10000, "50k": 50000}
+
+TARGETS = ("compliance", "ssh_config")
+
+# Fresh interpreters, so neither stand-ins nor targets inherit the runner's memory
+_context = multiprocessing.get_context("spawn")
+
+
+def run_benchmark(
+    target: str,
+    devices: int,
+    options: snmp_fleet.FleetOptions = None,
+    agents: int = 1,
+    mode: str = "async",
+    concurrency: int = 50,
+    page_size: int = 1000,
+    threaded: bool = False,
+    interfaces: bool = False,
+    max_repetitions: int = 25,
+) -> dict:
+    """Runs one entry point against freshly started stand-ins.
+
+    Args:
+        target (str): 'compliance' (base_compliancy.main) or 'ssh_config' (openssh_config.main).
+        devices (int): Size of the synthetic fleet.
+        options (snmp_fleet.FleetOptions, optional): Latency/fault injection of the SNMP fleet. Defaults to none.
+        agents (int, optional): Processes sharing the simulated fleet's SNMP port. Defaults to 1.
+        mode (str, optional): base_compliancy mode. Defaults to "async".
+        concurrency (int, optional): base_compliancy concurrency. Defaults to 50.
+        page_size (int, optional): Objects fetched per Netbox page. Defaults to 1000.
+        threaded (bool, optional): Fetch Netbox pages in parallel. Defaults to False.
+        interfaces (bool, optional): Also run base_compliancy's interface checks. Defaults to False.
+        max_repetitions (int, optional): Rows per GETBULK response of the interface walk. Defaults to 25.
+
+    Returns:
+        dict: The run's settings and measurements.
+    """
+
+    counters = {name: _context.Value("q", 0) for name in ("requests", "received", "sent", "dropped")}
+    http_port, snmp_port = _free_port(socket.SOCK_STREAM), _free_port(socket.SOCK_DGRAM)
+    url = f"http://127.0.0.1:{http_port}"
+
+    standins = [_context.Process(target=standin_netbox.serve, args=(http_port, devices, counters), daemon=True)]
+    if target == "compliance":
+        standins += [
+            _context.Process(target=snmp_fleet.serve, args=(snmp_port, options, counters), daemon=True)
+            for _ in range(agents)
+        ]
+    for process in standins:
+        process.start()
+
+    try:
+        _wait_for_netbox(url)
+        time.sleep(0.5 if target == "compliance" else 0)
+        counters["requests"].value = 0
+
+        results = _context.Queue()
+        child = _context.Process(
+            target=_run_target,
+            args=(results, target, url, snmp_port, mode, concurrency, page_size, threaded, interfaces, max_repetitions),
+        )
+        child.start()
+        measured = results.get()
+        child.join()
+    finally:
+        for process in standins:
+            process.terminate()
+            process.join()
+
+    return {
+        "target": target,
+        "devices": devices,
+        "mode": mode if target == "compliance" else None,
+        "concurrency": concurrency if target == "compliance" else None,
+        "page_size": page_size,
+        "threaded": threaded,
+        "interfaces": interfaces if target == "compliance" else None,
+        "max_repetitions": max_repetitions if target == "compliance" and interfaces else None,
+        "seconds": round(measured["seconds"], 3),
+        "devices_per_second": round(devices / measured["seconds"], 1),
+        "http_requests": counters["requests"].value,
+        "snmp_packets_in": counters["received"].value,
+        "snmp_packets_out": counters["sent"].value,
+        "snmp_packets_dropped": counters["dropped"].value,
+        "peak_rss_mb": round(measured["peak_rss_kb"] / 1024, 1),
+    }
+
+
+def _run_target(results, target, url, snmp_port, mode, concurrency, page_size, threaded, interfaces, max_repetitions):
+    sys.path.insert(0, os.path.join(BENCHMARKS_PATH, "..", "src"))
+    os.environ.update(snmp_user=fleet.SNMP_USER, snmp_auth=fleet.SNMP_AUTH, snmp_priv=fleet.SNMP_PRIV)
+
+    # Imported here, so their import time is not measured by the runner but is part of the child's RSS
+    from utils import netbox_utils
+    filters = netbox_utils.build_device_filters(roles=[fleet.ROLE])
+
+    with tempfile.TemporaryDirectory() as out_dir, open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        # Targets write to paths relative to the working directory (e.g. openssh_config's artifacts/config),
+        # which must never be the checkout
+        os.chdir(out_dir)
+        started = time.perf_counter()
+        if target == "compliance":
+            import base_compliancy
+            base_compliancy.main(
+                url,
+                "bench-token",
+                mode=mode,
+                concurrency=concurrency,
+                snmp_port=snmp_port,
+                page_size=page_size,
+                threaded=threaded,
+                filters=filters,
+                interfaces=interfaces,
+                max_repetitions=max_repetitions,
+            )
+        else:
+            import openssh_config
+            openssh_config.main(
+                ssh_user="bench.a",
+                api_token="bench-token",
+                url=url,
+                page_size=page_size,
+                threaded=threaded,
+                filters=filters,
+                out_dir=out_dir,
+            )
+        seconds = time.perf_counter() - started
+
+    results.put({"seconds": seconds, "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss})
+
+
+def _free_port(kind) -> int:
+    with socket.socket(socket.AF_INET, kind) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_netbox(url: str, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            urllib.request.urlopen(f"{url}/api/", timeout=1).close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmarks against a stand-in Netbox and a simulated SNMPv3 fleet")
+    parser.add_argument("-scenario", choices=SCENARIOS.keys(), nargs="+", default=["1k"], help="Fleet sizes to run")
+    parser.add_argument("-target", choices=[*TARGETS, "all"], default="all", help="Entry point to benchmark")
+    parser.add_argument("-mode", choices=["sync", "async", "stream"], default="async", help="base_compliancy mode")
+    parser.add_argument("-concurrency", type=int, default=50, help="base_compliancy concurrency")
+    parser.add_argument("-page_size", type=int, default=1000, help="Objects fetched per Netbox page")
+    parser.add_argument("-threaded", action="store_true", help="Fetch Netbox pages in parallel")
+    parser.add_argument("-interfaces", action="store_true", help="Also run base_compliancy's interface checks")
+    parser.add_argument("-max_repetitions", type=int, default=25, help="Rows per GETBULK response of the interface walk")
+    parser.add_argument("-agents", type=int, default=1, help="Processes answering for the simulated SNMP fleet")
+    parser.add_argument("-latency", type=float, default=0.0, help="Seconds each SNMP packet is delayed")
+    parser.add_argument("-jitter", type=float, default=0.0, help="Uniform extra SNMP delay of up to this many seconds")
+    parser.add_argument("-loss", type=float, default=0.0, help="Probability an SNMP packet is dropped")
+    parser.add_argument("-dead", type=float, default=0.0, help="Share of devices that never answer SNMP")
+    parser.add_argument("-mismatch", type=float, default=0.0, help="Share of devices reporting a wrong serial number")
+    parser.add_argument("-no_such_oid", type=float, default=0.0, help="Share of devices missing the serial-number OID")
+    parser.add_argument("-seed", type=int, default=1, help="Seed making the injected faults repeatable")
+    parser.add_argument("-out", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    options = snmp_fleet.FleetOptions(
+        latency=args.latency,
+        jitter=args.jitter,
+        loss=args.loss,
+        dead=args.dead,
+        mismatch=args.mismatch,
+        no_such_oid=args.no_such_oid,
+        seed=args.seed,
+    )
+    targets = TARGETS if args.target == "all" else [args.target]
+
+    runs = []
+    for scenario in args.scenario:
+        for target in targets:
+            result = run_benchmark(
+                target,
+                SCENARIOS[scenario],
+                options=options,
+                agents=args.agents,
+                mode=args.mode,
+                concurrency=args.concurrency,
+                page_size=args.page_size,
+                threaded=args.threaded,
+                interfaces=args.interfaces,
+                max_repetitions=args.max_repetitions,
+            )
+            result["scenario"] = scenario
+            runs.append(result)
+            print(json.dumps(result))
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"fault_injection": vars(options), "runs": runs}, f, indent=2)
@@ -0,0 +1,249 @@
+"""Simulated SNMPv3 fleet: pysnmp agents answering for every device of the synthetic fleet.
+
+GET is answered for the device-type OIDs, GETNEXT and GETBULK walk the device's ifTable/ifXTable.
+
+Each agent process listens on 0.0.0.0:<port> with IP_PKTINFO, so it sees which loopback address
+a request was sent to (device N lives at fleet.device_ip(N)) and answers from that same address.
+Responses carry device N's own values. Latency, packet loss, dead devices, wrong serials and
+missing OIDs can be injected. Several agent processes can share the port (SO_REUSEPORT); the
+kernel spreads the devices across them by address, each device always reaching the same one.
+"""
+
+# Standard Library
+import bisect
+import functools
+import heapq
+import random
+import socket
+import time
+
+# Non-Standard Library
+from pysnmp.carrier.asyncore.dgram import udp
+from pysnmp.entity import config, engine
+from pysnmp.entity.rfc3413 import cmdrsp, context
+from pysnmp.proto.api import v2c
+
+# Custom imports
+import fleet
+
+# Timer resolution of the agent's dispatcher, i.e. the granularity of injected latency
+TICK = 0.01
+
+
+class FleetOptions:
+    """Fault injection settings of a SimulatedFleet."""
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        loss: float = 0.0,
+        dead: float = 0.0,
+        mismatch: float = 0.0,
+        no_such_oid: float = 0.0,
+        seed: int = 1,
+    ):
+        """
+        Args:
+            latency (float, optional): Seconds each packet is held before the agent processes it. Defaults to 0.
+            jitter (float, optional): Uniform extra delay of up to this many seconds. Defaults to 0.
+            loss (float, optional): Probability that a packet is dropped. Defaults to 0.
+            dead (float, optional): Share of devices that never answer. Defaults to 0.
+            mismatch (float, optional): Share of devices reporting a serial number Netbox doesn't have. Defaults to 0.
+            no_such_oid (float, optional): Share of devices without the serial-number OID. Defaults to 0.
+            seed (int, optional): Seed making the injected faults repeatable. Defaults to 1.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.dead = dead
+        self.mismatch = mismatch
+        self.no_such_oid = no_such_oid
+        self.seed = seed
+
+    def device_fault(self, number: int) -> str:
+        """Returns the fault device N has ('dead', 'mismatch', 'no_such_oid') or None."""
+        draw = random.Random(self.seed * 1000003 + number).random()
+        for fault in ("dead", "mismatch", "no_such_oid"):
+            share = getattr(self, fault)
+            if draw < share:
+                return fault
+            draw -= share
+        return None
+
+
+class SimulatedFleet:
+    """Runs the simulated agents until the process is stopped. Counts packets in and out."""
+
+    def __init__(self, port: int, options: FleetOptions = None, counters: dict = None):
+        """
+        Args:
+            port (int): UDP port every simulated agent listens on.
+            options (FleetOptions, optional): Fault injection. Defaults to none.
+            counters (dict, optional): Shared 'received'/'sent'/'dropped' multiprocessing.Values to count into.
+                Defaults to None (not counted).
+        """
+        self.options = options or FleetOptions()
+        self.counters = counters
+        self._random = random.Random(self.options.seed)
+        self._delayed = []
+        self._sequence = 0
+
+        self.snmp_engine = engine.SnmpEngine()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        transport = _FleetTransport(sock=sock).openServerMode(("0.0.0.0", port)).enablePktInfo()
+        transport.fleet = self
+        config.addTransport(self.snmp_engine, udp.domainName, transport)
+        config.addV3User(
+            self.snmp_engine,
+            fleet.SNMP_USER,
+            config.usmHMACSHAAuthProtocol, fleet.SNMP_AUTH,
+            config.usmAesCfb128Protocol, fleet.SNMP_PRIV,
+        )
+        config.addVacmUser(self.snmp_engine, 3, fleet.SNMP_USER, "authPriv", (1, 3, 6), (1, 3, 6))
+
+        snmp_context = context.SnmpContext(self.snmp_engine)
+        _FleetResponder(self.snmp_engine, snmp_context, self)
+
+        dispatcher = self.snmp_engine.transportDispatcher
+        dispatcher.setTimerResolution(TICK)
+        dispatcher.registerTimerCbFun(self._release_delayed)
+
+    def run(self):
+        dispatcher = self.snmp_engine.transportDispatcher
+        dispatcher.jobStarted(1)
+        dispatcher.runDispatcher()
+
+    def receive(self, transport, transport_address, message, deliver):
+        self._count("received")
+
+        number = _number(transport_address)
+        if number is None or self.options.device_fault(number) == "dead" or self._random.random() < self.options.loss:
+            self._count("dropped")
+            return
+
+        delay = self.options.latency + self._random.random() * self.options.jitter
+        if delay <= 0:
+            deliver(transport, transport_address, message)
+            return
+
+        self._sequence += 1
+        heapq.heappush(self._delayed, (time.monotonic() + delay, self._sequence, deliver, transport, transport_address, message))
+
+    def respond(self, number: int, oids: list) -> list:
+        fault = self.options.device_fault(number)
+        values = fleet.device_values(number)
+        if fault == "mismatch":
+            values["snmp_sn_oid"] = f"XX{number:08}"
+        by_oid = {oid: (field, values[field]) for field, oid in fleet.OIDS.items()}
+
+        var_binds = []
+        for oid in oids:
+            field, value = by_oid.get(str(oid), (None, None))
+            if field is None or (fault == "no_such_oid" and field == "snmp_sn_oid"):
+                var_binds.append((oid, v2c.NoSuchObject()))
+            elif field == "snmp_sysuptime_oid":
+                var_binds.append((oid, v2c.TimeTicks(value)))
+            else:
+                var_binds.append((oid, v2c.OctetString(value)))
+        return var_binds
+
+    def respond_next(self, number: int, oids: list, non_repeaters: int = 0, max_repetitions: int = 1) -> list:
+        """Answers GETNEXT (the defaults) and GETBULK from the device's interface table."""
+        names, values = _interface_table(number)
+
+        def next_var_bind(oid):
+            position = bisect.bisect_right(names, tuple(oid))
+            if position == len(names):
+                return oid, v2c.EndOfMibView()
+            return v2c.ObjectIdentifier(names[position]), values[position]
+
+        var_binds = [next_var_bind(oid) for oid in oids[:non_repeaters]]
+        repeaters = oids[non_repeaters:]
+        for _ in range(max_repetitions if repeaters else 0):
+            row = [next_var_bind(oid) for oid in repeaters]
+            var_binds.extend(row)
+            repeaters = [name for name, _ in row]
+        return var_binds
+
+    def _release_delayed(self, time_now):
+        now = time.monotonic()
+        while self._delayed and self._delayed[0][0] <= now:
+            _, _, deliver, transport, transport_address, message = heapq.heappop(self._delayed)
+            deliver(transport, transport_address, message)
+
+    def _count(self, counter: str):
+        if self.counters is not None:
+            value = self.counters[counter]
+            with value.get_lock():
+                value.value += 1
+
+
+class _FleetTransport(udp.UdpTransport):
+    fleet = None
+
+    def registerCbFun(self, cbFun):
+        # Route incoming packets through the fleet, which drops or delays them before the engine sees them
+        deliver = cbFun
+        udp.UdpTransport.registerCbFun(
+            self, lambda transport, address, message: self.fleet.receive(transport, address, message, deliver)
+        )
+
+    def sendMessage(self, outgoingMessage, transportAddress):
+        self.fleet._count("sent")
+        udp.UdpTransport.sendMessage(self, outgoingMessage, transportAddress)
+
+
+class _FleetResponder(cmdrsp.CommandResponderBase):
+    pduTypes = (v2c.GetRequestPDU.tagSet, v2c.GetNextRequestPDU.tagSet, v2c.GetBulkRequestPDU.tagSet)
+
+    def __init__(self, snmp_engine, snmp_context, simulated_fleet: SimulatedFleet):
+        self.fleet = simulated_fleet
+        cmdrsp.CommandResponderBase.__init__(self, snmp_engine, snmp_context)
+
+    def handleMgmtOperation(self, snmpEngine, stateReference, contextName, PDU, acInfo):
+        _, transport_address = snmpEngine.msgAndPduDsp.getTransportInfo(stateReference)
+        oids = [oid for oid, _ in v2c.apiPDU.getVarBinds(PDU)]
+        number = _number(transport_address)
+        if PDU.tagSet == v2c.GetBulkRequestPDU.tagSet:
+            var_binds = self.fleet.respond_next(
+                number, oids, v2c.apiBulkPDU.getNonRepeaters(PDU), v2c.apiBulkPDU.getMaxRepetitions(PDU)
+            )
+        elif PDU.tagSet == v2c.GetNextRequestPDU.tagSet:
+            var_binds = self.fleet.respond_next(number, oids)
+        else:
+            var_binds = self.fleet.respond(number, oids)
+        self.sendVarBinds(snmpEngine, stateReference, 0, 0, var_binds)
+        self.releaseStateInformation(stateReference)
+
+
+@functools.lru_cache(maxsize=256)
+def _interface_table(number: int) -> tuple:
+    # (sorted OID tuples, their values) of the device's ifTable/ifXTable columns
+    cells = []
+    for port in range(1, fleet.PORTS + 1):
+        values = fleet.interface_values(number, port)
+        for field, oid in fleet.IF_COLUMNS.items():
+            value = values[field]
+            if isinstance(value, str):
+                value = v2c.OctetString(value)
+            elif field == "speed":
+                value = v2c.Gauge32(value)
+            else:
+                value = v2c.Integer(value)
+            cells.append((tuple(int(part) for part in oid.split(".")) + (port,), value))
+    cells.sort(key=lambda cell: cell[0])
+    return [name for name, _ in cells], [value for _, value in cells]
+
+
+def _number(transport_address) -> int:
+    local_ip = transport_address.getLocalAddress()[0]
+    if not local_ip.startswith("127.") or local_ip.startswith("127.0."):
+        return None
+    return fleet.device_number(local_ip)
+
+
+def serve(port: int, options: FleetOptions = None, counters: dict = None):
+    """Process entry point: runs a SimulatedFleet forever."""
+    SimulatedFleet(port, options, counters).run()
@@ -0,0 +1,251 @@
+"""Stand-in Netbox REST API serving the synthetic fleet.
+
+Implements the part of the API the entry points use: paginated, filtered dcim/devices,
+dcim/device-types, dcim/interfaces, dcim/virtual-chassis and ipam/ip-addresses, plus single-object reads. Objects
+are built from fleet.py on demand, page by page, so a 50k-device fleet costs no memory up front.
+"""
+
+# Standard Library
+import json
+import re
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+# Custom imports
+import fleet
+
+LAST_UPDATED = "2026-01-01T00:00:00.000000Z"
+
+# Query parameters that control paging/shape rather than select objects
+PAGING_PARAMETERS = ("limit", "offset", "brief", "ordering")
+
+
+class StandInNetbox(ThreadingHTTPServer):
+    """Threaded HTTP server answering for a fleet of `devices` synthetic devices."""
+
+    daemon_threads = True
+
+    def __init__(self, port: int, devices: int, counters: dict = None):
+        """
+        Args:
+            port (int): TCP port to listen on (127.0.0.1 only).
+            devices (int): Size of the synthetic fleet.
+            counters (dict, optional): Shared 'requests' multiprocessing.Value to count into. Defaults to None.
+        """
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.devices = devices
+        self.counters = counters
+
+    # Object builders
+
+    def base_url(self, host: str) -> str:
+        return f"http://{host}/api"
+
+    def device(self, number: int, host: str, brief: bool = False) -> dict:
+        url = f"{self.base_url(host)}/dcim/devices/{number}/"
+        name = f"bench-sw{number:05}"
+        if brief:
+            return {"id": number, "url": url, "display": name, "name": name}
+
+        model_id = fleet.model_id(number)
+        vc_id = fleet.vc_id(number)
+        values = fleet.device_values(number)
+        return {
+            "id": number,
+            "url": url,
+            "display": name,
+            "name": name,
+            "serial": values["snmp_sn_oid"],
+            "status": {"value": "active", "label": "Active"},
+            "role": {"id": 1, "url": f"{self.base_url(host)}/dcim/device-roles/1/", "display": fleet.ROLE, "name": fleet.ROLE, "slug": fleet.ROLE},
+            "site": {"id": 1, "url": f"{self.base_url(host)}/dcim/sites/1/", "display": fleet.SITE, "name": fleet.SITE, "slug": fleet.SITE},
+            "tenant": None,
+            "tags": [],
+            "device_type": self.device_type(model_id, host, brief=True),
+            "platform": {"id": 1, "url": f"{self.base_url(host)}/dcim/platforms/1/", "display": fleet.SOFTWARE_VERSION, "name": fleet.SOFTWARE_VERSION, "slug": "iosxe"},
+            "primary_ip4": self.ip_address(number, host, brief=True),
+            "virtual_chassis": self.virtual_chassis(vc_id, host, brief=True) if vc_id else None,
+            "last_updated": LAST_UPDATED,
+        }
+
+    def device_type(self, type_id: int, host: str, brief: bool = False) -> dict:
+        model = fleet.MODELS[type_id - 1]
+        device_type = {
+            "id": type_id,
+            "url": f"{self.base_url(host)}/dcim/device-types/{type_id}/",
+            "display": model,
+            "model": model,
+            "slug": model.lower(),
+        }
+        if not brief:
+            device_type["custom_fields"] = dict(fleet.OIDS)
+            device_type["last_updated"] = LAST_UPDATED
+        return device_type
+
+    def ip_address(self, number: int, host: str, brief: bool = False) -> dict:
+        address = f"{fleet.device_ip(number)}/32"
+        ip_address = {
+            "id": number,
+            "url": f"{self.base_url(host)}/ipam/ip-addresses/{number}/",
+            "display": address,
+            "address": address,
+        }
+        if not brief:
+            ip_address["dns_name"] = f"bench-sw{number:05}.bench.local"
+            ip_address["last_updated"] = LAST_UPDATED
+        return ip_address
+
+    def virtual_chassis(self, vc_id: int, host: str, brief: bool = False) -> dict:
+        virtual_chassis = {
+            "id": vc_id,
+            "url": f"{self.base_url(host)}/dcim/virtual-chassis/{vc_id}/",
+            "display": f"bench-vc{vc_id:05}",
+            "name": f"bench-vc{vc_id:05}",
+        }
+        if not brief:
+            master = (vc_id - 1) * fleet.VC_EVERY or 1
+            virtual_chassis["master"] = self.device(master, host, brief=True)
+            virtual_chassis["last_updated"] = LAST_UPDATED
+        return virtual_chassis
+
+    def interface(self, interface_id: int, host: str, brief: bool = False) -> dict:
+        number, port = divmod(interface_id - 1, fleet.PORTS)
+        number, port = number + 1, port + 1
+        values = fleet.interface_values(number, port)
+        interface = {
+            "id": interface_id,
+            "url": f"{self.base_url(host)}/dcim/interfaces/{interface_id}/",
+            "display": values["descr"],
+            "name": values["descr"],
+            "device": self.device(number, host, brief=True),
+        }
+        if not brief:
+            interface["type"] = {"value": "1000base-t", "label": "1000BASE-T (1GE)"}
+            interface["enabled"] = values["admin_status"] == 1
+            interface["description"] = values["alias"]
+            interface["speed"] = values["speed"] * 1000
+            interface["mark_connected"] = False
+            interface["cable"] = {"id": interface_id, "display": f"#{interface_id}"} if port % 2 else None
+            interface["last_updated"] = LAST_UPDATED
+        return interface
+
+    # Endpoints: object ids matching the query, and the builder for one object
+
+    def endpoint(self, path: str):
+        vc_count = self.devices // fleet.VC_EVERY + 1
+        return {
+            "dcim/devices": (self.devices, self.device, self._device_matches),
+            "dcim/device-types": (len(fleet.MODELS), self.device_type, self._device_type_matches),
+            "dcim/interfaces": (self.devices * fleet.PORTS, self.interface, self._interface_matches),
+            "ipam/ip-addresses": (self.devices, self.ip_address, self._always),
+            "dcim/virtual-chassis": (vc_count, self.virtual_chassis, self._always),
+        }.get(path)
+
+    def _device_matches(self, query: dict) -> bool:
+        expected = {"status": "active", "role": fleet.ROLE, "site": fleet.SITE}
+        for field, values in query.items():
+            if field in expected and expected[field] not in values:
+                return False
+            if field in ("tag", "tenant"):
+                return False
+        return True
+
+    def _device_type_matches(self, query: dict):
+        models = query.get("model")
+        return lambda type_id: models is None or fleet.MODELS[type_id - 1] in models
+
+    def _interface_matches(self, query: dict) -> bool:
+        # device_id is resolved to interface ids by _select; the whole fleet is in one site
+        return all(fleet.SITE in values for field, values in query.items() if field == "site")
+
+    def _always(self, query: dict) -> bool:
+        return True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        if server.counters is not None:
+            with server.counters["requests"].get_lock():
+                server.counters["requests"].value += 1
+
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+        host = self.headers["Host"]
+        path = parsed.path.strip("/")
+
+        if path in ("api", "api/status"):
+            return self._send({"netbox-version": "4.0.0"})
+        if not path.startswith("api/"):
+            return self._send({"detail": "Not found."}, status=404)
+        path = path[len("api/"):]
+
+        single = re.match(r"(.+)/(\d+)$", path)
+        endpoint = server.endpoint(single.group(1) if single else path)
+        if endpoint is None:
+            return self._send({"detail": "Not found."}, status=404)
+        count, build, matches = endpoint
+
+        if single:
+            object_id = int(single.group(2))
+            if not 1 <= object_id <= count:
+                return self._send({"detail": "Not found."}, status=404)
+            return self._send(build(object_id, host))
+
+        ids = self._select(count, query, matches)
+        limit = int(query.get("limit", ["50"])[0]) or 1000
+        offset = int(query.get("offset", ["0"])[0])
+        brief = query.get("brief", ["false"])[0].lower() in ("1", "true")
+        page = [build(object_id, host, brief=brief) for object_id in ids[offset:offset + limit]]
+
+        next_url = None
+        if offset + limit < len(ids):
+            next_query = {key: values for key, values in query.items() if key not in ("limit", "offset")}
+            next_query.update(limit=[limit], offset=[offset + limit])
+            next_url = f"http://{host}{parsed.path}?{urlencode(next_query, doseq=True)}"
+
+        self._send({"count": len(ids), "next": next_url, "previous": None, "results": page})
+
+    def _select(self, count: int, query: dict, matches) -> list:
+        selection = {key: values for key, values in query.items() if key not in PAGING_PARAMETERS}
+
+        if "id" in selection:
+            ids = sorted({int(object_id) for object_id in selection.pop("id") if 1 <= int(object_id) <= count})
+        elif "device_id" in selection:
+            # Only dcim/interfaces is filtered by device
+            numbers = sorted({int(number) for number in selection.pop("device_id") if 1 <= int(number) <= self.server.devices})
+            ids = [fleet.interface_id(number, port) for number in numbers for port in range(1, fleet.PORTS + 1)]
+        else:
+            ids = range(1, count + 1)
+
+        # Every synthetic object was last updated at LAST_UPDATED
+        if any(LAST_UPDATED < value for value in selection.pop("last_updated__gte", [])):
+            return []
+
+        name_regex = selection.pop("name__regex", None)
+        if name_regex:
+            ids = [object_id for object_id in ids if re.search(name_regex[0], f"bench-sw{object_id:05}")]
+
+        match = matches(selection)
+        if callable(match):
+            return [object_id for object_id in ids if match(object_id)]
+        return list(ids) if match else []
+
+    def _send(self, payload: dict, status: int = 200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("API-Version", "4.0")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(port: int, devices: int, counters: dict = None):
+    """Process entry point: serves a StandInNetbox forever."""
+    StandInNetbox(port, devices, counters).serve_forever()
@@ -1,147 +1,580 @@
 # Standard Library
 import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import os
 import sys
 
 # Non-Standard Library
 from dotenv import load_dotenv
 import pynetbox
+import requests
 
 # Custom imports
 import error_handling.custom_errors as err
 import error_handling.error_reporting as err_report
-from utils import snmp_utils, netbox_utils
+from utils import compliance_rules, interface_compliance, inventory_snapshot, netbox_graphql, netbox_utils, pipeline, results_store, run_metrics, snmp_cache, snmp_health, snmp_utils
+from utils.device_snapshot import DeviceSnapshot
+
+# Device roles checked when no -role is given
+DEFAULT_ROLES = netbox_utils.COMPLIANCE_ROLES
+
+def main(
+    url,
+    api_token,
+    mode: str = "sync",
+    concurrency: int = 50,
+    device_timeout: float = 30,
+    snmp_cache_path: str = None,
+    snmp_cache_ttl: float = 86400,
+    snmp_health_path: str = None,
+    snmp_port: int = 161,
+    devicetype_cache_path: str = None,
+    devicetype_cache_ttl: float = 3600,
+    page_size: int = netbox_utils.DEFAULT_PAGE_SIZE,
+    threaded: bool = False,
+    backend: str = "rest",
+    queue_size: int = 200,
+    filters: dict = None,
+    limit: int = None,
+    snapshot_path: str = None,
+    rules_path: str = None,
+    batch_size: int = 500,
+    aggregate_window: float = 0,
+    metrics_json_path: str = None,
+    metrics_prom_path: str = None,
+    interfaces: bool = False,
+    max_repetitions: int = snmp_utils.DEFAULT_MAX_REPETITIONS,
+    results_db_path: str = None,
+    changes_only: bool = False,
+):
+    """Main orchestrator function.
 
-
-def main(url, api_token):
+    Args:
+        url (str): Full URL for the proper Netbox environment's API base endpoint.
+        api_token (str): String representation of the service account's API token.
+        mode (str, optional): 'sync' checks devices one after another, 'async' checks up to
+            `concurrency` devices at once, 'stream' starts polling while Netbox pages are still
+            arriving. Defaults to "sync".
+        concurrency (int, optional): Maximum number of devices in flight in 'async'/'stream' mode. Defaults to 50.
+        device_timeout (float, optional): Seconds allowed per device in 'async' mode. Defaults to 30.
+        snmp_cache_path (str, optional): File caching SNMPv3 engine IDs and localized keys between runs. Defaults to None (disabled).
+        snmp_cache_ttl (float, optional): Seconds a cached SNMPv3 entry stays valid. Defaults to 86400.
+        snmp_health_path (str, optional): File keeping per-device SNMP round-trip times and circuit-breaker state
+            between runs. Defaults to None (pysnmp's fixed timeout and retries for every device).
+        snmp_port (int, optional): UDP port the devices' SNMP agents listen on. Defaults to 161.
+        devicetype_cache_path (str, optional): File caching the device-type OID index between runs. Defaults to None (disabled).
+        devicetype_cache_ttl (float, optional): Seconds the cached device-type OID index stays valid. Defaults to 3600.
+        page_size (int, optional): Objects fetched per Netbox page. Defaults to netbox_utils.DEFAULT_PAGE_SIZE.
+        threaded (bool, optional): Fetch Netbox pages in parallel. Defaults to False.
+        backend (str, optional): Fetch inventory over Netbox's 'rest' API or in one 'graphql' query. Defaults to "rest".
+        queue_size (int, optional): Devices buffered between pipeline stages in 'stream' mode. Defaults to 200.
+        filters (dict, optional): Netbox device filters, see netbox_utils.build_device_filters(). Defaults to active DEFAULT_ROLES devices.
+        limit (int, optional): Check at most this many devices. Defaults to None (all).
+        snapshot_path (str, optional): Inventory snapshot file (see export_inventory.py) to read instead of querying Netbox. Defaults to None.
+        rules_path (str, optional): Compliance rules file. Defaults to compliance_rules.DEFAULT_RULES_PATH.
+        batch_size (int, optional): Polled devices compared against the rules at once. Defaults to 500.
+        aggregate_window (float, optional): Seconds repeats of the same error (e.g. SNMPTimeout on many devices)
+            are collapsed into one report for. Defaults to 0 (every error reported on its own).
+        metrics_json_path (str, optional): File the run's timing and error summary is written to as JSON. Defaults to None.
+        metrics_prom_path (str, optional): Prometheus textfile-collector file the same metrics are written to. Defaults to None.
+            Without either path, instrumentation stays off.
+        interfaces (bool, optional): Also compare every device's interfaces (names, admin/oper status, descriptions,
+            speeds) with Netbox. Defaults to False.
+        max_repetitions (int, optional): Rows per GETBULK response when walking the interface tables.
+            Defaults to snmp_utils.DEFAULT_MAX_REPETITIONS.
+        results_db_path (str, optional): SQLite file every device's outcome (live values, violations, timing) is
+            stored in, see utils.results_store. Defaults to None (not stored).
+        changes_only (bool, optional): Only report violations the previous run with the same selection didn't
+            have, plus the ones it had that are now resolved. Needs results_db_path. Defaults to False.
+    """
     
-    # Collect data from Netbox
-    try: nb_devices = collect_nb_devices(url=url, api_token=api_token)
-    except err.DataError as e:
-        err_report.log_parser(e)
-        sys.exit(1)
-    except Exception as e:
-        raise (e)
-
-    for device in nb_devices:
-        if device.name == "test-sw01" or device.name == "test-sw02":  # filtering output for testing
-            
-            # Pre-checks that the NB data is good.
-            try: test_nb_data(device)
-            except err.DataError as e:
-                err_report.log_parser(e)
-                continue
-            except Exception as e:
-                raise (e)
-
-            # Collect live data from device.
-            try: live_data = gather_live_data(device, api_token, url)
-            except err.DataError as e:
-                err_report.log_parser(e)
-                continue
-            except Exception as e:
-                raise (e)
-
-            # Compare netbox data with live data
-            try: compare_data(device=device, live_data=live_data)
-            except err.DataError as e:
-                err_report.log_parser(e)
-                continue
-            except Exception as e:
-                raise (e)
+    # Per-stage timings and error counters, only collected when they are exported
+    metrics = run_metrics.enable() if metrics_json_path or metrics_prom_path else None
+
+    # Reporters run on a background thread, off the polling path
+    err_report.start_worker(aggregate_window=aggregate_window)
+
+    # Outcomes stored per run, and diffed against the previous one in changes-only mode
+    if results_db_path:
+        results_store.enable(results_db_path, url=url, selection=filters, changes_only=changes_only)
+
+    # Set up by the run below; the finally persists whatever was set up, however the run ends
+    usm_cache = None
+    health = None
+
+    try:
+        # Collect data from Netbox
+        rules = compliance_rules.load_rules(rules_path)
+        for rule in rules:
+            err_report.register_error_type(rule.name, rule.reporter)
+
+        nb_devices = collect_nb_devices(
+            url=url,
+            api_token=api_token,
+            filters=filters,
+            limit=limit,
+            page_size=page_size,
+            threaded=threaded,
+            backend=backend,
+            snapshot_path=snapshot_path,
+        )
+
+        # Prefetch every device type's OIDs once, instead of one lookup per device.
+        # (The GraphQL backend and snapshots already carry them along with the devices.)
+        if snapshot_path is None and backend != "graphql":
+            with run_metrics.timer("devicetype_oids"):
+                try:
+                    netbox_utils.load_devicetype_oid_index(
+                        api_token=api_token,
+                        url=url,
+                        cache_path=devicetype_cache_path,
+                        cache_ttl=devicetype_cache_ttl,
+                        page_size=page_size,
+                    )
+                except pynetbox.core.query.ContentError as e:
+                    error_message = f"ERROR: Incorrect Netbox URL passed to load_devicetype_oid_index function."
+                    raise err.DataError(message=error_message,extra_data={'original_exception': e})
+                except (pynetbox.core.query.RequestError, requests.RequestException) as e:
+                    error_message = f"ERROR: Netbox Request error."
+                    raise err.DataError(message=error_message,extra_data={'original_exception': e})
+
+        # One poller (credentials, SNMP engines) for the whole run
+        usm_cache = snmp_cache.SnmpUsmCache(snmp_cache_path, ttl=snmp_cache_ttl) if snmp_cache_path else None
+        health = snmp_health.SnmpHealthTracker(snmp_health_path) if snmp_health_path else None
+        poller = snmp_utils.SnmpPoller(port=snmp_port, usm_cache=usm_cache, health=health, max_repetitions=max_repetitions)
+
+        # Polled devices are compared against the rules a batch at a time
+        # With interface checks, each batch's Netbox interfaces are fetched together
+        nb = netbox_utils.get_netbox_client(url=url, api_token=api_token, threaded=threaded) if interfaces else None
+        batch = ComparisonBatch(rules=rules, size=batch_size, nb=nb, page_size=page_size)
+
+        # Lazy, so 'stream' mode sees devices as each Netbox page arrives
+        devices = iter(nb_devices)
+
+        # Devices that recently timed out go last, so they can't hold up the healthy ones
+        if health is not None and mode != "stream":
+            devices = iter(sorted(devices, key=lambda device: health.priority(device.ip)))
+
+        if mode == "stream":
+            run_stream(
+                devices=devices,
+                api_token=api_token,
+                url=url,
+                poller=poller,
+                concurrency=concurrency,
+                queue_size=queue_size,
+                rules=rules,
+                batch=batch,
+                interfaces=interfaces,
+            )
+
+        elif mode == "async":
+            devices = list(devices)
+            results = asyncio.run(
+                run_async(
+                    devices=devices,
+                    api_token=api_token,
+                    url=url,
+                    poller=poller,
+                    concurrency=concurrency,
+                    device_timeout=device_timeout,
+                    rules=rules,
+                    interfaces=interfaces,
+                )
+            )
+
+            # Results are in the same order as the devices, so reports are too.
+            for device, result in zip(devices, results):
+                if isinstance(result, err.DataError):
+                    report_device(device, errors=[result])
+                elif isinstance(result, Exception):
+                    raise (result)
+                else:
+                    batch.add(device, result)
 
         else:
-            continue
-
-def collect_nb_devices(url: str, api_token: str) -> list:
-    # Initialize NetBox API
-    nb = pynetbox.api(url=url, token=api_token)
-
-    # Static vars
-    nb_role_searchlist = [
-        "sw",
-        # "ag",
-        # "cr",
-        # "ds",
-        # "fw",
-        # "rt",
-    ]
+            for device in devices:
+                try: live_data = check_device(device, api_token, url, poller=poller, rules=rules, interfaces=interfaces)
+                except err.DataError as e:
+                    report_device(device, errors=[e])
+                    continue
+                except Exception as e:
+                    raise (e)
+                batch.add(device, live_data)
+
+        batch.flush()
+
+        # Violations that went away since the previous run (changes-only mode)
+        for error in results_store.disable():
+            err_report.log_parser(error)
 
-    # for role in nb_role_searchlist:
-    try: 
-        nb_devices = nb.dcim.devices.filter(status='active', role=nb_role_searchlist)
-        return nb_devices
-    except pynetbox.core.query.ContentError as e:
-        error_message = f"ERROR: Incorrect Netbox URL passed to collect_nb_devices function."
-        raise err.DataError(message=error_message,extra_data={'original_exception': e})
     except pynetbox.core.query.RequestError as e:
         error_message = f"ERROR: Netbox Request error."
-        raise err.DataError(message=error_message,extra_data={'original_exception': e})
+        err_report.log_parser(err.DataError(message=error_message, extra_data={'original_exception': e}))
+        sys.exit(1)
 
-def test_nb_data(device: pynetbox.models.dcim.Devices):
-    """Tests that the provided device has all the critical pieces of data needed in Netbox.
+    # Netbox failed, up front or while devices were still being read
+    except err.DataError as e:
+        err_report.log_parser(e)
+        sys.exit(1)
+
+    finally:
+        # An aborted run keeps what it stored, but isn't diffed against
+        results_store.disable(finish=False)
+
+        # Persist what was learned about the agents, even if the run is aborted.
+        if usm_cache is not None:
+            usm_cache.save()
+        if health is not None:
+            health.save()
+
+        # Send every queued error report before returning
+        err_report.stop_worker()
+
+        if metrics is not None:
+            run_metrics.disable()
+            if metrics_json_path:
+                metrics.write_json(metrics_json_path)
+            if metrics_prom_path:
+                metrics.write_prometheus(metrics_prom_path)
+
+def check_device(
+    device: DeviceSnapshot,
+    api_token,
+    url,
+    poller: snmp_utils.SnmpPoller = None,
+    rules: list = None,
+    interfaces: bool = False,
+) -> dict:
+    """Runs the per-device compliance stages: the Netbox pre-checks and polling.
+
+    Comparing the live data happens afterwards, a batch of devices at a time (see ComparisonBatch).
 
     Args:
-        device (pynetbox.models.dcim.Devices): Netbox device object from pynetbox
+        device (DeviceSnapshot): Device collected from Netbox.
+        api_token (str): Netbox API Token
+        url (str): Netbox URL
+        poller (snmp_utils.SnmpPoller, optional): Poller shared by the run. Defaults to the shared poller.
+        rules (list, optional): Compliance rules. Defaults to compliance_rules.get_default_rules().
+        interfaces (bool, optional): Also walk the device's interface table. Defaults to False.
 
     Raises:
-        err.MissingPrimaryIPv4Address: Error used to report that the device is missing a Primary IPv4 Address in Netbox
-        err.MissingSerialNumber: Error used to report that the device is missing a Serial Number in Netbox
-        err.MissingHostname: Error used to report that the device is missing a Hostname in Netbox
-        err.MissingDeviceType: Error used to report that the device is missing a DeviceType (hardware model) in Netbox
-        err.MissingPlatform: Error used to report that the device is missing a Platform (software version) in Netbox
+        err.DataError: Raised by whichever stage failed first.
 
     Returns:
-        bool: Returns True if all checks succeed.
+        dict: Live data collected from the device.
     """
 
-    try:
-        assert device.primary_ip4 is not None
-    except AssertionError:
-        error_message = f"ERROR: {device.name} is missing a primary IPv4 Address."
-        raise err.DataError(message=error_message, error_type="MissingDataIPv4", device=device)
+    with run_metrics.timer("device", device), results_store.timer(device):
+        # Pre-checks that the NB data is good.
+        with run_metrics.timer("prechecks"):
+            test_nb_data(device, rules=rules)
 
-    try:
-        assert device.serial is not None
-    except AssertionError:
-        error_message = f"ERROR: {device.name} is missing a Serial Number."
-        raise err.DataError(message=error_message, error_type="MissingDataSerialNumber", device=device)
+        # Collect live data from device.
+        return gather_live_data(device, api_token, url, poller=poller, interfaces=interfaces)
 
-    try:
-        assert device.name is not None
-    except AssertionError:
-        error_message = f"ERROR: {device.name} is missing a hostname."
-        raise err.DataError(message=error_message, error_type="MissingDataHostname", device=device)
+class ComparisonBatch:
+    """Buffers polled devices and compares them against the 'live' rules a batch at a time,
+    reporting every violation found.
+
+    Devices polled with their interface table are also compared with their Netbox interfaces,
+    which are fetched for the whole batch at once.
+    """
+
+    def __init__(self, rules: list = None, size: int = 500, nb: pynetbox.api = None, page_size: int = netbox_utils.DEFAULT_PAGE_SIZE):
+        """
+        Args:
+            rules (list, optional): Compliance rules. Defaults to compliance_rules.get_default_rules().
+            size (int, optional): Devices compared at once. Defaults to 500.
+            nb (pynetbox.api, optional): Netbox client interfaces are fetched with. Defaults to None (no interface checks).
+            page_size (int, optional): Interfaces fetched per Netbox page. Defaults to netbox_utils.DEFAULT_PAGE_SIZE.
+        """
+
+        self.rules = rules
+        self.size = size
+        self.nb = nb
+        self.page_size = page_size
+        self.devices = []
+        self.live_rows = []
+
+    def add(self, device: DeviceSnapshot, live_data: dict):
+        self.devices.append(device)
+        self.live_rows.append(live_data)
+        if len(self.devices) >= self.size:
+            self.flush()
+
+    def flush(self):
+        devices, live_rows = self.devices, self.live_rows
+        self.devices, self.live_rows = [], []
+
+        # Interface tables are compared on their own, and kept out of the rule errors' live_data
+        tables = [live_data.pop("interfaces", None) for live_data in live_rows]
+
+        with run_metrics.timer("compare"):
+            errors = compare_batch(devices, live_rows, rules=self.rules)
+        if self.nb is not None:
+            errors += compare_interfaces_batch(self.nb, devices, tables, page_size=self.page_size)
+
+        # Errors about no device in particular (e.g. a failed Netbox request) are reported as they are
+        by_device = {}
+        for error in errors:
+            if isinstance(error.device, DeviceSnapshot):
+                by_device.setdefault(error.device.id, []).append(error)
+            else:
+                err_report.log_parser(error)
+
+        for device, live_data in zip(devices, live_rows):
+            report_device(device, live_data, by_device.get(device.id))
+
+async def run_async(
+    devices: list,
+    api_token: str,
+    url: str,
+    poller: snmp_utils.SnmpPoller = None,
+    concurrency: int = 50,
+    device_timeout: float = 30,
+    rules: list = None,
+    interfaces: bool = False,
+) -> list:
+    """Checks devices concurrently, with at most `concurrency` devices in flight.
+
+    The pinned pysnmp release only ships a blocking hlapi that works on current Python versions,
+    so each device check runs on one of `concurrency` worker threads and asyncio times them. A device's
+    timeout starts when a worker picks it up. Checks that timed out still run to completion (the
+    poller's own timeout bounds them) before this returns, so what they learn about the agents is
+    in the SNMP health and USM caches before main() saves those.
+
+    Args:
+        devices (list): DeviceSnapshots collected from Netbox.
+        api_token (str): Netbox API Token
+        url (str): Netbox URL
+        poller (snmp_utils.SnmpPoller, optional): Poller shared by every worker. Defaults to the shared poller.
+        concurrency (int, optional): Maximum number of devices in flight. Defaults to 50.
+        device_timeout (float, optional): Seconds allowed per device. Defaults to 30.
+        rules (list, optional): Compliance rules. Defaults to compliance_rules.get_default_rules().
+        interfaces (bool, optional): Also walk every device's interface table. Defaults to False.
+
+    Returns:
+        list: One entry per device, in the same order as `devices`. Each entry is either the
+            device's live data or the exception raised while checking it.
+    """
+
+    loop = asyncio.get_running_loop()
+
+    # A worker thread is a device's slot: one that timed out keeps it until its check returns,
+    # so later devices queue instead of overcommitting the poller
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    async def check_device_async(device):
+        started = asyncio.Event()
+
+        def run_check():
+            loop.call_soon_threadsafe(started.set)
+            return check_device(device, api_token, url, poller, rules, interfaces)
+
+        future = loop.run_in_executor(executor, run_check)
+        # The clock starts once a worker picks the device up, not while it is queued
+        await started.wait()
+        try:
+            return await asyncio.wait_for(future, timeout=device_timeout)
+        except asyncio.TimeoutError:
+            error_message = f"ERROR: {device} - Device check exceeded {device_timeout}s, check connectivity"
+            raise err.DataError(message=error_message, error_type="SNMPTimeout", device=device)
 
     try:
-        assert device.device_type is not None
-    except AssertionError:
-        error_message = f"ERROR: {device.name} is missing a device_type."
-        raise err.DataError(message=error_message, error_type="MissingDataDeviceType", device=device)
+        return await asyncio.gather(
+            *[check_device_async(device) for device in devices], return_exceptions=True
+        )
+    finally:
+        # Wait for checks still finishing an already timed-out device; their poller updates must
+        # land before the caches are saved. Checks that never started are dropped.
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def run_stream(
+    devices,
+    api_token: str,
+    url: str,
+    poller: snmp_utils.SnmpPoller = None,
+    concurrency: int = 50,
+    queue_size: int = 200,
+    rules: list = None,
+    batch: "ComparisonBatch" = None,
+    interfaces: bool = False,
+):
+    """Checks devices through a producer/consumer pipeline that overlaps Netbox and SNMP.
+
+    Devices flow from the (lazily paginated) Netbox iterator through a bounded queue to
+    `concurrency` SNMP workers, which run the pre-checks and poll. Comparison and error
+    reporting run downstream on the calling thread as results arrive, a batch at a time, so
+    polling starts after the first page and memory stays bounded by the queue and batch sizes.
+
+    Args:
+        devices (iterable): DeviceSnapshots from Netbox, ideally not yet materialized.
+        api_token (str): Netbox API Token
+        url (str): Netbox URL
+        poller (snmp_utils.SnmpPoller, optional): Poller shared by every worker. Defaults to the shared poller.
+        concurrency (int, optional): Number of SNMP workers. Defaults to 50.
+        queue_size (int, optional): Devices buffered between stages. Defaults to 200.
+        rules (list, optional): Compliance rules. Defaults to compliance_rules.get_default_rules().
+        batch (ComparisonBatch, optional): Batch polled devices are compared in. Defaults to a new batch,
+            flushed before returning.
+        interfaces (bool, optional): Also walk every device's interface table. Defaults to False.
+    """
+
+    own_batch = batch is None
+    if own_batch:
+        nb = netbox_utils.get_netbox_client(url=url, api_token=api_token) if interfaces else None
+        batch = ComparisonBatch(rules=rules, nb=nb)
+
+    def poll(device):
+        # Pre-checks that the NB data is good, then collect live data from device.
+        return check_device(device, api_token, url, poller=poller, rules=rules, interfaces=interfaces)
 
+    def compare_and_report(device, live_data, exception):
+        try:
+            if exception is not None:
+                raise exception
+
+            # Compare netbox data with live data, once a batch is full
+            batch.add(device, live_data)
+
+        except err.DataError as e:
+            report_device(device, errors=[e])
+        except Exception as e:
+            raise (e)
+
+    pipeline.run_pipeline(
+        source=devices,
+        worker=poll,
+        sink=compare_and_report,
+        workers=concurrency,
+        queue_size=queue_size,
+    )
+
+    if own_batch:
+        batch.flush()
+
+def collect_nb_devices(
+    url: str,
+    api_token: str,
+    filters: dict = None,
+    limit: int = None,
+    page_size: int = netbox_utils.DEFAULT_PAGE_SIZE,
+    threaded: bool = False,
+    backend: str = "rest",
+    snapshot_path: str = None,
+):
+    """Collects the devices to check from Netbox.
+
+    Each device is turned into a DeviceSnapshot, with its device type's OIDs attached, as it is
+    read, so the records themselves are dropped again right away.
+
+    Args:
+        url (str): Netbox URL
+        api_token (str): Netbox API Token
+        filters (dict, optional): Netbox device filters, see netbox_utils.build_device_filters(). Defaults to active DEFAULT_ROLES devices.
+        limit (int, optional): Collect at most this many devices. Defaults to None (all).
+        page_size (int, optional): Devices fetched per Netbox page. Defaults to netbox_utils.DEFAULT_PAGE_SIZE.
+        threaded (bool, optional): Fetch Netbox pages in parallel. Defaults to False.
+        backend (str, optional): Fetch inventory over Netbox's 'rest' API or in one 'graphql' query. Defaults to "rest".
+        snapshot_path (str, optional): Inventory snapshot file to read instead of querying Netbox. Defaults to None.
+
+    Raises:
+        err.DataError: Custom data error for logging purposes in conjunction with error_handling.error_reporting.py.
+            Netbox request failures are raised while the result is iterated.
+
+    Returns:
+        iterator: DeviceSnapshot per device, built lazily as Netbox pages arrive.
+    """
+
+    # Selection happens server-side, so only the needed devices leave Netbox
+    if filters is None:
+        filters = netbox_utils.build_device_filters(roles=DEFAULT_ROLES)
+
+    # Offline: the snapshot already holds the devices with their OIDs
+    if snapshot_path is not None:
+        return run_metrics.timed_iter(
+            "netbox_fetch", inventory_snapshot.read_inventory(snapshot_path, filters=filters, limit=limit)
+        )
+
+    def snapshot(nb_device):
+        oids = None
+        if nb_device.device_type:
+            with run_metrics.timer("devicetype_oids"):
+                oids = netbox_utils.resolve_devicetype_oids(
+                    device_type=nb_device.device_type, api_token=api_token, url=url
+                )
+        return DeviceSnapshot.from_record(nb_device, oids=oids)
+
+    if backend == "graphql":
+        nb_devices = netbox_graphql.iter_devices(
+            url=url,
+            api_token=api_token,
+            filters=filters,
+            limit=limit,
+            page_size=page_size,
+        )
+        return map(snapshot, run_metrics.timed_iter("netbox_fetch", nb_devices))
+
+    # Shared, connection-pooled NetBox API client
+    nb = netbox_utils.get_netbox_client(url=url, api_token=api_token, threaded=threaded)
+
+    nb_devices = netbox_utils.filter_devices(nb, filters, limit=limit, page_size=page_size)
+    return map(snapshot, run_metrics.timed_iter("netbox_fetch", _netbox_request_errors(nb_devices)))
+
+def _netbox_request_errors(nb_devices):
+    # Pages are only requested while iterating, so that's where pynetbox's errors surface
     try:
-        assert device.platform is not None
-    except AssertionError:
-        error_message = f"ERROR: {device.name} is missing a platform."
-        raise err.DataError(message=error_message, error_type="MissingDataPlatform", device=device)
+        yield from nb_devices
+    except pynetbox.core.query.ContentError as e:
+        error_message = f"ERROR: Incorrect Netbox URL passed to collect_nb_devices function."
+        raise err.DataError(message=error_message,extra_data={'original_exception': e})
+    except (pynetbox.core.query.RequestError, requests.RequestException) as e:
+        error_message = f"ERROR: Netbox Request error."
+        raise err.DataError(message=error_message,extra_data={'original_exception': e})
+
+def test_nb_data(device: DeviceSnapshot, rules: list = None):
+    """Tests that the provided device has all the critical pieces of data needed in Netbox,
+    i.e. evaluates the 'netbox' stage compliance rules for it.
+
+    Args:
+        device (DeviceSnapshot): Device collected from Netbox
+        rules (list, optional): Compliance rules. Defaults to compliance_rules.get_default_rules().
+
+    Raises:
+        err.DataError: Error typed after the one rule the device violated (e.g. MissingDataIPv4)
+        err.DataErrorGroup: Carries one error per rule when the device violated several
+    """
+
+    if rules is None:
+        rules = compliance_rules.get_default_rules()
 
-def gather_live_data(device, api_token, url) -> dict:
+    violations = compliance_rules.evaluate(rules, [device])[0]
+    if violations:
+        raise rule_error(device, violations)
+
+def gather_live_data(
+    device: DeviceSnapshot, api_token, url, poller: snmp_utils.SnmpPoller = None, interfaces: bool = False
+) -> dict:
     """Handler function for collecting live data from the provided device.
     Calls more discrete functions to collect data via provided method.
 
     Default method is SNMPv3, but functionality can be added for API, SNMP, etc.
 
     Args:
-        device: Device object returned by querying Netbox via pynetbox.
+        device (DeviceSnapshot): Device collected from Netbox.
+        poller (snmp_utils.SnmpPoller, optional): Poller to collect with. Defaults to the shared poller.
+        interfaces (bool, optional): Also walk the interface table (snmp_utils.IF_TABLE_COLUMNS) into 'interfaces'. Defaults to False.
 
     Returns:
         dict: Dictionary of relevant live data values for comparison
     """
     
-    device_ip = str(device.primary_ip4).split("/")[0]  # remove CIDR from NB
-    oids = netbox_utils.get_devicetype_oids(
-        device_type=device.device_type, api_token=api_token, url=url
-    )  # get OIDs from NB
+    device_ip = device.ip  # primary IPv4 without CIDR
+    oids = device.oids  # OIDs from NB, attached when the device was collected
+    with run_metrics.timer("devicetype_oids"):
+        netbox_utils.validate_devicetype_oids(model=device.model, snmp_oids=oids, url=url)
 
     
     live_data = {}
@@ -155,100 +588,172 @@ def gather_live_data(device, api_token, url) -> dict:
     "sys_uptime": oids["snmp_sysuptime_oid"]
     }
 
-    # Collecting SNMP Data by submitting OIDs found in Netbox
-    for key, oid in snmp_data_mapping.items():
-        try:
-            # retrieve snmp data
-            data = snmp_utils.get_snmp_data(device_ip, oid)
-            
-            # formatting keys
-            if key == "system_name":
-                data = data.split(".")[0].strip()
-            elif key == "sys_uptime":
-                data = int(data) if data else 0
-
-            # organizing collected data
-            live_data[key] = data.strip() if isinstance(data, str) else data
-        
-        except err.RequestTimedOutError:
-            error_message = f"ERROR: {device} - SNMP Timeout, check connectivity"
-            raise err.DataError(message=error_message, error_type="SNMPTimeout", device=device)
-        
-        except err.WrongSNMPDigest:
-            error_message = f"ERROR: {device} - SNMP Wrong Digest, check credentials"
-            raise err.DataError(message=error_message, error_type="SNMPBadDigest", device=device)
-        
-        except err.WrongSNMPOid:
-            error_message = f"ERROR: {device} - No such OID at device, check for incorrect OID"
-            raise err.DataError(message=error_message, error_type="SNMPBadOID", device=device, extra_data={'sent_oid': oid, 'nb_dvc_type': device.device_type})
-        
-        except err.OtherSNMPError:
-            error_message = f"ERROR: {device} - Unknown SNMP error encountered. "
-            raise err.DataError(message=error_message, error_type="OtherSNMPError", device=device, extra_data={'sent_oid': oid, 'nb_dvc_type': device.device_type})
-        
-        except Exception as e:
-            raise(e)
+    # Collecting SNMP Data by submitting all OIDs found in Netbox in a single request
+    try:
+        # retrieve snmp data
+        snmp_data = snmp_utils.get_snmp_data_many(device_ip, snmp_data_mapping, poller=poller)
+
+        # Whole interface table in a few GETBULK exchanges
+        if interfaces:
+            interface_table = (poller or snmp_utils.get_default_poller()).walk(device_ip, snmp_utils.IF_TABLE_COLUMNS)
+    
+    except err.RequestTimedOutError:
+        error_message = f"ERROR: {device} - SNMP Timeout, check connectivity"
+        raise err.DataError(message=error_message, error_type="SNMPTimeout", device=device)
+
+    except err.CircuitOpenError as e:
+        error_message = f"ERROR: {device} - Skipped after repeated SNMP timeouts, check connectivity"
+        raise err.DataError(message=error_message, error_type="SNMPCircuitOpen", device=device, extra_data={'retry_at': e.retry_at})
+    
+    except err.WrongSNMPDigest:
+        error_message = f"ERROR: {device} - SNMP Wrong Digest, check credentials"
+        raise err.DataError(message=error_message, error_type="SNMPBadDigest", device=device)
+    
+    except err.WrongSNMPOid as e:
+        error_message = f"ERROR: {device} - No such OID at device, check for incorrect OID"
+        raise err.DataError(message=error_message, error_type="SNMPBadOID", device=device, extra_data={'sent_oid': e.oid, 'oid_key': e.oid_key, 'nb_dvc_type': device.model})
+    
+    except err.OtherSNMPError:
+        error_message = f"ERROR: {device} - Unknown SNMP error encountered. "
+        raise err.DataError(message=error_message, error_type="OtherSNMPError", device=device, extra_data={'sent_oid': list(snmp_data_mapping.values()), 'nb_dvc_type': device.model})
+    
+    except Exception as e:
+        raise(e)
+
+    for key, data in snmp_data.items():
+        # formatting keys
+        if key == "system_name":
+            data = data.split(".")[0].strip()
+        elif key == "sys_uptime":
+            data = int(data) if data else 0
+
+        # organizing collected data
+        live_data[key] = data.strip() if isinstance(data, str) else data
 
     # Printing SNMP results
     print("*" * 80)
     for key, value in live_data.items():
         print(f"{key}: {value}")
+    if interfaces:
+        print(f"interfaces: {len(interface_table)}")
+        live_data["interfaces"] = interface_table
     print("*" * 80)
     return live_data
 
-def compare_data(device: pynetbox.models.dcim.Devices, live_data: dict):
+def compare_data(device: DeviceSnapshot, live_data: dict, rules: list = None):
     """Compares the retrieved Netbox data with retrieved "live" data.
 
     Args:
-        device (pynetbox.models.dcim.Devices): Netbox device object from pynetbox
+        device (DeviceSnapshot): Device collected from Netbox
         live_data (dict): Dictionary representing data collected via SNMP
+        rules (list, optional): Compliance rules. Defaults to compliance_rules.get_default_rules().
 
     Raises:
-        err.SerialMatchError: Error used for alerting when serial numbers don't match
-        err.HostnameMatchError: Error used for alerting when hostnames don't match
-        err.HardwareModelMatchError: Error used for alerting when hardware models don't match
-        err.SoftwareVersionMatchError: Error used for alerting when software versions don't match
-        err.LongUptimeError: Error used for alerting when uptime is longer than 1 year
+        err.DataError: Error typed after the one rule the device violated (e.g. SerialNumberMismatch)
+        err.DataErrorGroup: Carries one error per rule when the device violated several
+    """
+
+    errors = compare_batch([device], [live_data], rules=rules)
+    if errors:
+        raise errors[0]
+
+def compare_batch(devices: list, live_rows: list, rules: list = None) -> list:
+    """Compares the retrieved Netbox data with retrieved "live" data for a batch of devices,
+    evaluating each 'live' stage compliance rule over the whole batch at once.
+
+    Args:
+        devices (list): Devices collected from Netbox
+        live_rows (list): Dictionaries of data collected via SNMP, in the same order as devices
+        rules (list, optional): Compliance rules. Defaults to compliance_rules.get_default_rules().
 
     Returns:
-        bool: Returns True if all checks succeed
+        list: One err.DataError (err.DataErrorGroup for several violations) per non-compliant device, in order
     """
-    uptime_centiseconds = 3153600000  # 365 days in hundredeths of a second
 
-    # Compare live data with NB data.
-    print(f"BEGIN: {device}")
+    if rules is None:
+        rules = compliance_rules.get_default_rules()
+    live_rules = [rule for rule in rules if rule.stage == "live"]
+
+    errors = []
+    for device, live_data, violations in zip(
+        devices, live_rows, compliance_rules.evaluate(live_rules, devices, live_rows)
+    ):
+        print(f"BEGIN: {device}")
+        if violations:
+            errors.append(rule_error(device, violations, extra_data={'live_data': live_data}))
+        else:
+            print(f"COMPLETE: {device}")
+    return errors
 
-    try:
-        assert live_data["serial_number"] == device.serial.strip()
-    except AssertionError:
-        error_message = f"ERROR: {device} - Serial numbers do not match."
-        raise err.DataError(message=error_message, error_type="SerialNumberMismatch", device=device, extra_data=(device, live_data))
+def compare_interfaces_batch(nb: pynetbox.api, devices: list, tables: list, page_size: int = netbox_utils.DEFAULT_PAGE_SIZE) -> list:
+    """Compares the walked interface tables of a batch of devices with their Netbox interfaces.
 
-    try:
-        assert live_data["system_name"] == device.name.strip()
-    except AssertionError:
-        error_message = f"ERROR: {device} - Hostnames do not match."
-        raise err.DataError(message=error_message, error_type="HostnameMismatch", device=device, extra_data=(device, live_data))
+    The interfaces of every device in the batch are fetched in one paginated request and joined
+    with the tables in memory.
 
-    try:
-        assert live_data["hardware_model"] == device.device_type.model.strip()
-    except AssertionError:
-        error_message = f"ERROR: {device} - Hardware models do not match."
-        raise err.DataError(message=error_message, error_type="HardwareModelMismatch", device=device, extra_data=(device, live_data))
+    Args:
+        nb (pynetbox.api): Netbox client.
+        devices (list): Devices collected from Netbox
+        tables (list): Interface tables (see snmp_utils.SnmpPoller.walk), in the same order as devices; None skips a device
+        page_size (int, optional): Interfaces fetched per Netbox page. Defaults to netbox_utils.DEFAULT_PAGE_SIZE.
 
-    try:
-        assert live_data["sw_version"] == device.platform.name.strip()
-    except AssertionError:
-        error_message = f"ERROR: {device} - Software versions do not match."
-        raise err.DataError(message=error_message, error_type="SoftwareVersionMismatch", device=device, extra_data=(device, live_data))
+    Returns:
+        list: err.DataErrors of every interface violation, see interface_compliance.evaluate()
+    """
+
+    polled = [(device, table) for device, table in zip(devices, tables) if table is not None]
+    if not polled:
+        return []
 
     try:
-        assert live_data["sys_uptime"] < uptime_centiseconds  # Hundredths of a second
-    except AssertionError:
-        error_message = f"ERROR: {device} - Uptime is more than 1 year."
-        raise err.DataError(message=error_message, error_type="LongUptime", device=device, extra_data=(device, live_data))
+        with run_metrics.timer("netbox_interfaces"):
+            netbox_interfaces = netbox_utils.get_interfaces(nb, device_ids=[device.id for device, _ in polled], page_size=page_size)
+    except pynetbox.core.query.RequestError as e:
+        error_message = f"ERROR: Netbox Request error while fetching interfaces."
+        return [err.DataError(message=error_message, extra_data={'original_exception': e})]
+
+    errors = []
+    with run_metrics.timer("compare_interfaces"):
+        for device, table in polled:
+            errors += interface_compliance.evaluate(device, netbox_interfaces.get(device.id, []), table)
+    return errors
+
+def report_device(device: DeviceSnapshot, live_data: dict = None, errors: list = None):
+    """Stores a checked device's outcome (when results are stored) and reports its errors.
+
+    In changes-only mode, errors the device already had in the previous run are stored but not reported.
+
+    Args:
+        device (DeviceSnapshot): Checked device
+        live_data (dict, optional): Data collected from it. Defaults to None (polling failed).
+        errors (list, optional): Its err.DataErrors. Defaults to None (compliant).
+    """
+
+    for error in results_store.record(device, live_data, errors):
+        err_report.log_parser(error)
+
+def rule_error(device: DeviceSnapshot, violations: list, extra_data: dict = None) -> err.DataError:
+    """Builds the error reporting a device's compliance rule violations.
 
-    print(f"COMPLETE: {device}")
+    Args:
+        device (DeviceSnapshot): Device collected from Netbox
+        violations (list): (rule, observed, reference) tuples, see compliance_rules.evaluate()
+        extra_data (dict, optional): Extra data attached to every error. Defaults to None.
+
+    Returns:
+        err.DataError: One error typed after the rule, or an err.DataErrorGroup for several.
+    """
+
+    errors = [
+        err.DataError(
+            message=rule.message.format(device=device, name=device.name),
+            error_type=rule.name,
+            device=device,
+            extra_data=extra_data,
+        )
+        for rule, _, _ in violations
+    ]
+    return errors[0] if len(errors) == 1 else err.DataErrorGroup(errors)
 
 if __name__ == "__main__":
     # Constants
@@ -267,14 +772,163 @@ if __name__ == "__main__":
         help="Choose 'prod' or 'dev' environment",
         required=True,
     )
+    netbox_utils.add_device_selection_arguments(parser, default_roles=DEFAULT_ROLES)
+    parser.add_argument(
+        "-mode",
+        choices=["sync", "async", "stream"],
+        default="sync",
+        help="Check devices one at a time ('sync'), concurrently ('async') or while Netbox pages stream in ('stream')",
+    )
+    parser.add_argument(
+        "-concurrency",
+        type=int,
+        default=50,
+        help="Maximum number of devices checked at once in async/stream mode",
+    )
+    parser.add_argument(
+        "-queue_size",
+        type=int,
+        default=200,
+        help="Devices buffered between pipeline stages in stream mode",
+    )
+    parser.add_argument(
+        "-device_timeout",
+        type=float,
+        default=30,
+        help="Seconds allowed per device in async mode",
+    )
+    parser.add_argument(
+        "-snmp_cache",
+        help="Path of a file caching SNMPv3 engine IDs and localized keys between runs",
+    )
+    parser.add_argument(
+        "-snmp_cache_ttl",
+        type=float,
+        default=86400,
+        help="Seconds a cached SNMPv3 entry stays valid",
+    )
+    parser.add_argument(
+        "-snmp_health",
+        help="Path of a file keeping per-device SNMP round-trip times and circuit-breaker state between runs",
+    )
+    parser.add_argument(
+        "-backend",
+        choices=["rest", "graphql"],
+        default="rest",
+        help="Fetch inventory over Netbox's REST API or in one GraphQL query",
+    )
+    parser.add_argument(
+        "-page_size",
+        type=int,
+        default=netbox_utils.DEFAULT_PAGE_SIZE,
+        help="Objects fetched per Netbox API page",
+    )
+    parser.add_argument(
+        "-threaded",
+        action="store_true",
+        help="Fetch Netbox API pages in parallel",
+    )
+    parser.add_argument(
+        "-snapshot",
+        help="Read devices from an inventory snapshot file (see export_inventory.py) instead of Netbox",
+    )
+    parser.add_argument(
+        "-devicetype_cache",
+        help="Path of a file caching the device-type OID map between runs",
+    )
+    parser.add_argument(
+        "-devicetype_cache_ttl",
+        type=float,
+        default=3600,
+        help="Seconds the cached device-type OID map stays valid",
+    )
+    parser.add_argument(
+        "-rules",
+        help="Compliance rules file. Defaults to src/rules/compliance.json",
+    )
+    parser.add_argument(
+        "-batch_size",
+        type=int,
+        default=500,
+        help="Polled devices compared against the compliance rules at once",
+    )
+    parser.add_argument(
+        "-aggregate_window",
+        type=float,
+        default=0,
+        help="Seconds repeats of the same error on different devices are collapsed into one report for (0 disables)",
+    )
+    parser.add_argument(
+        "-metrics_json",
+        help="Write a JSON summary of per-stage timings, error counts and the slowest devices to this file",
+    )
+    parser.add_argument(
+        "-metrics_prom",
+        help="Write the run's metrics to this Prometheus textfile-collector file (e.g. .../node_exporter/compliance.prom)",
+    )
+    parser.add_argument(
+        "-interfaces",
+        action="store_true",
+        help="Also compare interface names, admin/oper status, descriptions and speeds with Netbox",
+    )
+    parser.add_argument(
+        "-max_repetitions",
+        type=int,
+        default=snmp_utils.DEFAULT_MAX_REPETITIONS,
+        help="Rows per SNMP GETBULK response when walking interface tables",
+    )
+    parser.add_argument(
+        "-results_db",
+        help="SQLite file every run's per-device outcomes are stored in (see compliance_results.py to query it)",
+    )
+    parser.add_argument(
+        "-changes_only",
+        action="store_true",
+        help="Only report violations that are new or resolved since the previous run (needs -results_db)",
+    )
     args = parser.parse_args()
+    if args.changes_only and not args.results_db:
+        parser.error("-changes_only needs -results_db")
     running_env = args.env
 
     # Get environment configuration
     env_config = ENVIRONMENTS[running_env]
     url = env_config["url"]
     api_token = os.environ.get(env_config["env_var"])
-    if api_token is None:
+    if api_token is None and args.snapshot is None:
         raise ValueError(f"API token for {running_env} environment not found")
 
-    main(url, api_token)
+    main(
+        url,
+        api_token,
+        mode=args.mode,
+        concurrency=args.concurrency,
+        device_timeout=args.device_timeout,
+        snmp_cache_path=args.snmp_cache,
+        snmp_cache_ttl=args.snmp_cache_ttl,
+        snmp_health_path=args.snmp_health,
+        devicetype_cache_path=args.devicetype_cache,
+        devicetype_cache_ttl=args.devicetype_cache_ttl,
+        page_size=args.page_size,
+        threaded=args.threaded,
+        backend=args.backend,
+        queue_size=args.queue_size,
+        filters=netbox_utils.build_device_filters(
+            roles=args.role,
+            sites=args.site,
+            tags=args.tag,
+            tenants=args.tenant,
+            name_regex=args.name_regex,
+        ),
+        limit=args.limit,
+        snapshot_path=args.snapshot,
+        rules_path=args.rules,
+        batch_size=args.batch_size,
+        aggregate_window=args.aggregate_window,
+        metrics_json_path=args.metrics_json,
+        metrics_prom_path=args.metrics_prom,
+        interfaces=args.interfaces,
+        max_repetitions=args.max_repetitions,
+        results_db_path=args.results_db,
+        changes_only=args.changes_only,
+    )
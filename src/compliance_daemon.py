@@ -0,0 +1,559 @@
+# Standard Library
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from urllib.parse import parse_qs, unquote, urlparse
+
+# Non-Standard Library
+from dotenv import load_dotenv
+import pynetbox
+import requests
+
+# Custom imports
+import base_compliancy
+import error_handling.custom_errors as err
+import error_handling.error_reporting as err_report
+from utils import compliance_rules, device_scheduler, inventory_snapshot, inventory_sync, netbox_utils, snmp_cache, snmp_health, snmp_utils
+
+# Address the results endpoint listens on; it is unauthenticated, so local only by default
+DEFAULT_LISTEN = "127.0.0.1:8765"
+
+
+def main(
+    url,
+    api_token,
+    state_path: str,
+    filters: dict = None,
+    limit: int = None,
+    interval: float = 900,
+    jitter: float = 0.1,
+    refresh_interval: float = 300,
+    concurrency: int = 20,
+    listen: str = DEFAULT_LISTEN,
+    snmp_cache_path: str = None,
+    snmp_cache_ttl: float = 86400,
+    snmp_health_path: str = None,
+    snmp_port: int = 161,
+    devicetype_cache_path: str = None,
+    devicetype_cache_ttl: float = 3600,
+    page_size: int = netbox_utils.DEFAULT_PAGE_SIZE,
+    threaded: bool = False,
+    rules_path: str = None,
+    aggregate_window: float = 0,
+):
+    """Runs continuous compliance checks until SIGTERM/SIGINT.
+
+    Args:
+        url (str): Full URL for the proper Netbox environment's API base endpoint.
+        api_token (str): String representation of the service account's API token.
+        state_path (str): Inventory state file, updated incrementally on every refresh (see inventory_sync).
+        filters (dict, optional): Netbox device filters, see netbox_utils.build_device_filters(). Defaults to active
+            base_compliancy.DEFAULT_ROLES devices.
+        limit (int, optional): Check at most this many devices. Defaults to None (all).
+        interval (float, optional): Seconds between two checks of the same device. Defaults to 900.
+        jitter (float, optional): Largest random offset of a check, as a fraction of interval. Defaults to 0.1.
+        refresh_interval (float, optional): Seconds between two inventory refreshes. Defaults to 300.
+        concurrency (int, optional): Maximum number of devices checked at once. Defaults to 20.
+        listen (str, optional): 'host:port' the results endpoint listens on, or None to disable it. Defaults to DEFAULT_LISTEN.
+        snmp_cache_path (str, optional): File caching SNMPv3 engine IDs and localized keys. Defaults to None (disabled).
+        snmp_cache_ttl (float, optional): Seconds a cached SNMPv3 entry stays valid. Defaults to 86400.
+        snmp_health_path (str, optional): File keeping per-device SNMP round-trip times and circuit-breaker state.
+            Defaults to None (kept in memory only).
+        snmp_port (int, optional): UDP port the devices' SNMP agents listen on. Defaults to 161.
+        devicetype_cache_path (str, optional): File caching the device-type OID index. Defaults to None (disabled).
+        devicetype_cache_ttl (float, optional): Seconds the cached device-type OID index stays valid. Defaults to 3600.
+        page_size (int, optional): Objects fetched per Netbox page. Defaults to netbox_utils.DEFAULT_PAGE_SIZE.
+        threaded (bool, optional): Fetch Netbox pages in parallel. Defaults to False.
+        rules_path (str, optional): Compliance rules file. Defaults to compliance_rules.DEFAULT_RULES_PATH.
+        aggregate_window (float, optional): Seconds repeats of the same error are collapsed into one report for. Defaults to 0.
+    """
+
+    err_report.start_worker(aggregate_window=aggregate_window)
+
+    try:
+        rules = compliance_rules.load_rules(rules_path)
+        for rule in rules:
+            err_report.register_error_type(rule.name, rule.reporter)
+
+        netbox_utils.load_devicetype_oid_index(
+            api_token=api_token,
+            url=url,
+            cache_path=devicetype_cache_path,
+            cache_ttl=devicetype_cache_ttl,
+            page_size=page_size,
+        )
+    except pynetbox.core.query.RequestError as e:
+        error_message = f"ERROR: Netbox Request error."
+        err_report.log_parser(err.DataError(message=error_message, extra_data={'original_exception': e}))
+        sys.exit(1)
+    except err.DataError as e:
+        err_report.log_parser(e)
+        sys.exit(1)
+    except Exception as e:
+        raise (e)
+
+    # Kept for the daemon's lifetime, so engines, keys and RTT estimates stay warm between checks
+    usm_cache = snmp_cache.SnmpUsmCache(snmp_cache_path, ttl=snmp_cache_ttl) if snmp_cache_path else None
+    health = snmp_health.SnmpHealthTracker(snmp_health_path)
+    poller = snmp_utils.SnmpPoller(port=snmp_port, usm_cache=usm_cache, health=health)
+
+    daemon = ComplianceDaemon(
+        url=url,
+        api_token=api_token,
+        state_path=state_path,
+        filters=filters,
+        limit=limit,
+        poller=poller,
+        rules=rules,
+        interval=interval,
+        jitter=jitter,
+        refresh_interval=refresh_interval,
+        concurrency=concurrency,
+        page_size=page_size,
+        threaded=threaded,
+        on_refresh=lambda: [cache.save() for cache in (usm_cache, health) if cache is not None],
+    )
+
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stop.set())
+
+    server = None
+    if listen:
+        host, _, port = listen.rpartition(":")
+        server = ResultsServer((host or "127.0.0.1", int(port)), daemon)
+        threading.Thread(target=server.serve_forever, name="results-endpoint", daemon=True).start()
+        print(f"Serving results on http://{host or '127.0.0.1'}:{server.server_port}/results")
+
+    try:
+        daemon.run(stop)
+    finally:
+        if server is not None:
+            server.shutdown()
+        if usm_cache is not None:
+            usm_cache.save()
+        health.save()
+        err_report.stop_worker()
+
+
+class ComplianceDaemon:
+    """Checks every selected device on its own schedule and keeps the latest result of each.
+
+    The inventory is kept in memory and refreshed incrementally (inventory_sync), so a refresh
+    costs a few small Netbox queries; new devices get a slot, removed ones are dropped and
+    changed ones are checked with their new data at their usual slot. Polling load is spread
+    evenly over the interval by device_scheduler.DeviceScheduler.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        api_token: str,
+        state_path: str,
+        filters: dict = None,
+        limit: int = None,
+        poller: snmp_utils.SnmpPoller = None,
+        rules: list = None,
+        interval: float = 900,
+        jitter: float = 0.1,
+        refresh_interval: float = 300,
+        concurrency: int = 20,
+        page_size: int = netbox_utils.DEFAULT_PAGE_SIZE,
+        threaded: bool = False,
+        on_refresh=None,
+    ):
+        """
+        Args:
+            url (str): Netbox URL.
+            api_token (str): Netbox API Token.
+            state_path (str): Inventory state file kept between refreshes and restarts.
+            filters (dict, optional): Netbox device filters. Defaults to active base_compliancy.DEFAULT_ROLES devices.
+            limit (int, optional): Check at most this many devices. Defaults to None (all).
+            poller (snmp_utils.SnmpPoller, optional): Poller shared by every check. Defaults to the shared poller.
+            rules (list, optional): Compliance rules. Defaults to compliance_rules.get_default_rules().
+            interval (float, optional): Seconds between two checks of the same device. Defaults to 900.
+            jitter (float, optional): Largest random offset of a check, as a fraction of interval. Defaults to 0.1.
+            refresh_interval (float, optional): Seconds between two inventory refreshes. Defaults to 300.
+            concurrency (int, optional): Maximum number of devices checked at once. Defaults to 20.
+            page_size (int, optional): Objects fetched per Netbox page. Defaults to netbox_utils.DEFAULT_PAGE_SIZE.
+            threaded (bool, optional): Fetch Netbox pages in parallel. Defaults to False.
+            on_refresh (callable, optional): Called after every inventory refresh, e.g. to persist caches. Defaults to None.
+        """
+
+        self.url = url
+        self.api_token = api_token
+        self.state_path = state_path
+        self.filters = filters if filters is not None else netbox_utils.build_device_filters(roles=base_compliancy.DEFAULT_ROLES)
+        self.limit = limit
+        self.poller = poller
+        self.rules = rules if rules is not None else compliance_rules.get_default_rules()
+        self.refresh_interval = refresh_interval
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.threaded = threaded
+        self.on_refresh = on_refresh
+        self.scheduler = device_scheduler.DeviceScheduler(interval, jitter=jitter)
+
+        self.started_at = time.time()
+        self.refreshed_at = None
+        self.checks = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+        self._devices = {}
+        self._results = {}
+        self._in_flight = set()
+
+    def refresh_inventory(self, now: float = None):
+        """Brings the device set up to date with Netbox and (un)schedules devices accordingly.
+
+        The device-type OID index is reloaded as well, so OIDs edited in Netbox are picked up and
+        re-validated. Netbox errors are reported and the previous inventory is kept.
+
+        Args:
+            now (float, optional): Current epoch time. Defaults to time.time().
+        """
+
+        now = time.time() if now is None else now
+
+        try:
+            nb = netbox_utils.get_netbox_client(url=self.url, api_token=self.api_token, threaded=self.threaded)
+            entries, _ = inventory_sync.sync_inventory(
+                nb,
+                url=self.url,
+                state_path=self.state_path,
+                filters=self.filters,
+                page_size=self.page_size,
+                limit=self.limit,
+            )
+            # The first refresh uses the index main() loaded, possibly from its cache file
+            index = netbox_utils.load_devicetype_oid_index(
+                api_token=self.api_token, url=self.url, page_size=self.page_size, refresh=self.refreshed_at is not None
+            )
+            devices = {entry["id"]: self._snapshot(nb, index, entry) for entry in entries}
+        except (pynetbox.core.query.RequestError, pynetbox.core.query.ContentError, requests.RequestException) as e:
+            error_message = "ERROR: Netbox Request error, keeping the previous inventory."
+            err_report.log_parser(err.DataError(message=error_message, extra_data={"original_exception": e}))
+            return
+
+        with self._lock:
+            for device_id in self._devices.keys() - devices.keys():
+                self.scheduler.remove(device_id)
+                self._results.pop(device_id, None)
+            self._devices = devices
+            self.refreshed_at = now
+
+        for device_id in devices:
+            self.scheduler.add(device_id, now)
+
+        if self.on_refresh is not None:
+            self.on_refresh()
+
+    def run(self, stop: threading.Event):
+        """Dispatches due devices to the worker pool until stop is set.
+
+        Args:
+            stop (threading.Event): Set to shut the daemon down; checks in flight are finished first.
+        """
+
+        next_refresh = time.time()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="check") as executor:
+            while not stop.is_set():
+                now = time.time()
+                if now >= next_refresh:
+                    self.refresh_inventory(now)
+                    next_refresh = now + self.refresh_interval
+
+                for device_id in self.scheduler.pop_due(now):
+                    with self._lock:
+                        device = self._devices.get(device_id)
+                        if device is None:
+                            continue
+                        if device_id in self._in_flight:
+                            # Still being checked since its previous slot
+                            self.skipped += 1
+                            continue
+                        self._in_flight.add(device_id)
+                    executor.submit(self.check, device)
+
+                next_due = self.scheduler.next_due()
+                wake_at = next_refresh if next_due is None else min(next_due, next_refresh)
+                stop.wait(min(max(wake_at - time.time(), 0), 1.0))
+
+    def check(self, device) -> dict:
+        """Checks one device and records the result. Errors are reported as usual.
+
+        Args:
+            device (DeviceSnapshot): Device to check.
+
+        Returns:
+            dict: The device's result, see results().
+        """
+
+        started = time.time()
+        try:
+            live_data = base_compliancy.check_device(device, self.api_token, self.url, poller=self.poller, rules=self.rules)
+            base_compliancy.compare_data(device, live_data, rules=self.rules)
+            errors = []
+        except err.DataError as e:
+            err_report.log_parser(e)
+            errors = getattr(e, "errors", [e])
+        except Exception as e:
+            error = err.DataError(
+                message=f"ERROR: {device} - Unexpected error: {e!r}",
+                error_type="CheckFailed",
+                device=device,
+                extra_data={"original_exception": e},
+            )
+            err_report.log_parser(error)
+            errors = [error]
+        finally:
+            with self._lock:
+                self._in_flight.discard(device.id)
+
+        result = {
+            "id": device.id,
+            "name": device.name,
+            "ip": device.ip,
+            "compliant": not errors,
+            "errors": [{"type": error.error_type, "message": str(error)} for error in errors],
+            "checked_at": started,
+            "seconds": round(time.time() - started, 3),
+        }
+        with self._lock:
+            if device.id in self._devices:
+                self._results[device.id] = result
+            self.checks += 1
+        return result
+
+    def results(self, compliant: bool = None) -> list:
+        """Returns the latest result of every checked device, ordered by name.
+
+        Args:
+            compliant (bool, optional): Only compliant (True) or non-compliant (False) devices. Defaults to None (all).
+
+        Returns:
+            list: Dicts with the device's 'id', 'name', 'ip', 'compliant', 'errors' (type and message of each),
+                'checked_at' (epoch time) and 'seconds' the check took.
+        """
+
+        with self._lock:
+            results = list(self._results.values())
+        if compliant is not None:
+            results = [result for result in results if result["compliant"] == compliant]
+        return sorted(results, key=lambda result: result["name"] or "")
+
+    def status(self) -> dict:
+        """Returns the daemon's own state, for the /status endpoint."""
+
+        with self._lock:
+            return {
+                "started_at": self.started_at,
+                "inventory_refreshed_at": self.refreshed_at,
+                "devices": len(self._devices),
+                "checked": len(self._results),
+                "non_compliant": sum(not result["compliant"] for result in self._results.values()),
+                "in_flight": len(self._in_flight),
+                "checks": self.checks,
+                "skipped_overrunning": self.skipped,
+                "interval": self.scheduler.interval,
+                "next_due": self.scheduler.next_due(),
+            }
+
+    def _snapshot(self, nb, index: dict, entry: dict):
+        type_id = entry["device_type"]
+        if type_id is not None and type_id not in index["models"]:
+            # Device type created while the daemon was running
+            device_type = nb.dcim.device_types.get(type_id)
+            if device_type is not None:
+                netbox_utils.prime_devicetype_oid_index(
+                    self.url,
+                    [{"id": device_type.id, "model": device_type.model, "custom_fields": device_type.custom_fields}],
+                )
+        return inventory_snapshot.entry_to_snapshot(
+            entry, model=index["models"].get(type_id), oids=index["by_id"].get(type_id)
+        )
+
+
+class ResultsServer(ThreadingHTTPServer):
+    """Read-only JSON endpoint over a ComplianceDaemon's latest results.
+
+    GET /results             every checked device (?compliant=true/false to filter)
+    GET /results/<name>      one device, by name
+    GET /status              the daemon's own state
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple, daemon: ComplianceDaemon):
+        """
+        Args:
+            address (tuple): (host, port) to listen on.
+            daemon (ComplianceDaemon): Daemon whose results are served.
+        """
+
+        super().__init__(address, _ResultsHandler)
+        self.compliance_daemon = daemon
+
+
+class _ResultsHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        daemon = self.server.compliance_daemon
+        parsed = urlparse(self.path)
+        path = parsed.path.rstrip("/")
+
+        if path == "/status":
+            return self._send(daemon.status())
+
+        if path == "/results":
+            compliant = parse_qs(parsed.query).get("compliant", [None])[0]
+            if compliant is not None:
+                compliant = compliant.lower() in ("1", "true", "yes")
+            return self._send({"results": daemon.results(compliant=compliant)})
+
+        if path.startswith("/results/"):
+            name = unquote(path[len("/results/"):])
+            for result in daemon.results():
+                if result["name"] == name:
+                    return self._send(result)
+
+        self._send({"detail": "Not found."}, status=404)
+
+    def _send(self, payload: dict, status: int = 200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+if __name__ == "__main__":
+    # Constants
+    ENVIRONMENTS = {
+        "prod": {"url": "https://prod-netbox.domain", "env_var": "prod_nb_token"},
+        "dev": {"url": "https://netbox-dev.domain", "env_var": "dev_nb_token"},
+    }
+
+    load_dotenv()
+
+    # Load and parse arguments
+    parser = argparse.ArgumentParser(description="Continuously checks device compliance, each device on its own schedule")
+    parser.add_argument(
+        "-env",
+        choices=ENVIRONMENTS.keys(),
+        help="Choose 'prod' or 'dev' environment",
+        required=True,
+    )
+    netbox_utils.add_device_selection_arguments(parser, default_roles=base_compliancy.DEFAULT_ROLES)
+    parser.add_argument(
+        "-state",
+        required=True,
+        help="Inventory state file, refreshed incrementally from Netbox",
+    )
+    parser.add_argument(
+        "-interval",
+        type=float,
+        default=900,
+        help="Seconds between two checks of the same device",
+    )
+    parser.add_argument(
+        "-jitter",
+        type=float,
+        default=0.1,
+        help="Largest random offset of a check, as a fraction of -interval",
+    )
+    parser.add_argument(
+        "-refresh_interval",
+        type=float,
+        default=300,
+        help="Seconds between two inventory refreshes",
+    )
+    parser.add_argument(
+        "-concurrency",
+        type=int,
+        default=20,
+        help="Maximum number of devices checked at once",
+    )
+    parser.add_argument(
+        "-listen",
+        default=DEFAULT_LISTEN,
+        help="host:port of the local results endpoint ('' disables it)",
+    )
+    parser.add_argument(
+        "-snmp_cache",
+        help="Path of a file caching SNMPv3 engine IDs and localized keys",
+    )
+    parser.add_argument(
+        "-snmp_health",
+        help="Path of a file keeping per-device SNMP round-trip times and circuit-breaker state",
+    )
+    parser.add_argument(
+        "-devicetype_cache",
+        help="Path of a file caching the device-type OID map",
+    )
+    parser.add_argument(
+        "-page_size",
+        type=int,
+        default=netbox_utils.DEFAULT_PAGE_SIZE,
+        help="Objects fetched per Netbox API page",
+    )
+    parser.add_argument(
+        "-threaded",
+        action="store_true",
+        help="Fetch Netbox API pages in parallel",
+    )
+    parser.add_argument(
+        "-rules",
+        help="Compliance rules file. Defaults to src/rules/compliance.json",
+    )
+    parser.add_argument(
+        "-aggregate_window",
+        type=float,
+        default=0,
+        help="Seconds repeats of the same error on different devices are collapsed into one report for (0 disables)",
+    )
+    args = parser.parse_args()
+    running_env = args.env
+
+    # Get environment configuration
+    env_config = ENVIRONMENTS[running_env]
+    url = env_config["url"]
+    api_token = os.environ.get(env_config["env_var"])
+    if api_token is None:
+        raise ValueError(f"API token for {running_env} environment not found")
+
+    main(
+        url,
+        api_token,
+        state_path=args.state,
+        filters=netbox_utils.build_device_filters(
+            roles=args.role,
+            sites=args.site,
+            tags=args.tag,
+            tenants=args.tenant,
+            name_regex=args.name_regex,
+        ),
+        limit=args.limit,
+        interval=args.interval,
+        jitter=args.jitter,
+        refresh_interval=args.refresh_interval,
+        concurrency=args.concurrency,
+        listen=args.listen or None,
+        snmp_cache_path=args.snmp_cache,
+        snmp_health_path=args.snmp_health,
+        devicetype_cache_path=args.devicetype_cache,
+        page_size=args.page_size,
+        threaded=args.threaded,
+        rules_path=args.rules,
+        aggregate_window=args.aggregate_window,
+    )
@@ -0,0 +1,75 @@
+# Standard Library
+import argparse
+import json
+
+# Custom imports
+from utils import results_store
+
+
+def main(
+    path: str,
+    run_id: int = None,
+    device: str = None,
+    error_type: str = None,
+    new_only: bool = False,
+    resolved: bool = False,
+    runs: int = None,
+) -> list:
+    """Queries the results store written by base_compliancy.py -results_db.
+
+    Args:
+        path (str): Results database file.
+        run_id (int, optional): Run to query. Defaults to None (the latest run).
+        device (str, optional): Device name; without error_type/new_only/resolved, lists the device's history.
+            Defaults to None.
+        error_type (str, optional): Only violations of this error type. Defaults to None.
+        new_only (bool, optional): Only violations the previous run with the same selection didn't have. Defaults to False.
+        resolved (bool, optional): List the previous run's violations that are gone instead. Defaults to False.
+        runs (int, optional): List this many latest runs instead. Defaults to None.
+
+    Returns:
+        list: The matching rows, also printed as JSON lines.
+    """
+
+    store = results_store.ResultsStore(path)
+    try:
+        if runs:
+            rows = store.runs(limit=runs)
+        elif resolved:
+            rows = store.resolved(run_id)
+        elif device is not None and error_type is None and not new_only and run_id is None:
+            rows = store.device_history(device)
+        else:
+            rows = store.violations(run_id=run_id, error_type=error_type, device=device, new_only=new_only)
+    finally:
+        store.close()
+
+    for row in rows:
+        print(json.dumps(row))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Queries stored compliance results")
+    parser.add_argument(
+        "-db",
+        required=True,
+        help="Results database written by base_compliancy.py -results_db",
+    )
+    parser.add_argument("-run", type=int, help="Run id. Defaults to the latest run")
+    parser.add_argument("-device", help="Device name; on its own, lists the device's result history")
+    parser.add_argument("-error_type", help="Only violations of this error type")
+    parser.add_argument("-new", action="store_true", help="Only violations that are new since the previous run")
+    parser.add_argument("-resolved", action="store_true", help="List violations resolved since the previous run")
+    parser.add_argument("-runs", type=int, help="List this many latest runs")
+    args = parser.parse_args()
+
+    main(
+        args.db,
+        run_id=args.run,
+        device=args.device,
+        error_type=args.error_type,
+        new_only=args.new,
+        resolved=args.resolved,
+        runs=args.runs,
+    )
@@ -1,4 +1,4 @@
-import pynetbox
+from utils.device_snapshot import DeviceSnapshot
 
 class DataError(Exception):
     """This custom error class allows you to add data to raised Errors for additional
@@ -6,7 +6,7 @@ class DataError(Exception):
     """
     def __init__(self, message, 
             error_type: str = "", 
-            device: pynetbox.models.dcim.Devices = {}, 
+            device: DeviceSnapshot = {}, 
             extra_data: dict = {}
             ):
         """Used to package base_compliancy module errors for error_reporting module
@@ -14,7 +14,7 @@ class DataError(Exception):
         Args:
             message (str): Nominal error message
             error_type (str, optional): Type of error used for parsing. Defaults to empty string.
-            device_data (pynetbox.models.dcim.Devices, optional): Netbox device object from pynetbox. Defaults to empty dict.
+            device (DeviceSnapshot, optional): Snapshot of the Netbox device the error is about. Defaults to empty dict.
             extra_data (dict, optional): Arbitrary additional data. Defaults to empty dict.
         """
         super().__init__(message)
@@ -22,6 +22,52 @@ class DataError(Exception):
         self.device = device
         self.extra_data = extra_data
 
+class DataErrorGroup(DataError):
+    """Carries several DataErrors about one device, e.g. every rule it violated, so they are
+    raised together and reported one by one.
+    """
+    def __init__(self, errors: list):
+        """
+        Args:
+            errors (list): The DataErrors, in the order they should be reported.
+        """
+        super().__init__(
+            message="; ".join(str(error) for error in errors),
+            error_type="DataErrorGroup",
+            device=errors[0].device if errors else {},
+        )
+        self.errors = errors
+
+class AggregatedDataError(DataError):
+    """Stands in for many DataErrors that describe the same problem on different devices, e.g.
+    every SNMPBadDigest after a credential rotation, so it is reported once.
+    """
+    def __init__(self, message, error_type: str, devices: list, count: int, samples: list, first_seen: float, last_seen: float):
+        """
+        Args:
+            message (str): The shared message, with device names and addresses normalized away.
+            error_type (str): Type of error used for parsing.
+            devices (list): Names of the affected devices, in the order their errors arrived.
+            count (int): Number of errors collapsed into this one.
+            samples (list): The most recent of the original DataErrors.
+            first_seen (float): Epoch time the first error arrived.
+            last_seen (float): Epoch time the last error arrived.
+        """
+        super().__init__(
+            message=f"{message} [{count} occurrences on {len(devices)} devices]",
+            error_type=error_type,
+            extra_data={
+                'count': count,
+                'devices': devices,
+                'first_seen': first_seen,
+                'last_seen': last_seen,
+                'samples': [{'device': str(sample.device), 'extra_data': sample.extra_data} for sample in samples],
+            },
+        )
+        self.devices = devices
+        self.count = count
+        self.samples = samples
+
 # collect_nb_devices custom errors
 class SNMPError(Exception):
     pass
@@ -37,7 +83,28 @@ class WrongSNMPDigest(SNMPError):
     pass
 
 class WrongSNMPOid(SNMPError):
-    pass
+    def __init__(self, message, oid_key: str = "", oid: str = ""):
+        """Raised when a requested OID is not numeric, or the device has no such object/instance for it.
+
+        Args:
+            message (str): Nominal error message
+            oid_key (str, optional): Caller-defined key the OID was requested under. Defaults to empty string.
+            oid (str, optional): The OID the device rejected. Defaults to empty string.
+        """
+        super().__init__(message)
+        self.oid_key = oid_key
+        self.oid = oid
 
 class OtherSNMPError(SNMPError):
-    pass
\ No newline at end of file
+    pass
+
+class CircuitOpenError(SNMPError):
+    def __init__(self, message, retry_at: float = 0):
+        """Raised instead of polling a device whose circuit is open after repeated timeouts.
+
+        Args:
+            message (str): Nominal error message
+            retry_at (float, optional): Epoch time the device will be probed again. Defaults to 0.
+        """
+        super().__init__(message)
+        self.retry_at = retry_at
\ No newline at end of file
@@ -1,6 +1,40 @@
+# Standard Library
+import atexit
+import collections
+import queue
+import re
+import sys
+import threading
+import time
+
+# Custom imports
+import error_handling.custom_errors as err
+from utils import run_metrics
+
+# error_types added at runtime, e.g. one per compliance rule. See register_error_type.
+registered_error_types = {}
+
+def register_error_type(error_type: str, reporter: str = 'api_reporter'):
+    """Routes an error_type that isn't in log_parser's table to a reporter of this module.
+
+    Args:
+        error_type (str): Type of error used for parsing.
+        reporter (str, optional): Name of the reporter function. Defaults to 'api_reporter'.
+
+    Raises:
+        ValueError: Alerts if the reporter is not a function of this module.
+    """
+    if not callable(globals().get(reporter)) or not reporter.endswith('_reporter'):
+        raise ValueError(f"Unknown reporter for error_type '{error_type}': '{reporter}'")
+    registered_error_types[error_type] = reporter
+
 def log_parser(DataError):
     """Receives custom DataError objects and routes error-logging requests to the correct
-    reporter function in this module.
+    reporter function in this module. Grouped errors (custom_errors.DataErrorGroup) are
+    reported one by one.
+
+    While a ReportingWorker is running (see start_worker), the reporters run on its thread
+    and this function only queues the error.
 
     Args:
         DataError: Custom error with extra data attributes from adjacent custom_errors module.
@@ -17,9 +51,11 @@ def log_parser(DataError):
 
         # Misc Errors
         'NetboxCompliancy': 'api_reporter',
+        'CheckFailed': 'api_reporter',
 
         # SNMP Issues
         'SNMPTimeout': 'api_reporter',
+        'SNMPCircuitOpen': 'api_reporter',
         'SNMPBadDigest': 'api_reporter',
         'SNMPBadOID': 'api_reporter',
         'OtherSNMPError': 'api_reporter',
@@ -37,15 +73,279 @@ def log_parser(DataError):
         'HardwareModelMismatch': 'api_reporter', 
         'SoftwareVersionMismatch': 'api_reporter', 
         'LongUptime': 'api_reporter', 
+
+        # Interface Types
+        'InterfaceMissing': 'api_reporter',
+        'InterfaceNotInNetbox': 'api_reporter',
+        'InterfaceAdminStatusMismatch': 'api_reporter',
+        'InterfaceOperDown': 'api_reporter',
+        'InterfaceDescriptionMismatch': 'api_reporter',
+        'InterfaceSpeedMismatch': 'api_reporter',
+
+        # Changes-only runs, see utils.results_store
+        'ViolationResolved': 'api_reporter',
     }
     
-    try: reporter_function = globals()[error_types[DataError.error_type]]
+    # Grouped errors, e.g. every rule a device violated
+    if hasattr(DataError, 'errors'):
+        for error in DataError.errors:
+            log_parser(error)
+        return
+
+    error_types.update(registered_error_types)
+    run_metrics.count('errors', DataError.error_type)
+
+    try: reporters = error_types[DataError.error_type]
     
     # Catches undefined error_types being passed to this func
     except KeyError as e: 
         raise ValueError(f"Unregistered error_type passed to log_parser func: '{DataError.error_type}'")
     
-    reporter_function(DataError)
+    for reporter in [reporters] if isinstance(reporters, str) else reporters:
+        worker = _worker
+        if worker is not None:
+            worker.submit(reporter, DataError)
+        else:
+            with run_metrics.timer('report'):
+                globals()[reporter](DataError)
+
+# Parts of a message that differ between devices reporting the same problem
+_IPV4_PATTERN = re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}(?:/\d{1,2})?\b")
+
+class ErrorAggregator:
+    """Collapses DataErrors that describe the same problem into one AggregatedDataError.
+
+    Errors are keyed by reporter, error_type and message, with the device's name and any IPv4
+    address normalized away. Per key only the count, the affected device names and a ring buffer
+    of the latest samples are kept. An error whose key was seen only once is passed through as is.
+    """
+
+    def __init__(self, samples: int = 5):
+        """
+        Args:
+            samples (int, optional): Original errors kept per key. Defaults to 5.
+        """
+        self.samples = samples
+        self._groups = {}
+
+    def add(self, reporter: str, DataError):
+        """Adds an error to its group.
+
+        Args:
+            reporter (str): Name of the reporter function.
+            DataError: Custom error with extra data attributes from adjacent custom_errors module.
+        """
+        key = (reporter, DataError.error_type, self.normalize(DataError))
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = {
+                'count': 0,
+                'devices': {},
+                'samples': collections.deque(maxlen=self.samples),
+                'first_seen': time.time(),
+            }
+        group['count'] += 1
+        if DataError.device:
+            group['devices'][str(DataError.device)] = None
+        group['samples'].append(DataError)
+        group['last_seen'] = time.time()
+
+    def drain(self) -> list:
+        """Empties the aggregator.
+
+        Returns:
+            list: (reporter, error) pairs, one per group, in the order the groups were first seen.
+        """
+        groups, self._groups = self._groups, {}
+
+        events = []
+        for (reporter, error_type, message), group in groups.items():
+            if group['count'] == 1:
+                events.append((reporter, group['samples'][0]))
+                continue
+            events.append((reporter, err.AggregatedDataError(
+                message=message,
+                error_type=error_type,
+                devices=list(group['devices']),
+                count=group['count'],
+                samples=list(group['samples']),
+                first_seen=group['first_seen'],
+                last_seen=group['last_seen'],
+            )))
+        return events
+
+    @staticmethod
+    def normalize(DataError) -> str:
+        """Returns the error's message with the parts that differ between devices replaced.
+
+        Args:
+            DataError: Custom error with extra data attributes from adjacent custom_errors module.
+
+        Returns:
+            str: Message with '<device>' and '<ip>' placeholders.
+        """
+        message = str(DataError)
+        if DataError.device and str(DataError.device):
+            message = message.replace(str(DataError.device), "<device>")
+        return _IPV4_PATTERN.sub("<ip>", message)
+
+class ReportingWorker:
+    """Runs the reporters on a background thread, so reporting never blocks device processing.
+
+    Errors wait in a bounded queue and are batched per reporter. A batch is sent when it is full
+    or flush_interval after its first error arrived, through the reporter's '<reporter>_batch'
+    function if this module has one, otherwise one error at a time. A failing send is retried with
+    exponential backoff, for the errors not yet delivered only: a batch function removes each error
+    from its list once reported. stop() sends everything still queued before returning.
+
+    With an aggregate_window, errors are first collapsed by an ErrorAggregator for that many
+    seconds, so reporter traffic scales with the number of distinct problems, not of devices.
+    """
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        queue_size: int = 10000,
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+        retries: int = 3,
+        retry_delay: float = 0.5,
+        aggregate_window: float = 0,
+        aggregate_samples: int = 5,
+    ):
+        """
+        Args:
+            queue_size (int, optional): Errors buffered before log_parser blocks. Defaults to 10000.
+            batch_size (int, optional): Errors sent to a reporter at once. Defaults to 100.
+            flush_interval (float, optional): Seconds an error may wait for its batch to fill. Defaults to 1.0.
+            retries (int, optional): Retries of a failed send before the batch is dropped. Defaults to 3.
+            retry_delay (float, optional): Seconds before the first retry, doubling for each next one. Defaults to 0.5.
+            aggregate_window (float, optional): Seconds repeats of an error are collapsed for. Defaults to 0 (disabled).
+            aggregate_samples (int, optional): Original errors kept per collapsed error. Defaults to 5.
+        """
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.aggregate_window = aggregate_window
+        self._aggregator = ErrorAggregator(aggregate_samples) if aggregate_window else None
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="error-reporting", daemon=True)
+        self._thread.start()
+
+    def submit(self, reporter: str, DataError):
+        """Queues an error for a reporter, blocking only while the queue is full.
+
+        Args:
+            reporter (str): Name of the reporter function.
+            DataError: Custom error with extra data attributes from adjacent custom_errors module.
+        """
+        self._queue.put((reporter, DataError))
+
+    def stop(self, timeout: float = None):
+        """Sends every queued error, then ends the worker thread.
+
+        Args:
+            timeout (float, optional): Seconds to wait for the drain. Defaults to None (no limit).
+        """
+        self._queue.put(self._STOP)
+        self._thread.join(timeout)
+
+    def _run(self):
+        batches = {}
+        deadline = None
+        window_end = None
+        while True:
+            wake = min((t for t in (deadline, window_end) if t is not None), default=None)
+            try: item = self._queue.get(timeout=None if wake is None else max(wake - time.monotonic(), 0))
+            except queue.Empty: item = None
+
+            if item is self._STOP:
+                if self._aggregator is not None:
+                    self._batch(batches, self._aggregator.drain())
+                for reporter in list(batches):
+                    self._send(reporter, batches.pop(reporter))
+                return
+
+            if item is not None and self._aggregator is not None:
+                self._aggregator.add(*item)
+                if window_end is None:
+                    window_end = time.monotonic() + self.aggregate_window
+            elif item is not None:
+                self._batch(batches, [item])
+
+            if window_end is not None and time.monotonic() >= window_end:
+                self._batch(batches, self._aggregator.drain())
+                window_end = None
+
+            if batches and deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+            if deadline is not None and time.monotonic() >= deadline:
+                for reporter in list(batches):
+                    self._send(reporter, batches.pop(reporter))
+                deadline = None
+
+    def _batch(self, batches: dict, events: list):
+        for reporter, DataError in events:
+            batches.setdefault(reporter, []).append(DataError)
+            if len(batches[reporter]) >= self.batch_size:
+                self._send(reporter, batches.pop(reporter))
+
+    def _send(self, reporter: str, batch: list):
+        batch_function = globals().get(f"{reporter}_batch")
+        for attempt in range(self.retries + 1):
+            try:
+                with run_metrics.timer('report'):
+                    self._deliver(reporter, batch_function, batch)
+                return
+            except Exception as e:
+                if attempt == self.retries:
+                    print(f"ERROR: {reporter} dropped {len(batch)} error reports: {e!r}", file=sys.stderr)
+                    return
+                time.sleep(self.retry_delay * 2 ** attempt)
+
+    def _deliver(self, reporter: str, batch_function, batch: list):
+        if batch_function is not None:
+            batch_function(batch)
+        else:
+            while batch:
+                globals()[reporter](batch[0])
+                del batch[0]
+
+# Running ReportingWorker, if any. See start_worker.
+_worker = None
+_worker_lock = threading.Lock()
+
+def start_worker(**options) -> ReportingWorker:
+    """Moves reporting onto a background ReportingWorker, drained when the process exits.
+
+    Args:
+        **options: ReportingWorker arguments.
+
+    Returns:
+        ReportingWorker: The running worker (the existing one if already started).
+    """
+    global _worker
+
+    with _worker_lock:
+        if _worker is None:
+            _worker = ReportingWorker(**options)
+            atexit.register(stop_worker)
+        return _worker
+
+def stop_worker(timeout: float = None):
+    """Drains and stops the background worker; reporters run inline again afterwards.
+
+    Args:
+        timeout (float, optional): Seconds to wait for the drain. Defaults to None (no limit).
+    """
+    global _worker
+
+    with _worker_lock:
+        worker, _worker = _worker, None
+    if worker is not None:
+        worker.stop(timeout)
 
 def api_reporter(DataError):
     """Function to report normalized data to defined API endpoint. 
@@ -61,6 +361,19 @@ def api_reporter(DataError):
     print(f"EXTRA DATA: {DataError.extra_data}")
     print("*" * 80)
 
+def api_reporter_batch(DataErrors: list):
+    """Function to report a batch of normalized data to defined API endpoint in one request.
+    This function should NOT be called directly. Use the adjacent log_parser function.
+
+    Reported errors are removed from DataErrors, so a retry after a failure sends only the rest.
+
+    Args:
+        DataErrors (list): Custom errors with extra data attributes from adjacent custom_errors module.
+    """
+    while DataErrors:
+        api_reporter(DataErrors[0])
+        del DataErrors[0]
+
 def smtp_reporter(DataError):
     """Function to report normalized data to defined email address.
     This function should NOT be called directly. Use the adjacent log_parser function.
@@ -0,0 +1,201 @@
+# Standard Library
+import argparse
+import os
+import sys
+
+# Non-Standard Library
+from dotenv import load_dotenv
+import pynetbox
+
+# Custom imports
+import error_handling.custom_errors as err
+import error_handling.error_reporting as err_report
+from utils import inventory_snapshot, netbox_graphql, netbox_utils
+
+# Every role an entry point selects by default, so one snapshot serves them all
+DEFAULT_ROLES = netbox_utils.INVENTORY_ROLES
+
+def main(
+    api_token: str,
+    url: str,
+    path: str,
+    filters: dict = None,
+    limit: int = None,
+    page_size: int = netbox_utils.DEFAULT_PAGE_SIZE,
+    threaded: bool = False,
+    backend: str = "rest",
+):
+    """Exports the Netbox inventory the entry points need to an offline snapshot file.
+
+    Args:
+        api_token (str): String representation of the service account's API token.
+        url (str): Full URL for the proper Netbox environment's API base endpoint.
+        path (str): Snapshot file to write. Paths ending in '.gz' are compressed.
+        filters (dict, optional): Netbox device filters, see netbox_utils.build_device_filters(). Defaults to active DEFAULT_ROLES devices.
+        limit (int, optional): Export at most this many devices. Defaults to None (all).
+        page_size (int, optional): Objects fetched per Netbox page. Defaults to netbox_utils.DEFAULT_PAGE_SIZE.
+        threaded (bool, optional): Fetch Netbox pages in parallel. Defaults to False.
+        backend (str, optional): Fetch inventory over Netbox's 'rest' API or in one 'graphql' query. Defaults to "rest".
+    """
+
+    try:
+        device_types, devices = collect_inventory(
+            url=url,
+            api_token=api_token,
+            filters=filters,
+            limit=limit,
+            page_size=page_size,
+            threaded=threaded,
+            backend=backend,
+        )
+        count = inventory_snapshot.write_inventory(path, url=url, device_types=device_types, devices=devices)
+        print(f"Exported {count} devices and {len(device_types)} device types to {path}")
+
+    except err.DataError as e:
+        err_report.log_parser(e)
+        sys.exit(1)
+    except Exception as e:
+        raise (e)
+
+
+def collect_inventory(
+    url: str,
+    api_token: str,
+    filters: dict = None,
+    limit: int = None,
+    page_size: int = netbox_utils.DEFAULT_PAGE_SIZE,
+    threaded: bool = False,
+    backend: str = "rest",
+) -> tuple:
+    """Collects devices, their DNS names and their device types' OIDs from Netbox.
+
+    Args:
+        url (str): URL of the Netbox instance you want to collect from.
+        api_token (str): API token used for connecting to the provided URL.
+        filters (dict, optional): Netbox device filters, see netbox_utils.build_device_filters(). Defaults to active DEFAULT_ROLES devices.
+        limit (int, optional): Collect at most this many devices. Defaults to None (all).
+        page_size (int, optional): Objects fetched per Netbox page. Defaults to netbox_utils.DEFAULT_PAGE_SIZE.
+        threaded (bool, optional): Fetch Netbox pages in parallel. Defaults to False.
+        backend (str, optional): Fetch inventory over Netbox's 'rest' API or in one 'graphql' query. Defaults to "rest".
+
+    Raises:
+        err.DataError: Custom data error for logging purposes in conjunction with error_handling.error_reporting.py
+
+    Returns:
+        tuple: (device-type entries, device entries) for inventory_snapshot.write_inventory().
+    """
+
+    if filters is None:
+        filters = netbox_utils.build_device_filters(roles=DEFAULT_ROLES)
+
+    try:
+        if backend == "graphql":
+            nb_devices = netbox_graphql.fetch_devices(
+                url=url,
+                api_token=api_token,
+                filters=filters,
+                limit=limit,
+                page_size=page_size,
+            )
+            dns_sources = {nb_device.id: _graphql_dns_source(nb_device) for nb_device in nb_devices}
+        else:
+            # Shared, connection-pooled NetBox API client
+            nb = netbox_utils.get_netbox_client(url=url, api_token=api_token, threaded=threaded)
+            nb_devices = list(netbox_utils.filter_devices(nb, filters, limit=limit, page_size=page_size))
+
+            # Resolve every DNS name (incl. VC masters') in bulk
+            dns_sources = netbox_utils.get_device_dns_sources(nb, nb_devices)
+
+            # Every device type's OIDs in one paginated request
+            netbox_utils.load_devicetype_oid_index(api_token=api_token, url=url, page_size=page_size)
+
+        device_types = {}
+        devices = []
+        for nb_device in nb_devices:
+            if nb_device.device_type and nb_device.device_type.id not in device_types:
+                oids = netbox_utils.resolve_devicetype_oids(
+                    device_type=nb_device.device_type, api_token=api_token, url=url
+                )
+                device_types[nb_device.device_type.id] = inventory_snapshot.device_type_entry(
+                    nb_device.device_type, oids
+                )
+            dns_ip = dns_sources.get(nb_device.id)
+            devices.append(
+                inventory_snapshot.device_entry(
+                    nb_device,
+                    dns_name=dns_ip.dns_name if dns_ip else None,
+                    dns_ip=dns_ip.id if dns_ip else None,
+                )
+            )
+
+        return list(device_types.values()), devices
+
+    except pynetbox.core.query.ContentError as e:
+        error_message = "ERROR: Incorrect Netbox URL passed to collect_inventory function."
+        raise err.DataError(message=error_message, extra_data={"original_exception": e})
+
+    except pynetbox.core.query.RequestError as e:
+        error_message = "ERROR: Netbox Request error."
+        raise err.DataError(message=error_message, extra_data={"original_exception": e})
+
+
+def _graphql_dns_source(device):
+    # The primary_ip4 object device_dns_name reads its DNS name from
+    source = device.virtual_chassis.master if device.virtual_chassis else device
+    return source.primary_ip4 if source is not None else None
+
+
+if __name__ == "__main__":
+    load_dotenv()
+
+    # Load and parse arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-url",
+        help="Netbox URL",
+        required=True,
+    )
+    parser.add_argument(
+        "-out",
+        default="artifacts/inventory.jsonl.gz",
+        help="Snapshot file to write. Paths ending in .gz are compressed",
+    )
+    netbox_utils.add_device_selection_arguments(parser, default_roles=DEFAULT_ROLES)
+    parser.add_argument(
+        "-backend",
+        choices=["rest", "graphql"],
+        default="rest",
+        help="Fetch inventory over Netbox's REST API or in one GraphQL query",
+    )
+    parser.add_argument(
+        "-page_size",
+        type=int,
+        default=netbox_utils.DEFAULT_PAGE_SIZE,
+        help="Objects fetched per Netbox API page",
+    )
+    parser.add_argument(
+        "-threaded",
+        action="store_true",
+        help="Fetch Netbox API pages in parallel",
+    )
+    args = parser.parse_args()
+
+    # Get environment configuration
+    api_token = os.environ.get("NB_API_TOKEN")
+
+    main(
+        api_token=api_token,
+        url=args.url,
+        path=args.out,
+        filters=netbox_utils.build_device_filters(
+            roles=args.role,
+            sites=args.site,
+            tags=args.tag,
+            tenants=args.tenant,
+            name_regex=args.name_regex,
+        ),
+        limit=args.limit,
+        page_size=args.page_size,
+        threaded=args.threaded,
+        backend=args.backend,
+    )
@@ -1,31 +1,109 @@
 # Standard Library
 import argparse
-from jinja2 import Environment, FileSystemLoader
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
 import os
+import re
 import sys
 
 # Non-Standard Library
 from dotenv import load_dotenv
 import pynetbox
+import requests
 
 # Custom imports
 import error_handling.custom_errors as err
 import error_handling.error_reporting as err_report
-
-
-def main(ssh_user: str, api_token: str, url: str):
+from utils import file_utils, inventory_snapshot, inventory_sync, netbox_graphql, netbox_utils
+from utils.device_snapshot import DeviceSnapshot
+
+# Device roles included when no -role is given
+DEFAULT_ROLES = netbox_utils.SSH_CONFIG_ROLES
+
+# Jinja templates shipped next to this script
+TEMPLATES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+
+# Compiled once per process, see get_ssh_conf_template()
+_ssh_conf_template = None
+
+# Stands in for the user while host blocks are rendered once for many users
+SSH_USER_PLACEHOLDER = "\x00ssh_user\x00"
+
+# Usernames become directory names in batch mode
+SSH_USER_PATTERN = re.compile(r"^[A-Za-z0-9_][A-Za-z0-9._-]*$")
+
+def main(
+    ssh_user: str,
+    api_token: str,
+    url: str,
+    page_size: int = netbox_utils.DEFAULT_PAGE_SIZE,
+    threaded: bool = False,
+    backend: str = "rest",
+    filters: dict = None,
+    limit: int = None,
+    snapshot_path: str = None,
+    state_path: str = None,
+    ssh_users: list = None,
+    out_dir: str = "artifacts/configs",
+    workers: int = 1,
+):
     """Main orchestrator function to be ran by CI/CD.
 
     Args:
         ssh_user (str): Username of the admin, typically .a account. Collected when running from CI/CD.
+            Ignored when ssh_users is given.
         api_token (str): String representation of the service account's API token.
         url (str): Full URL for the proper Netbox environment's API base endpoint.
+        page_size (int, optional): Objects fetched per Netbox page. Defaults to netbox_utils.DEFAULT_PAGE_SIZE.
+        threaded (bool, optional): Fetch Netbox pages in parallel. Defaults to False.
+        backend (str, optional): Fetch inventory over Netbox's 'rest' API or in one 'graphql' query. Defaults to "rest".
+        filters (dict, optional): Netbox device filters, see netbox_utils.build_device_filters(). Defaults to active DEFAULT_ROLES devices.
+        limit (int, optional): Include at most this many devices. Defaults to None (all).
+        snapshot_path (str, optional): Inventory snapshot file (see export_inventory.py) to read instead of querying Netbox. Defaults to None.
+        state_path (str, optional): Inventory state file kept between runs; when given, only changes since the
+            last run are fetched and the config is only rewritten if something changed. Defaults to None.
+        ssh_users (list, optional): Batch mode: write one config per user, all from a single inventory fetch,
+            to <out_dir>/<user>/config. Defaults to None.
+        out_dir (str, optional): Directory of the per-user configs in batch mode. Defaults to "artifacts/configs".
+        workers (int, optional): Per-user configs written in parallel in batch mode. Defaults to 1.
     """
 
+    if ssh_users:
+        config_paths = [user_config_path(out_dir, user) for user in ssh_users]
+    else:
+        config_paths = ["artifacts/config"]
+
     try:
-        devices = collect_nb_devices(url=url, api_token=api_token)
-        ssh_conf = render_ssh_conf(devices=devices, ssh_user=ssh_user)
-        write_to_file(ssh_conf)
+        if state_path is not None:
+            devices, changed = collect_nb_devices_incremental(
+                url=url,
+                api_token=api_token,
+                state_path=state_path,
+                ssh_user=sorted(ssh_users) if ssh_users else ssh_user,
+                filters=filters,
+                page_size=page_size,
+                threaded=threaded,
+            )
+            if not changed and all(os.path.exists(path) for path in config_paths):
+                print(f"No inventory changes since the last run, keeping {', '.join(config_paths)}")
+                return
+        else:
+            devices = collect_nb_devices(
+                url=url,
+                api_token=api_token,
+                filters=filters,
+                limit=limit,
+                page_size=page_size,
+                threaded=threaded,
+                backend=backend,
+                snapshot_path=snapshot_path,
+            )
+
+        if ssh_users:
+            write_user_configs(devices=devices, ssh_users=ssh_users, out_dir=out_dir, workers=workers)
+        else:
+            ssh_conf = render_ssh_conf(devices=devices, ssh_user=ssh_user)
+            write_to_file(ssh_conf)
 
     except err.DataError as e:
         err_report.log_parser(e)
@@ -34,49 +112,76 @@ def main(ssh_user: str, api_token: str, url: str):
         raise (e)
 
 
-def collect_nb_devices(url: str, api_token: str) -> set:
-    """Collects relevant Netbox devices' hostnames and returns them as a list.
+def collect_nb_devices(
+    url: str,
+    api_token: str,
+    filters: dict = None,
+    limit: int = None,
+    page_size: int = netbox_utils.DEFAULT_PAGE_SIZE,
+    threaded: bool = False,
+    backend: str = "rest",
+    snapshot_path: str = None,
+) -> set:
+    """Collects relevant Netbox devices, with their DNS names, as DeviceSnapshots.
 
     Args:
         url (str): URL of the Netbox instance you want to collect from.
         api_token (str): API token used for connecting to the provided URL.
+        filters (dict, optional): Netbox device filters, see netbox_utils.build_device_filters(). Defaults to active DEFAULT_ROLES devices.
+        limit (int, optional): Collect at most this many devices. Defaults to None (all).
+        page_size (int, optional): Devices fetched per Netbox page. Defaults to netbox_utils.DEFAULT_PAGE_SIZE.
+        threaded (bool, optional): Fetch Netbox pages in parallel. Defaults to False.
+        backend (str, optional): Fetch inventory over Netbox's 'rest' API or in one 'graphql' query. Defaults to "rest".
+        snapshot_path (str, optional): Inventory snapshot file to read instead of querying Netbox. Defaults to None.
 
     Raises:
         err.DataError: Custom data error for logging purposes in conjunction with error_handling.error_reporting.py
 
     Returns:
-        set: Set of collected devices' hostnames.
+        set: Set of DeviceSnapshots.
     """
 
-    NB_ROLE_SEARCHLIST = ["production-switches", "production-routers"]
+    if filters is None:
+        filters = netbox_utils.build_device_filters(roles=DEFAULT_ROLES)
+
+    # Offline: the snapshot already holds the resolved DNS names
+    if snapshot_path is not None:
+        return {
+            device.replace(dns_name=device.dns_name or "FIX_ME_IN_NETBOX")
+            for device in inventory_snapshot.read_inventory(snapshot_path, filters=filters, limit=limit)
+        }
+
+    if backend == "graphql":
+        devices = set()
+
+        for nb_device in netbox_graphql.fetch_devices(
+            url=url,
+            api_token=api_token,
+            filters=filters,
+            limit=limit,
+            page_size=page_size,
+        ):
+            dns_name = netbox_graphql.device_dns_name(nb_device) or "FIX_ME_IN_NETBOX"
+            devices.add(DeviceSnapshot.from_record(nb_device, dns_name=dns_name))
+
+        return devices
 
     try:
-        # Initialize NetBox API
-        nb = pynetbox.api(url=url, token=api_token)
+        # Shared, connection-pooled NetBox API client
+        nb = netbox_utils.get_netbox_client(url=url, api_token=api_token, threaded=threaded)
 
         # Fetch devices
-        nb_devices = nb.dcim.devices.filter(status="active", role=NB_ROLE_SEARCHLIST)
+        nb_devices = list(netbox_utils.filter_devices(nb, filters, limit=limit, page_size=page_size))
+
+        # Resolve every DNS name (incl. VC masters') in bulk, outside the device loop
+        dns_names = netbox_utils.get_device_dns_names(nb, nb_devices)
 
         # Output set
         devices = set()
 
         for nb_device in nb_devices:
-            try:
-                if nb_device.virtual_chassis:
-                    vc_master = nb_device.virtual_chassis.master.name
-                    dvc_lookup = nb.dcim.devices.get(name=vc_master)
-                    dns_name = dvc_lookup.primary_ip4.dns_name
-                    nb_device.dns_name = dns_name
-                else:
-                    nb_device.dns_name = nb_device.primary_ip4.dns_name
-
-                if nb_device.dns_name == "":
-                    nb_device.dns_name = "FIX_ME_IN_NETBOX"
-
-            except AttributeError as e:
-                nb_device.dns_name = "FIX_ME_IN_NETBOX"
-
-            devices.add(nb_device)
+            dns_name = dns_names.get(nb_device.id) or "FIX_ME_IN_NETBOX"
+            devices.add(DeviceSnapshot.from_record(nb_device, dns_name=dns_name))
 
         return devices
 
@@ -108,23 +213,205 @@ def collect_nb_devices(url: str, api_token: str) -> set:
         raise err.DataError(message=error_message, extra_data={"original_exception": e})
 
 
+def collect_nb_devices_incremental(
+    url: str,
+    api_token: str,
+    state_path: str,
+    ssh_user: str,
+    filters: dict = None,
+    page_size: int = netbox_utils.DEFAULT_PAGE_SIZE,
+    threaded: bool = False,
+) -> tuple:
+    """Collects relevant Netbox devices by updating the inventory state of the previous run.
+
+    See inventory_sync.sync_inventory for what is fetched. Typical re-runs cost a handful of
+    small queries instead of a full inventory pull.
+
+    Args:
+        url (str): URL of the Netbox instance you want to collect from.
+        api_token (str): API token used for connecting to the provided URL.
+        state_path (str): Inventory state file kept between runs.
+        ssh_user (str): SSH user (or list of users) the config is rendered for; changing it counts as a change.
+        filters (dict, optional): Netbox device filters, see netbox_utils.build_device_filters(). Defaults to active DEFAULT_ROLES devices.
+        page_size (int, optional): Objects fetched per Netbox page. Defaults to netbox_utils.DEFAULT_PAGE_SIZE.
+        threaded (bool, optional): Fetch Netbox pages in parallel. Defaults to False.
+
+    Raises:
+        err.DataError: Custom data error for logging purposes in conjunction with error_handling.error_reporting.py
+
+    Returns:
+        tuple: (set of DeviceSnapshots, bool telling whether anything changed since the last run).
+    """
+
+    if filters is None:
+        filters = netbox_utils.build_device_filters(roles=DEFAULT_ROLES)
+
+    # Shared, connection-pooled NetBox API client
+    nb = netbox_utils.get_netbox_client(url=url, api_token=api_token, threaded=threaded)
+
+    try:
+        entries, changed = inventory_sync.sync_inventory(
+            nb,
+            url=url,
+            state_path=state_path,
+            filters=filters,
+            page_size=page_size,
+            context={"ssh_user": ssh_user},
+        )
+    except (pynetbox.core.query.RequestError, pynetbox.core.query.ContentError, requests.RequestException) as e:
+        error_message = "ERROR: Netbox Request error."
+        raise err.DataError(message=error_message, extra_data={"original_exception": e})
+
+    devices = {
+        inventory_snapshot.entry_to_snapshot(entry).replace(dns_name=entry["dns_name"] or "FIX_ME_IN_NETBOX")
+        for entry in entries
+    }
+    return devices, changed
+
+
+def get_ssh_conf_template():
+    """Returns the SSH config template, compiled on first use and reused afterwards.
+
+    Returns:
+        jinja2.Template: Compiled ssh_conf.j2 template.
+    """
+
+    global _ssh_conf_template
+
+    if _ssh_conf_template is None:
+        # Imported here, so runs that leave the config untouched (and importers like export_inventory) skip jinja2
+        from jinja2 import Environment, FileSystemLoader
+
+        # Create a Jinja2 environment with the FileSystemLoader
+        templateLoader = FileSystemLoader(searchpath=TEMPLATES_PATH)
+        env = Environment(loader=templateLoader)
+
+        # Load the template from the specified directory
+        _ssh_conf_template = env.get_template("ssh_conf.j2")
+
+    return _ssh_conf_template
+
+
 def render_ssh_conf(devices: set, ssh_user: str):
-    # Create a Jinja2 environment with the FileSystemLoader
-    templateLoader = FileSystemLoader(searchpath="./src/templates/")
-    env = Environment(loader=templateLoader)
+    """Renders the SSH config lazily, host by host, in a stable order.
+
+    Args:
+        devices (set): DeviceSnapshots to include.
+        ssh_user (str): SSH username written for every host.
+
+    Returns:
+        iterator: Chunks of the rendered config, meant to be streamed to write_to_file().
+    """
+
+    # Sorted, so the same inventory always renders the same file
+    ordered_devices = sorted(devices, key=lambda device: (str(device), device.id))
+
+    return get_ssh_conf_template().generate(devices=ordered_devices, ssh_user=ssh_user)
+
+
+def write_user_configs(devices: set, ssh_users: list, out_dir: str = "artifacts/configs", workers: int = 1) -> dict:
+    """Writes one SSH config per user, rendering the shared host blocks only once.
+
+    The template is rendered a single time with a placeholder user; each user's config is then
+    streamed from those chunks with the placeholder swapped in.
+
+    Args:
+        devices (set): DeviceSnapshots to include.
+        ssh_users (list): SSH usernames to write a config for.
+        out_dir (str, optional): Each config goes to <out_dir>/<user>/config. Defaults to "artifacts/configs".
+        workers (int, optional): Configs written in parallel. Defaults to 1.
+
+    Returns:
+        dict: Maps each user to True if their config was written, False if it was already up to date.
+    """
+
+    shared_chunks = list(render_ssh_conf(devices=devices, ssh_user=SSH_USER_PLACEHOLDER))
+
+    def write(ssh_user):
+        return write_to_file(
+            (chunk.replace(SSH_USER_PLACEHOLDER, ssh_user) for chunk in shared_chunks),
+            path=user_config_path(out_dir, ssh_user),
+        )
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        return dict(zip(ssh_users, executor.map(write, ssh_users)))
+
+
+def user_config_path(out_dir: str, ssh_user: str) -> str:
+    """Returns where a user's config goes in batch mode.
+
+    Args:
+        out_dir (str): Directory of the per-user configs.
+        ssh_user (str): SSH username.
+
+    Raises:
+        ValueError: The username can't safely be used as a directory name.
 
-    # Load the template from the specified directory
-    template = env.get_template("ssh_conf.j2")
+    Returns:
+        str: <out_dir>/<ssh_user>/config
+    """
+
+    if not SSH_USER_PATTERN.match(ssh_user):
+        raise ValueError(f"Invalid SSH username: {ssh_user!r}")
+    return os.path.join(out_dir, ssh_user, "config")
+
+
+def read_ssh_users(path: str) -> list:
+    """Reads SSH usernames from a file, one per line. Blank lines and '#' comments are skipped.
+
+    Args:
+        path (str): File listing the users.
 
-    # Render the template with the provided data
-    ssh_conf = template.render(devices=devices, ssh_user=ssh_user)
+    Returns:
+        list: Usernames in file order, without duplicates.
+    """
 
-    return ssh_conf
+    with open(path) as f:
+        users = [line.split("#")[0].strip() for line in f]
+    return list(dict.fromkeys(user for user in users if user))
 
 
-def write_to_file(ssh_conf):
-    with open("artifacts/config", "w+") as f:
-        f.write(ssh_conf)
+def write_to_file(ssh_conf, path: str = "artifacts/config") -> bool:
+    """Streams the rendered config into a temporary file and atomically moves it into place.
+
+    The existing file is left untouched (same inode and mtime) when the new content hashes the
+    same, so downstream consumers see no spurious change.
+
+    Args:
+        ssh_conf (iterable): Chunks of the rendered config, or the whole config as one string.
+        path (str, optional): File to write. Defaults to "artifacts/config".
+
+    Returns:
+        bool: True if the file was written, False if it already held the same content.
+    """
+
+    if isinstance(ssh_conf, str):
+        ssh_conf = [ssh_conf]
+
+    digest = hashlib.sha256()
+
+    def hashed():
+        for chunk in ssh_conf:
+            digest.update(chunk.encode())
+            yield chunk
+
+    written = file_utils.write_atomic(
+        path, hashed(), prefix=".config.", replace_if=lambda: digest.hexdigest() != _file_digest(path)
+    )
+    if not written:
+        print(f"{path} is already up to date")
+    return written
+
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 16), b""):
+                digest.update(block)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
 
 
 if __name__ == "__main__":
@@ -134,22 +421,95 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "-ssh_user",
-        help="Provide your SSH username, usually your .a account.",
-        required=True,
+        nargs="+",
+        default=[],
+        help="Provide your SSH username, usually your .a account. Several users write one config each",
+    )
+    parser.add_argument(
+        "-ssh_users_file",
+        help="File with one SSH username per line; writes one config per user",
+    )
+    parser.add_argument(
+        "-out_dir",
+        default="artifacts/configs",
+        help="Directory of the per-user configs (<out_dir>/<user>/config) when several users are given",
+    )
+    parser.add_argument(
+        "-workers",
+        type=int,
+        default=1,
+        help="Per-user configs written in parallel",
     )
     parser.add_argument(
         "-url",
-        help="Netbox URL",
-        required=True,
+        help="Netbox URL. Not needed with -snapshot",
+    )
+    parser.add_argument(
+        "-snapshot",
+        help="Read devices from an inventory snapshot file (see export_inventory.py) instead of Netbox",
+    )
+    netbox_utils.add_device_selection_arguments(parser, default_roles=DEFAULT_ROLES)
+    parser.add_argument(
+        "-incremental",
+        metavar="STATE_FILE",
+        help="Keep the inventory in this file between runs, fetch only what changed and skip unchanged configs",
+    )
+    parser.add_argument(
+        "-backend",
+        choices=["rest", "graphql"],
+        default="rest",
+        help="Fetch inventory over Netbox's REST API or in one GraphQL query",
+    )
+    parser.add_argument(
+        "-page_size",
+        type=int,
+        default=netbox_utils.DEFAULT_PAGE_SIZE,
+        help="Objects fetched per Netbox API page",
+    )
+    parser.add_argument(
+        "-threaded",
+        action="store_true",
+        help="Fetch Netbox API pages in parallel",
     )
 
     # # Parse args
     args = parser.parse_args()
-    ssh_user = args.ssh_user
+    if args.url is None and args.snapshot is None:
+        parser.error("-url is required unless -snapshot is given")
+    if args.incremental and (args.snapshot or args.backend != "rest" or args.limit):
+        parser.error("-incremental works on the REST backend, without -snapshot or -limit")
+
+    ssh_users = list(args.ssh_user)
+    if args.ssh_users_file:
+        ssh_users += read_ssh_users(args.ssh_users_file)
+    ssh_users = list(dict.fromkeys(ssh_users))
+    if not ssh_users:
+        parser.error("-ssh_user or -ssh_users_file is required")
+
     url = args.url
 
     # # Get environment configuration
     api_token = os.environ.get("NB_API_TOKEN")
 
     # Pass collected data to main func
-    main(ssh_user=ssh_user, api_token=api_token, url=url)
+    main(
+        ssh_user=ssh_users[0],
+        api_token=api_token,
+        url=url,
+        page_size=args.page_size,
+        threaded=args.threaded,
+        backend=args.backend,
+        filters=netbox_utils.build_device_filters(
+            roles=args.role,
+            sites=args.site,
+            tags=args.tag,
+            tenants=args.tenant,
+            name_regex=args.name_regex,
+        ),
+        limit=args.limit,
+        snapshot_path=args.snapshot,
+        state_path=args.incremental,
+        ssh_users=ssh_users if len(ssh_users) > 1 or args.ssh_users_file else None,
+        out_dir=args.out_dir,
+        workers=args.workers,
+    )
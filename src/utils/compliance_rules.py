@@ -0,0 +1,197 @@
+# Standard Library
+import itertools
+import json
+import operator
+import os
+import re
+
+# Custom imports
+import error_handling.custom_errors as err
+
+
+# Rules shipped with the repo; see load_rules()
+DEFAULT_RULES_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "rules", "compliance.json"
+)
+
+# Loaded on first use, see get_default_rules()
+_default_rules = None
+
+# Rule stages: 'netbox' rules only read Netbox data and gate polling, 'live' rules compare polled data
+STAGES = ("netbox", "live")
+
+
+def _int(value):
+    return int(value) if value else 0
+
+def _hostname(value):
+    return str(value).split(".")[0].strip()
+
+# Named value normalizers a rule can apply to either side. None passes through untouched.
+NORMALIZERS = {
+    "none": lambda value: value,
+    "strip": lambda value: str(value).strip(),
+    "lower": lambda value: str(value).strip().lower(),
+    "hostname": _hostname,
+    "int": _int,
+}
+
+# Named comparators, called as comparator(observed, reference); True means compliant.
+COMPARATORS = {
+    "present": lambda observed, reference: observed is not None,
+    "equal": operator.eq,
+    "not_equal": operator.ne,
+    "less_than": lambda observed, reference: observed is not None and observed < reference,
+    "greater_than": lambda observed, reference: observed is not None and observed > reference,
+    "in": lambda observed, reference: observed in reference,
+    "regex": lambda observed, reference: observed is not None and re.search(reference, str(observed)) is not None,
+}
+
+
+class Rule:
+    """One declarative compliance check.
+
+    A rule observes a live field (or, for 'netbox' rules, a DeviceSnapshot field), normalizes it
+    and compares it against a reference: the normalized Netbox field when a 'live' rule names
+    both, otherwise the rule's constant 'expected' value.
+    """
+
+    __slots__ = (
+        "name", "stage", "netbox_field", "live_field", "netbox_normalizer", "live_normalizer",
+        "comparator", "expected", "message", "reporter",
+    )
+
+    def __init__(self, config: dict):
+        """
+        Args:
+            config (dict): Rule definition, e.g. one entry of rules/compliance.json.
+
+        Raises:
+            err.DataError: The definition is incomplete or names an unknown stage, normalizer or comparator.
+        """
+
+        unknown = set(config) - set(self.__slots__) - {"description"}
+        stage = config.get("stage", "live")
+        try:
+            if unknown:
+                raise ValueError(f"unknown keys {sorted(unknown)}")
+            if stage not in STAGES:
+                raise ValueError(f"unknown stage {stage!r}")
+            if stage == "netbox" and not config.get("netbox_field"):
+                raise ValueError("netbox rules need a netbox_field")
+            if stage == "live" and not config.get("live_field"):
+                raise ValueError("live rules need a live_field")
+
+            self.name = config["name"]
+            self.stage = stage
+            self.netbox_field = config.get("netbox_field")
+            self.live_field = config.get("live_field")
+            self.netbox_normalizer = NORMALIZERS[config.get("netbox_normalizer", "none")]
+            self.live_normalizer = NORMALIZERS[config.get("live_normalizer", "none")]
+            self.comparator = COMPARATORS[config["comparator"]]
+            self.expected = config.get("expected")
+            self.message = config.get("message", "ERROR: {device} - " + config["name"])
+            self.reporter = config.get("reporter", "api_reporter")
+
+        except (KeyError, ValueError) as e:
+            error_message = f"ERROR: Invalid compliance rule {config.get('name', config)!r}: {e}"
+            raise err.DataError(message=error_message, extra_data={"rule": config})
+
+    def __repr__(self):
+        return f"Rule({self.name!r})"
+
+
+def load_rules(path: str = None) -> list:
+    """Loads the compliance rules from a JSON file.
+
+    The file holds {"rules": [...]} where each entry configures a Rule. New checks only need a
+    new entry; their name becomes the error_type they are reported under.
+
+    Args:
+        path (str, optional): Rules file. Defaults to DEFAULT_RULES_PATH.
+
+    Raises:
+        err.DataError: The file is unreadable or holds an invalid rule.
+
+    Returns:
+        list: Rule objects, in file order.
+    """
+
+    path = path or DEFAULT_RULES_PATH
+    try:
+        with open(path) as f:
+            configs = json.load(f)["rules"]
+    except (OSError, ValueError, KeyError) as e:
+        error_message = f"ERROR: Could not read compliance rules from {path}."
+        raise err.DataError(message=error_message, extra_data={"original_exception": e})
+
+    return [Rule(config) for config in configs]
+
+
+def get_default_rules() -> list:
+    """Returns the rules from DEFAULT_RULES_PATH, loaded once per process.
+
+    Returns:
+        list: Rule objects.
+    """
+
+    global _default_rules
+
+    if _default_rules is None:
+        _default_rules = load_rules()
+    return _default_rules
+
+
+def evaluate(rules: list, devices: list, live_rows: list = None) -> list:
+    """Evaluates rules column-wise over a batch of devices.
+
+    Every rule runs over whole columns (one per field it reads), so each field is extracted and
+    normalized once per batch, and every violation of every device is found in one pass.
+
+    Args:
+        rules (list): Rules to evaluate. 'live' rules are skipped when live_rows is None.
+        devices (list): DeviceSnapshots, one per row.
+        live_rows (list, optional): Live data dict per device, in the same order. Defaults to None.
+
+    Returns:
+        list: Per device, in order, the list of (rule, observed, reference) violations.
+    """
+
+    violations = [[] for _ in devices]
+    netbox_columns = {}
+    live_columns = {}
+
+    def netbox_column(field):
+        if field not in netbox_columns:
+            netbox_columns[field] = [getattr(device, field, None) for device in devices]
+        return netbox_columns[field]
+
+    def live_column(field):
+        if field not in live_columns:
+            live_columns[field] = [row.get(field) for row in live_rows]
+        return live_columns[field]
+
+    for rule in rules:
+        if rule.stage == "live" and live_rows is None:
+            continue
+
+        netbox_values = None
+        if rule.netbox_field:
+            netbox_values = _normalize(rule.netbox_normalizer, netbox_column(rule.netbox_field))
+
+        if rule.stage == "live":
+            observed = _normalize(rule.live_normalizer, live_column(rule.live_field))
+            reference = netbox_values if netbox_values is not None else itertools.repeat(rule.expected)
+        else:
+            observed = netbox_values
+            reference = itertools.repeat(rule.expected)
+
+        for index, (observed_value, reference_value) in enumerate(zip(observed, reference)):
+            if not rule.comparator(observed_value, reference_value):
+                violations[index].append((rule, observed_value, reference_value))
+
+    return violations
+
+
+def _normalize(normalizer, column: list) -> list:
+    return [None if value is None else normalizer(value) for value in column]
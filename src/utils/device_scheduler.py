@@ -0,0 +1,107 @@
+# Standard Library
+import heapq
+import random
+import threading
+
+# Fractional part of the golden ratio; multiples of it mod 1 are spread about as evenly as possible
+_GOLDEN_FRACTION = 0.6180339887498949
+
+
+class DeviceScheduler:
+    """Gives every device its own polling slot within a fixed interval.
+
+    A device's slot is derived from its id alone (the golden-ratio sequence), so consecutive
+    Netbox ids land far apart, the slots of any set of devices cover the interval evenly, and a
+    restarted daemon polls each device at the same point of the interval as before. On top of
+    the slot, every poll gets a random offset of up to +/- jitter * interval, so devices that
+    happen to share a slot don't stay synchronized. Offsets never accumulate: each poll is due
+    one interval after the previous poll's slot, not after the previous (jittered) poll.
+    """
+
+    def __init__(self, interval: float, jitter: float = 0.1, seed: int = None):
+        """
+        Args:
+            interval (float): Seconds between two polls of the same device.
+            jitter (float, optional): Largest random offset of a poll, as a fraction of interval. Defaults to 0.1.
+            seed (int, optional): Seed of the jitter, for repeatable schedules. Defaults to None.
+        """
+
+        self.interval = interval
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._heap = []
+        self._slots = {}
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, device_id) -> bool:
+        return device_id in self._slots
+
+    def slot(self, device_id: int) -> float:
+        """Returns the device's offset, in seconds, within the interval."""
+
+        return (int(device_id) * _GOLDEN_FRACTION) % 1 * self.interval
+
+    def add(self, device_id: int, now: float):
+        """Schedules a device for its next slot after now. Devices already scheduled keep their slot.
+
+        Args:
+            device_id (int): Netbox device id.
+            now (float): Current epoch time.
+        """
+
+        with self._lock:
+            if device_id in self._slots:
+                return
+            slot = now - now % self.interval + self.slot(device_id)
+            if slot < now:
+                slot += self.interval
+            self._push(device_id, slot)
+
+    def remove(self, device_id: int):
+        """Stops scheduling a device. Its queued entry is skipped lazily."""
+
+        with self._lock:
+            self._slots.pop(device_id, None)
+
+    def pop_due(self, now: float) -> list:
+        """Returns the devices whose poll is due and schedules each for its next slot.
+
+        A device that is more than one interval late (e.g. after the daemon was suspended) is
+        returned once and moved to its next slot after now, not polled once per missed slot.
+
+        Args:
+            now (float): Current epoch time.
+
+        Returns:
+            list: Ids of the due devices, earliest first.
+        """
+
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                _, slot, device_id = heapq.heappop(self._heap)
+                if self._slots.get(device_id) != slot:
+                    # Removed, or re-added with another slot
+                    continue
+                due.append(device_id)
+                slot += self.interval
+                if slot < now:
+                    slot += (now - slot) // self.interval * self.interval + self.interval
+                self._push(device_id, slot)
+        return due
+
+    def next_due(self) -> float:
+        """Returns the epoch time the next poll is due, or None without any devices."""
+
+        with self._lock:
+            while self._heap and self._slots.get(self._heap[0][2]) != self._heap[0][1]:
+                heapq.heappop(self._heap)
+            return self._heap[0][0] if self._heap else None
+
+    def _push(self, device_id: int, slot: float):
+        offset = self._random.uniform(-self.jitter, self.jitter) * self.interval
+        self._slots[device_id] = slot
+        heapq.heappush(self._heap, (slot + offset, slot, device_id))
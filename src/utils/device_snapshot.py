@@ -0,0 +1,104 @@
+class DeviceSnapshot:
+    """Immutable, compact view of the Netbox data the scripts need about one device.
+
+    Built once from a pynetbox Record (or GraphQLRecord) at fetch time and used everywhere
+    after that, so no raw JSON, nested lazy records or API handles are kept alive, and reading
+    a field can never trigger a surprise request to Netbox.
+    """
+
+    __slots__ = ("id", "name", "serial", "primary_ip4", "model", "platform", "dns_name", "oids")
+
+    def __init__(
+        self,
+        id: int,
+        name: str,
+        serial: str = None,
+        primary_ip4: str = None,
+        model: str = None,
+        platform: str = None,
+        dns_name: str = None,
+        oids: dict = None,
+    ):
+        """
+        Args:
+            id (int): Netbox device id.
+            name (str): Device hostname.
+            serial (str, optional): Serial number. Defaults to None.
+            primary_ip4 (str, optional): Primary IPv4 address in CIDR notation. Defaults to None.
+            model (str, optional): Device type model (hardware model). Defaults to None.
+            platform (str, optional): Platform name (software version). Defaults to None.
+            dns_name (str, optional): DNS name to reach the device by. Defaults to None.
+            oids (dict, optional): SNMP OIDs of the device type, shared with every device of that type. Defaults to None.
+        """
+
+        for field, value in zip(
+            self.__slots__, (id, name, serial, primary_ip4, model, platform, dns_name, oids)
+        ):
+            object.__setattr__(self, field, value)
+
+    @classmethod
+    def from_record(cls, record, dns_name: str = None, oids: dict = None):
+        """Copies the needed fields out of a Netbox device record.
+
+        Only fields present on the device list response are read, so no nested record is fetched.
+
+        Args:
+            record: Device returned by pynetbox or netbox_graphql.fetch_devices.
+            dns_name (str, optional): DNS name resolved for the device. Defaults to None.
+            oids (dict, optional): SNMP OIDs of the device's type. Defaults to None.
+
+        Returns:
+            DeviceSnapshot: Snapshot of the device.
+        """
+
+        primary_ip4 = record.primary_ip4
+        device_type = record.device_type
+        platform = record.platform
+
+        return cls(
+            id=int(record.id),
+            name=record.name,
+            serial=record.serial,
+            primary_ip4=str(primary_ip4.address) if primary_ip4 else None,
+            model=device_type.model if device_type else None,
+            platform=platform.name if platform else None,
+            dns_name=dns_name,
+            oids=oids,
+        )
+
+    @property
+    def ip(self) -> str:
+        """str: Primary IPv4 address without the prefix length, or None."""
+
+        return self.primary_ip4.split("/")[0] if self.primary_ip4 else None
+
+    def replace(self, **changes):
+        """Returns a copy of the snapshot with the given fields changed.
+
+        Returns:
+            DeviceSnapshot: The new snapshot.
+        """
+
+        fields = {field: getattr(self, field) for field in self.__slots__}
+        fields.update(changes)
+        return type(self)(**fields)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __eq__(self, other):
+        if not isinstance(other, DeviceSnapshot):
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field) for field in self.__slots__)
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __str__(self):
+        return str(self.name)
+
+    def __repr__(self):
+        return f"DeviceSnapshot(id={self.id!r}, name={self.name!r})"
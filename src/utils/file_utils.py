@@ -0,0 +1,54 @@
+# Standard Library
+import os
+import tempfile
+
+
+def write_atomic(path: str, content, prefix: str = ".tmp.", mode: int = 0o644, opener=None, replace_if=None) -> bool:
+    """Writes a file through a private temporary file next to it, then moves it into place.
+
+    Readers see either the old file or the complete new one, and concurrent writers never
+    interleave their writes. The temporary file is removed if writing fails.
+
+    Args:
+        path (str): File to write.
+        content (str | iterable): The whole content, or chunks of it written as they are produced.
+        prefix (str, optional): Name prefix of the temporary file. Defaults to ".tmp.".
+        mode (int, optional): Permissions of the written file. Defaults to 0o644.
+        opener (callable, optional): Opens the temporary file (which keeps path's extension) for
+            writing text, e.g. compressed. Defaults to a plain UTF-8 text file.
+        replace_if (callable, optional): Called once the content is written; returning False discards it
+            and leaves path untouched. Defaults to None (always replace).
+
+    Returns:
+        bool: True if path was replaced.
+    """
+
+    if isinstance(content, str):
+        content = [content]
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=prefix, suffix=os.path.splitext(path)[1])
+
+    try:
+        if opener is None:
+            f = os.fdopen(fd, "w", encoding="utf-8")
+        else:
+            os.close(fd)
+            f = opener(tmp_path)
+        with f:
+            for chunk in content:
+                f.write(chunk)
+
+        if replace_if is not None and not replace_if():
+            os.unlink(tmp_path)
+            return False
+
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+        return True
+
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
@@ -0,0 +1,102 @@
+# Custom imports
+import error_handling.custom_errors as err
+
+# ifAdminStatus/ifOperStatus value of an interface that is up
+IF_STATUS_UP = 1
+
+# ifType of physical Ethernet ports; only these are expected to be modelled in Netbox
+IF_TYPE_ETHERNET = 6
+
+# Error types raised by evaluate(), one error per type and device listing every affected interface
+ERROR_MESSAGES = {
+    "InterfaceMissing": "Netbox interfaces not found on the device",
+    "InterfaceNotInNetbox": "Ethernet ports missing from Netbox",
+    "InterfaceAdminStatusMismatch": "interfaces whose admin status differs from Netbox",
+    "InterfaceOperDown": "connected interfaces that are down",
+    "InterfaceDescriptionMismatch": "interfaces whose description differs from Netbox",
+    "InterfaceSpeedMismatch": "interfaces whose speed differs from Netbox",
+}
+
+
+def match_interfaces(netbox_interfaces: list, live_table: dict) -> tuple:
+    """Joins a device's Netbox interfaces with its walked interface table, in memory.
+
+    Netbox names usually match ifDescr (GigabitEthernet1/0/1); ifName (Gi1/0/1) is tried next.
+
+    Args:
+        netbox_interfaces (list): The device's interfaces, see netbox_utils.get_interfaces().
+        live_table (dict): The device's ifTable/ifXTable rows, see snmp_utils.SnmpPoller.walk().
+
+    Returns:
+        tuple: ([(netbox interface, live row)], [Netbox interfaces not on the device], [live rows not in Netbox]).
+    """
+
+    by_name = {}
+    for column in ("name", "descr"):
+        for row in live_table.values():
+            if row.get(column):
+                by_name[row[column].strip().lower()] = row
+
+    pairs, missing, matched = [], [], set()
+    for interface in netbox_interfaces:
+        row = by_name.get((interface["name"] or "").strip().lower())
+        if row is None:
+            missing.append(interface)
+        else:
+            pairs.append((interface, row))
+            matched.add(id(row))
+
+    unknown = [row for row in live_table.values() if id(row) not in matched]
+    return pairs, missing, unknown
+
+
+def evaluate(device, netbox_interfaces: list, live_table: dict) -> list:
+    """Compares a device's interfaces with Netbox: presence, admin/oper status, descriptions and speeds.
+
+    Args:
+        device (DeviceSnapshot): Device the interfaces belong to.
+        netbox_interfaces (list): The device's interfaces, see netbox_utils.get_interfaces().
+        live_table (dict): The device's ifTable/ifXTable rows, see snmp_utils.SnmpPoller.walk().
+
+    Returns:
+        list: One err.DataError per ERROR_MESSAGES type the device violated, with the affected interfaces
+            (and, where it applies, the Netbox and live values) in extra_data['interfaces'].
+    """
+
+    pairs, missing, unknown = match_interfaces(netbox_interfaces, live_table)
+    found = {error_type: [] for error_type in ERROR_MESSAGES}
+
+    found["InterfaceMissing"] = [{"name": interface["name"]} for interface in missing]
+    found["InterfaceNotInNetbox"] = [
+        {"name": row.get("descr") or row.get("name")} for row in unknown if row.get("type") == IF_TYPE_ETHERNET
+    ]
+
+    for interface, row in pairs:
+        name = interface["name"]
+        admin_up = row.get("admin_status") == IF_STATUS_UP
+        oper_up = row.get("oper_status") == IF_STATUS_UP
+
+        if "admin_status" in row and interface["enabled"] is not None and interface["enabled"] != admin_up:
+            found["InterfaceAdminStatusMismatch"].append({"name": name, "netbox": interface["enabled"], "live": admin_up})
+
+        if interface["enabled"] and interface["connected"] and "oper_status" in row and not oper_up:
+            found["InterfaceOperDown"].append({"name": name, "live": row["oper_status"]})
+
+        if "alias" in row and interface["description"].strip() != row["alias"].strip():
+            found["InterfaceDescriptionMismatch"].append({"name": name, "netbox": interface["description"], "live": row["alias"]})
+
+        # Netbox keeps Kbps, ifHighSpeed is Mbps; ports that are down report their nominal speed or 0
+        if interface["speed"] and oper_up and "speed" in row and interface["speed"] != row["speed"] * 1000:
+            found["InterfaceSpeedMismatch"].append({"name": name, "netbox": interface["speed"], "live": row["speed"] * 1000})
+
+    return [
+        err.DataError(
+            message=f"ERROR: {device} - {len(interfaces)} {ERROR_MESSAGES[error_type]}: "
+            + ", ".join(str(interface["name"]) for interface in interfaces),
+            error_type=error_type,
+            device=device,
+            extra_data={"interfaces": interfaces},
+        )
+        for error_type, interfaces in found.items()
+        if interfaces
+    ]
@@ -0,0 +1,281 @@
+# Standard Library
+import gzip
+import json
+import re
+import time
+
+# Custom imports
+import error_handling.custom_errors as err
+from utils import file_utils
+from utils.device_snapshot import DeviceSnapshot
+
+
+# Identifies the file type in the header line
+FORMAT_NAME = "netbox-inventory"
+FORMAT_VERSION = 1
+
+
+def device_type_entry(device_type, oids: dict) -> dict:
+    """Builds the snapshot line of a device type.
+
+    Args:
+        device_type: Nested device_type of a pynetbox or GraphQL device record.
+        oids (dict): SNMP OIDs of the device type, see netbox_utils.resolve_devicetype_oids.
+
+    Returns:
+        dict: Device-type entry for write_inventory().
+    """
+
+    return {"id": int(device_type.id), "model": device_type.model, "oids": dict(oids)}
+
+
+def device_entry(record, dns_name: str = None, dns_ip: int = None) -> dict:
+    """Builds the snapshot line of a device.
+
+    Besides the DeviceSnapshot fields, the entry keeps the status, role, site, tenant and tags,
+    so entry points can apply their own device selection to a shared snapshot.
+
+    Args:
+        record: Device returned by pynetbox or netbox_graphql.fetch_devices.
+        dns_name (str, optional): DNS name resolved for the device (its VC master's for VC members). Defaults to None.
+        dns_ip (int, optional): Id of the IP address the DNS name was taken from. Defaults to None.
+
+    Returns:
+        dict: Device entry for write_inventory().
+    """
+
+    device = DeviceSnapshot.from_record(record, dns_name=dns_name)
+    status = _field(record, "status")
+    virtual_chassis = _field(record, "virtual_chassis")
+
+    return {
+        "id": device.id,
+        "name": device.name,
+        "serial": device.serial,
+        "primary_ip4": device.primary_ip4,
+        "device_type": int(record.device_type.id) if record.device_type else None,
+        "platform": device.platform,
+        "dns_name": device.dns_name,
+        "dns_ip": int(dns_ip) if dns_ip is not None else None,
+        "virtual_chassis": int(_slug(virtual_chassis, key="id")) if virtual_chassis else None,
+        "last_updated": _field(record, "last_updated"),
+        "status": str(_slug(status, key="value") or "").lower() or None,
+        "role": _slug(_field(record, "role")),
+        "site": _slug(_field(record, "site")),
+        "tenant": _slug(_field(record, "tenant")),
+        "tags": [_slug(tag) for tag in _field(record, "tags") or []],
+    }
+
+
+def write_inventory(path: str, url: str, device_types: list, devices, header: dict = None) -> int:
+    """Atomically writes an inventory snapshot file.
+
+    The file is line-delimited JSON: a header line, then one line per device type, then one
+    line per device. Paths ending in '.gz' are gzip-compressed.
+
+    Args:
+        path (str): File to write.
+        url (str): Netbox URL the inventory came from.
+        device_types (list): Entries from device_type_entry().
+        devices (iterable): Entries from device_entry().
+        header (dict, optional): Extra header fields, e.g. incremental sync state. Defaults to None.
+
+    Returns:
+        int: Number of devices written.
+    """
+
+    count = 0
+
+    def lines():
+        nonlocal count
+        yield _dumps({
+            **(header or {}),
+            "format": FORMAT_NAME,
+            "version": FORMAT_VERSION,
+            "url": url,
+            "exported_at": time.time(),
+        })
+
+        for device_type in device_types:
+            yield _dumps({"device_type": device_type})
+
+        for device in devices:
+            yield _dumps({"device": device})
+            count += 1
+
+    file_utils.write_atomic(path, lines(), prefix=".inventory.", mode=0o600, opener=lambda tmp_path: _open(tmp_path, "wt"))
+    return count
+
+
+def read_inventory(path: str, filters: dict = None, limit: int = None):
+    """Streams the devices of an inventory snapshot file as DeviceSnapshots, without Netbox.
+
+    The header is checked right away; devices are read lazily as the result is iterated.
+
+    Args:
+        path (str): File written by write_inventory().
+        filters (dict, optional): Device filters, see netbox_utils.build_device_filters(), applied
+            the way Netbox would. Defaults to None (every device in the file).
+        limit (int, optional): Maximum number of devices to return. Defaults to None (all).
+
+    Raises:
+        err.DataError: The file is missing, unreadable or of an unknown format/version.
+
+    Returns:
+        iterator: DeviceSnapshot per selected device, with its device type's OIDs attached.
+    """
+
+    _check_header(path, read_header(path))
+    return _iter_devices(path, filters, limit)
+
+
+def load_inventory(path: str) -> tuple:
+    """Reads a whole inventory snapshot file as plain entries, e.g. to update it in place.
+
+    Args:
+        path (str): File written by write_inventory().
+
+    Raises:
+        err.DataError: The file is missing, unreadable or of an unknown format/version.
+
+    Returns:
+        tuple: (header, device-type entries, device entries).
+    """
+
+    try:
+        with _open(path, "rt") as f:
+            header = _check_header(path, json.loads(f.readline() or "{}"))
+            device_types = []
+            devices = []
+
+            for line in f:
+                entry = json.loads(line)
+                if "device_type" in entry:
+                    device_types.append(entry["device_type"])
+                else:
+                    devices.append(entry["device"])
+
+    except (OSError, ValueError, KeyError) as e:
+        error_message = f"ERROR: Could not read inventory snapshot {path}."
+        raise err.DataError(message=error_message, extra_data={"original_exception": e})
+
+    return header, device_types, devices
+
+
+def entry_to_snapshot(device: dict, model: str = None, oids: dict = None) -> DeviceSnapshot:
+    """Turns a device entry back into a DeviceSnapshot.
+
+    Args:
+        device (dict): Entry from device_entry() or load_inventory().
+        model (str, optional): Model of the device's type. Defaults to None.
+        oids (dict, optional): SNMP OIDs of the device's type. Defaults to None.
+
+    Returns:
+        DeviceSnapshot: Snapshot of the device.
+    """
+
+    return DeviceSnapshot(
+        id=device["id"],
+        name=device["name"],
+        serial=device["serial"],
+        primary_ip4=device["primary_ip4"],
+        model=model,
+        platform=device["platform"],
+        dns_name=device["dns_name"],
+        oids=oids,
+    )
+
+
+def read_header(path: str) -> dict:
+    """Reads the header line of an inventory snapshot file.
+
+    Args:
+        path (str): File written by write_inventory().
+
+    Raises:
+        err.DataError: The file is missing or unreadable.
+
+    Returns:
+        dict: Header with 'format', 'version', 'url' and 'exported_at'.
+    """
+
+    try:
+        with _open(path, "rt") as f:
+            return json.loads(f.readline() or "{}")
+    except (OSError, ValueError) as e:
+        error_message = f"ERROR: Could not read inventory snapshot {path}."
+        raise err.DataError(message=error_message, extra_data={"original_exception": e})
+
+
+def _iter_devices(path: str, filters: dict, limit: int):
+    try:
+        with _open(path, "rt") as f:
+            f.readline()
+
+            # device type id -> (model, OIDs shared by every device of the type)
+            device_types = {}
+            count = 0
+
+            for line in f:
+                entry = json.loads(line)
+
+                if "device_type" in entry:
+                    device_type = entry["device_type"]
+                    device_types[device_type["id"]] = (device_type["model"], device_type["oids"])
+                    continue
+
+                device = entry["device"]
+                if filters and not _matches(device, filters):
+                    continue
+
+                model, oids = device_types.get(device["device_type"], (None, None))
+                yield entry_to_snapshot(device, model=model, oids=oids)
+
+                count += 1
+                if limit and count >= limit:
+                    return
+
+    except (OSError, ValueError, KeyError) as e:
+        error_message = f"ERROR: Could not read inventory snapshot {path}."
+        raise err.DataError(message=error_message, extra_data={"original_exception": e})
+
+
+def _check_header(path: str, header: dict) -> dict:
+    if header.get("format") != FORMAT_NAME or header.get("version") != FORMAT_VERSION:
+        error_message = f"ERROR: {path} is not a version {FORMAT_VERSION} inventory snapshot."
+        raise err.DataError(message=error_message, extra_data={"header": header})
+    return header
+
+def _matches(device: dict, filters: dict) -> bool:
+    # Same semantics as Netbox: any of the listed values, except tags, which must all be present
+    for field in ("status", "role", "site", "tenant"):
+        if filters.get(field) and device.get(field) not in filters[field]:
+            return False
+
+    if filters.get("tag") and not set(filters["tag"]) <= set(device.get("tags") or []):
+        return False
+
+    if filters.get("name__regex") and not re.search(filters["name__regex"], device.get("name") or ""):
+        return False
+
+    return True
+
+def _field(record, name: str):
+    # Only what the list response carried: a missing pynetbox attribute would trigger a fetch
+    values = vars(record)
+    return values["_values"].get(name) if "_values" in values else values.get(name)
+
+def _slug(record, key: str = "slug") -> str:
+    if record is None or isinstance(record, str):
+        return record
+    if isinstance(record, dict):
+        return record.get(key)
+    return vars(record).get(key) or str(record)
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode)
+    return open(path, mode[0])
+
+def _dumps(entry: dict) -> str:
+    return json.dumps(entry, separators=(",", ":")) + "\n"
@@ -0,0 +1,137 @@
+# Custom imports
+import error_handling.custom_errors as err
+from utils import inventory_snapshot, netbox_utils
+
+
+def sync_inventory(
+    nb,
+    url: str,
+    state_path: str,
+    filters: dict,
+    page_size: int = netbox_utils.DEFAULT_PAGE_SIZE,
+    context: dict = None,
+    limit: int = None,
+) -> tuple:
+    """Brings a saved inventory up to date with as few Netbox requests as possible.
+
+    The state is an inventory snapshot file (see inventory_snapshot) whose header also records
+    the selection filters and a watermark: the newest last_updated seen. When the state matches
+    the selection, only these are asked for instead of the whole inventory:
+        * devices changed since the watermark (which includes new devices),
+        * IP addresses and virtual chassis changed since the watermark, whose devices get their
+          DNS names re-resolved,
+        * the number of selected devices, and only when it disagrees with the merged state, the
+          ids of the selected devices, to drop deleted or deselected ones.
+
+    With a limit, the (at most limit) selected devices are pulled in full every time: changes
+    alone can't tell which devices fall within the limit.
+
+    Args:
+        nb (pynetbox.api): Netbox client.
+        url (str): Netbox URL.
+        state_path (str): Inventory snapshot file holding the previous state. Missing is fine.
+        filters (dict): Device filters, see netbox_utils.build_device_filters().
+        page_size (int, optional): Objects fetched per Netbox page. Defaults to netbox_utils.DEFAULT_PAGE_SIZE.
+        context (dict, optional): Other inputs of whatever is built from the inventory (e.g. the SSH user);
+            a different context counts as a change. Defaults to None.
+        limit (int, optional): Maximum number of devices to select. Defaults to None (all).
+
+    Returns:
+        tuple: (device entries, bool telling whether any kept field differs from the previous state).
+    """
+
+    try:
+        header, _, previous = inventory_snapshot.load_inventory(state_path)
+    except err.DataError:
+        header, previous = {}, []
+
+    watermark = header.get("watermark")
+    if limit or header.get("limit") or header.get("url") != url or header.get("filters") != filters or watermark is None:
+        # No usable state: full pull
+        records = list(netbox_utils.filter_devices(nb, filters, limit=limit, page_size=page_size))
+        devices = _build_entries(nb, records)
+        seen_updates = []
+    else:
+        devices, seen_updates = _merge_changes(nb, filters, previous, watermark, page_size)
+
+    # Edits to fields the inventory doesn't keep only move last_updated
+    changed = _comparable(devices) != _comparable(previous) or header.get("context") != context
+    new_watermark = max(
+        [watermark or ""] + seen_updates + [device["last_updated"] or "" for device in devices]
+    ) or None
+
+    if changed or new_watermark != watermark:
+        inventory_snapshot.write_inventory(
+            state_path,
+            url=url,
+            device_types=[],
+            devices=sorted(devices, key=lambda device: device["id"]),
+            header={"filters": filters, "limit": limit, "watermark": new_watermark, "context": context},
+        )
+
+    return devices, changed
+
+
+def _merge_changes(nb, filters: dict, previous: list, watermark: str, page_size: int) -> tuple:
+    devices = _by_id(previous)
+
+    # Devices edited or created since the last run
+    changed_records = {
+        record.id: record
+        for record in netbox_utils.filter_devices(
+            nb, {**filters, "last_updated__gte": watermark}, page_size=page_size
+        )
+    }
+
+    # A DNS name lives on an IP address or comes from a VC master, neither of which touches the device
+    changed_ips = {
+        ip.id: ip.last_updated for ip in nb.ipam.ip_addresses.filter(last_updated__gte=watermark, limit=page_size)
+    }
+    changed_vcs = {
+        vc.id: vc.last_updated for vc in nb.dcim.virtual_chassis.filter(last_updated__gte=watermark, limit=page_size)
+    }
+    stale_ids = {
+        device_id for device_id, device in devices.items()
+        if device_id not in changed_records
+        and (device.get("dns_ip") in changed_ips or device.get("virtual_chassis") in changed_vcs)
+    }
+    changed_records.update(netbox_utils.get_records_by_id(nb.dcim.devices, stale_ids))
+
+    for device in _build_entries(nb, list(changed_records.values())):
+        devices[device["id"]] = device
+
+    # Deletion check: one count, and the id list only when something is gone
+    if nb.dcim.devices.count(**filters) != len(devices):
+        current_ids = {
+            record.id for record in nb.dcim.devices.filter(**filters, brief=1, limit=page_size)
+        }
+        devices = {device_id: device for device_id, device in devices.items() if device_id in current_ids}
+
+    seen_updates = [updated for updated in [*changed_ips.values(), *changed_vcs.values()] if updated]
+    return list(devices.values()), seen_updates
+
+
+def _build_entries(nb, records: list) -> list:
+    dns_sources = netbox_utils.get_device_dns_sources(nb, records)
+
+    entries = []
+    for record in records:
+        dns_ip = dns_sources.get(record.id)
+        entries.append(
+            inventory_snapshot.device_entry(
+                record,
+                dns_name=dns_ip.dns_name if dns_ip else None,
+                dns_ip=dns_ip.id if dns_ip else None,
+            )
+        )
+    return entries
+
+
+def _by_id(devices: list) -> dict:
+    return {device["id"]: device for device in devices}
+
+def _comparable(devices: list) -> dict:
+    return {
+        device["id"]: {field: value for field, value in device.items() if field != "last_updated"}
+        for device in devices
+    }
@@ -0,0 +1,199 @@
+# Non-Standard Library
+import requests
+
+# Custom imports
+import error_handling.custom_errors as err
+from utils import netbox_utils
+
+
+# Exactly the fields DeviceSnapshot, the device-type OID index and inventory snapshots read
+DEVICE_QUERY = """
+query Devices($filters: DeviceFilter, $offset: Int!, $limit: Int!) {
+  device_list(filters: $filters, pagination: {offset: $offset, limit: $limit}) {
+    id
+    name
+    serial
+    primary_ip4 { id address dns_name }
+    device_type { id model custom_fields }
+    platform { id name }
+    status
+    role { slug }
+    site { slug }
+    tenant { slug }
+    tags { slug }
+    virtual_chassis { id master { id name primary_ip4 { id address dns_name } } }
+  }
+}
+"""
+
+
+class GraphQLRecord:
+    """Attribute view over one object of a GraphQL response.
+
+    Mirrors the parts of pynetbox's Record the scripts rely on: nested objects are reachable as
+    attributes, extra attributes (like dns_name) can be attached and str() gives the object's
+    natural name. Unlike a Record it never goes back to Netbox for missing attributes.
+    """
+
+    def __init__(self, values: dict):
+        self._values = values
+
+    def __getattr__(self, name):
+        try:
+            value = self.__dict__["_values"][name]
+        except KeyError:
+            raise AttributeError(name)
+        return GraphQLRecord(value) if isinstance(value, dict) and name != "custom_fields" else value
+
+    def __setattr__(self, name, value):
+        if name == "_values":
+            super().__setattr__(name, value)
+        else:
+            self._values[name] = value
+
+    def __str__(self):
+        for field in ("name", "model", "address"):
+            if self._values.get(field) is not None:
+                return str(self._values[field])
+        return str(self._values.get("id"))
+
+    def __repr__(self):
+        return str(self)
+
+
+def graphql_query(url: str, api_token: str, query: str, variables: dict = None) -> dict:
+    """Sends one query to Netbox's GraphQL endpoint over the shared, pooled session.
+
+    Args:
+        url (str): Netbox URL.
+        api_token (str): Netbox API Token
+        query (str): GraphQL query document.
+        variables (dict, optional): Query variables. Defaults to None.
+
+    Raises:
+        err.DataError: The request failed or Netbox reported GraphQL errors.
+
+    Returns:
+        dict: The response's 'data' member.
+    """
+
+    session = netbox_utils.get_netbox_client(url=url, api_token=api_token).http_session
+
+    try:
+        response = session.post(
+            f"{url.rstrip('/')}/graphql/",
+            json={"query": query, "variables": variables or {}},
+            headers={
+                "Authorization": f"Token {api_token}",
+                "Content-Type": "application/json",
+                "Accept": "application/json",
+            },
+        )
+        response.raise_for_status()
+        payload = response.json()
+    except (requests.RequestException, ValueError) as e:
+        error_message = "ERROR: Netbox GraphQL request error."
+        raise err.DataError(message=error_message, extra_data={"original_exception": e})
+
+    if payload.get("errors"):
+        error_message = "ERROR: Netbox GraphQL query returned errors."
+        raise err.DataError(message=error_message, extra_data={"graphql_errors": payload["errors"]})
+
+    return payload["data"]
+
+
+def fetch_devices(
+    url: str,
+    api_token: str,
+    filters: dict = None,
+    limit: int = None,
+    page_size: int = netbox_utils.DEFAULT_PAGE_SIZE,
+) -> list:
+    """Fetches devices, with everything the compliance and SSH-config scripts need, over GraphQL.
+
+    One paginated query returns each device's identity, primary IPv4 (with DNS name), device type
+    (with OID custom fields), platform and virtual-chassis master DNS name. The device types seen
+    are also loaded into netbox_utils' device-type OID index, so no further Netbox calls are needed.
+
+    Args:
+        url (str): Netbox URL.
+        api_token (str): Netbox API Token
+        filters (dict, optional): DeviceFilter input, e.g. from netbox_utils.build_device_filters(). Defaults to None.
+        limit (int, optional): Maximum number of devices to return. Defaults to None (all).
+        page_size (int, optional): Devices fetched per query. Defaults to netbox_utils.DEFAULT_PAGE_SIZE.
+
+    Raises:
+        err.DataError: The request failed or Netbox reported GraphQL errors.
+
+    Returns:
+        list: GraphQLRecord per device.
+    """
+
+    return list(iter_devices(url=url, api_token=api_token, filters=filters, limit=limit, page_size=page_size))
+
+
+def iter_devices(
+    url: str,
+    api_token: str,
+    filters: dict = None,
+    limit: int = None,
+    page_size: int = netbox_utils.DEFAULT_PAGE_SIZE,
+):
+    """Lazily fetches the same devices as fetch_devices, one query per page as they are consumed.
+
+    Each page's device types are loaded into the device-type OID index before its devices are
+    yielded. Takes the same arguments as fetch_devices.
+
+    Raises:
+        err.DataError: The request failed or Netbox reported GraphQL errors.
+
+    Yields:
+        GraphQLRecord: One per device.
+    """
+
+    fetched = 0
+    offset = 0
+
+    if limit:
+        page_size = min(page_size, limit)
+
+    while True:
+        data = graphql_query(
+            url=url,
+            api_token=api_token,
+            query=DEVICE_QUERY,
+            variables={"filters": filters, "offset": offset, "limit": page_size},
+        )
+        page = data["device_list"]
+        devices = page[:limit - fetched] if limit else page
+        fetched += len(devices)
+
+        netbox_utils.prime_devicetype_oid_index(
+            url=url,
+            device_types=[device["device_type"] for device in devices if device["device_type"]],
+        )
+        for device in devices:
+            yield GraphQLRecord(device)
+
+        if len(page) < page_size or (limit and fetched >= limit):
+            break
+        offset += page_size
+
+
+def device_dns_name(device: GraphQLRecord) -> str:
+    """Returns the DNS name to SSH to for a device fetched by fetch_devices.
+
+    Args:
+        device (GraphQLRecord): Device returned by fetch_devices.
+
+    Returns:
+        str: DNS name of the device's (or its virtual-chassis master's) primary IPv4, or None.
+    """
+
+    source = device
+    if device.virtual_chassis:
+        source = device.virtual_chassis.master
+
+    if source is None or source.primary_ip4 is None:
+        return None
+    return source.primary_ip4.dns_name
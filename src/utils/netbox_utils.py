@@ -1,7 +1,12 @@
 from dotenv import load_dotenv
+import itertools
+import json
 import os
 import pynetbox
 import requests
+import threading
+import time
+from utils import file_utils
 
 
 def get_api_token(
@@ -27,13 +32,456 @@ def get_api_token(
     return str(token.key)
 
 
+# Device roles each entry point selects when no -role is given
+COMPLIANCE_ROLES = ["sw"]
+SSH_CONFIG_ROLES = ["production-switches", "production-routers"]
+# Every role above, so one inventory snapshot serves every entry point
+INVENTORY_ROLES = sorted(set(COMPLIANCE_ROLES) | set(SSH_CONFIG_ROLES))
+
+# Netbox's default MAX_PAGE_SIZE; larger pages mean fewer round trips for big inventories
+DEFAULT_PAGE_SIZE = 1000
+
+# CA bundle baked into the Docker image; used for Netbox TLS when it has been populated
+TRUSTED_CERTS_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "data", "trusted-ssl-certs"
+)
+
+# Shared Netbox clients, one per (url, token, threaded)
+_netbox_clients = {}
+_netbox_clients_lock = threading.Lock()
+
+
+def get_netbox_client(
+    url: str,
+    api_token: str,
+    threaded: bool = False,
+    pool_size: int = 10,
+) -> pynetbox.api:
+    """Returns a shared pynetbox client backed by a keep-alive, connection-pooled session.
+
+    Every caller asking for the same Netbox gets the same client, so TLS handshakes and TCP
+    connections are reused across the whole run instead of being repeated per client.
+
+    Args:
+        url (str): Netbox URL.
+        api_token (str): Netbox API Token
+        threaded (bool, optional): Fetch the pages of large list requests in parallel. Defaults to False.
+        pool_size (int, optional): Keep-alive connections kept open to Netbox. Defaults to 10.
+
+    Returns:
+        pynetbox.api: Shared Netbox client.
+    """
+
+    key = (url, api_token, threaded)
+
+    with _netbox_clients_lock:
+        if key in _netbox_clients:
+            return _netbox_clients[key]
+
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        if _has_trusted_certs(TRUSTED_CERTS_PATH):
+            session.verify = TRUSTED_CERTS_PATH
+
+        nb = pynetbox.api(url=url, token=api_token, threading=threaded)
+        nb.http_session = session
+
+        _netbox_clients[key] = nb
+        return nb
+
+
+def _has_trusted_certs(path: str) -> bool:
+    # The checked-in file is a placeholder until certs are pasted into it
+    try:
+        with open(path) as f:
+            return "BEGIN CERTIFICATE" in f.read()
+    except OSError:
+        return False
+
+
+def add_device_selection_arguments(parser, default_roles: list):
+    """Adds the device-selection CLI flags shared by the entry points.
+
+    Args:
+        parser (argparse.ArgumentParser): Parser of the entry point.
+        default_roles (list): Device role slugs selected when -role isn't given.
+    """
+
+    parser.add_argument(
+        "-role",
+        nargs="+",
+        default=default_roles,
+        help=f"Device role slug(s) to select. Defaults to {' '.join(default_roles)}",
+    )
+    parser.add_argument("-site", nargs="+", help="Site slug(s) to select")
+    parser.add_argument("-tag", nargs="+", help="Tag slug(s) to select")
+    parser.add_argument("-tenant", nargs="+", help="Tenant slug(s) to select")
+    parser.add_argument("-name_regex", help="Only select devices whose name matches this regex")
+    parser.add_argument("-limit", type=int, help="Select at most this many devices")
+
+
+def build_device_filters(
+    roles: list = None,
+    sites: list = None,
+    tags: list = None,
+    tenants: list = None,
+    name_regex: str = None,
+) -> dict:
+    """Translates a device selection into Netbox device filters, so the selection happens server-side.
+
+    The same dict works as REST query parameters and as a GraphQL DeviceFilter input.
+
+    Args:
+        roles (list, optional): Device role slugs. Defaults to None (any).
+        sites (list, optional): Site slugs. Defaults to None (any).
+        tags (list, optional): Tag slugs. Defaults to None (any).
+        tenants (list, optional): Tenant slugs. Defaults to None (any).
+        name_regex (str, optional): Regex device names must match. Defaults to None (any).
+
+    Returns:
+        dict: Filters selecting the active devices that match every given criterion.
+    """
+
+    filters = {"status": ["active"]}
+
+    for field, values in (("role", roles), ("site", sites), ("tag", tags), ("tenant", tenants)):
+        if values:
+            filters[field] = list(values)
+
+    if name_regex:
+        filters["name__regex"] = name_regex
+
+    return filters
+
+
+def filter_devices(
+    nb: pynetbox.api,
+    filters: dict,
+    limit: int = None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+):
+    """Lazily lists the devices matching `filters`, fetching no more pages than `limit` needs.
+
+    Args:
+        nb (pynetbox.api): Netbox client.
+        filters (dict): Device filters, e.g. from build_device_filters().
+        limit (int, optional): Maximum number of devices to return. Defaults to None (all).
+        page_size (int, optional): Devices fetched per page. Defaults to DEFAULT_PAGE_SIZE.
+
+    Returns:
+        iterable: Device records, fetched page by page as they are consumed.
+    """
+
+    if limit:
+        page_size = min(page_size, limit)
+
+    nb_devices = nb.dcim.devices.filter(**filters, limit=page_size)
+    return itertools.islice(nb_devices, limit) if limit else nb_devices
+
+
+def get_records_by_id(endpoint, ids, chunk_size: int = 200) -> dict:
+    """Fetches many objects from one endpoint with as few `id=` list requests as possible.
+
+    Args:
+        endpoint (pynetbox.core.endpoint.Endpoint): Endpoint to query, e.g. nb.ipam.ip_addresses.
+        ids (iterable): Object ids to fetch. Duplicates and None are ignored.
+        chunk_size (int, optional): Ids per request, which keeps the query string a sane length. Defaults to 200.
+
+    Returns:
+        dict: Maps each found id to its record.
+    """
+
+    ids = sorted({object_id for object_id in ids if object_id is not None})
+
+    records = {}
+    for start in range(0, len(ids), chunk_size):
+        # One page per chunk; Netbox's default page size would split it into several requests
+        for record in endpoint.filter(id=ids[start:start + chunk_size], limit=chunk_size):
+            records[record.id] = record
+    return records
+
+
+def get_interfaces(
+    nb: pynetbox.api,
+    device_ids=None,
+    site: str = None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    chunk_size: int = 200,
+) -> dict:
+    """Fetches the interfaces of many devices, or of a whole site, with one paginated request.
+
+    Args:
+        nb (pynetbox.api): Netbox client.
+        device_ids (iterable, optional): Devices whose interfaces to fetch, `chunk_size` devices per request.
+        site (str, optional): Site slug whose interfaces to fetch instead. Defaults to None.
+        page_size (int, optional): Interfaces fetched per page. Defaults to DEFAULT_PAGE_SIZE.
+        chunk_size (int, optional): Device ids per request, which keeps the query string a sane length. Defaults to 200.
+
+    Returns:
+        dict: Maps device id to the list of its interfaces, each a dict with 'name', 'enabled', 'description',
+            'speed' (Kbps, or None), 'type' and 'connected' (cabled or marked connected).
+    """
+
+    if site is not None:
+        queries = [{"site": site}]
+    else:
+        device_ids = sorted({device_id for device_id in device_ids or () if device_id is not None})
+        queries = [{"device_id": device_ids[start:start + chunk_size]} for start in range(0, len(device_ids), chunk_size)]
+
+    interfaces = {}
+    for query in queries:
+        for record in nb.dcim.interfaces.filter(**query, limit=page_size):
+            # Raw fields only: reading a missing attribute of a pynetbox record fetches it
+            fields = vars(record)
+            interface_type = fields.get("type")
+            if isinstance(interface_type, dict):
+                interface_type = interface_type.get("value")
+            interfaces.setdefault(record.device.id, []).append({
+                "name": fields.get("name"),
+                "enabled": fields.get("enabled"),
+                "description": fields.get("description") or "",
+                "speed": fields.get("speed"),
+                "type": getattr(interface_type, "value", interface_type),
+                "connected": bool(fields.get("cable") or fields.get("mark_connected")),
+            })
+    return interfaces
+
+
+def get_device_dns_sources(nb: pynetbox.api, devices: list) -> dict:
+    """Resolves the IP address record that names every device's management address, in bulk.
+
+    Virtual-chassis members use their chassis master's primary IPv4. Everything is resolved
+    with one request for the virtual chassis, one for master devices that are not already in
+    `devices`, and one per 200 primary IPs, no matter how many devices share a chassis.
+
+    Args:
+        nb (pynetbox.api): Netbox client.
+        devices (list): Device records returned by nb.dcim.devices.
+
+    Returns:
+        dict: Maps device id to the IP address record, or None when Netbox has no primary IPv4 for it.
+    """
+
+    devices_by_id = {device.id: device for device in devices}
+
+    # virtual chassis id -> master device id
+    vc_ids = {device.virtual_chassis.id for device in devices if device.virtual_chassis}
+    vc_masters = {
+        vc.id: vc.master.id if vc.master else None
+        for vc in get_records_by_id(nb.dcim.virtual_chassis, vc_ids).values()
+    }
+
+    # Only masters we don't already hold are fetched
+    missing_master_ids = set(vc_masters.values()) - set(devices_by_id)
+    devices_by_id.update(get_records_by_id(nb.dcim.devices, missing_master_ids))
+
+    # device id -> device whose primary IPv4 names it
+    name_sources = {}
+    for device in devices:
+        if device.virtual_chassis:
+            name_sources[device.id] = devices_by_id.get(vc_masters.get(device.virtual_chassis.id))
+        else:
+            name_sources[device.id] = device
+
+    ip_ids = {
+        source.primary_ip4.id for source in name_sources.values() if source and source.primary_ip4
+    }
+    ips = get_records_by_id(nb.ipam.ip_addresses, ip_ids)
+
+    return {
+        device_id: ips.get(source.primary_ip4.id) if source and source.primary_ip4 else None
+        for device_id, source in name_sources.items()
+    }
+
+
+def get_device_dns_names(nb: pynetbox.api, devices: list) -> dict:
+    """Resolves the DNS name of every device's management address in bulk.
+
+    See get_device_dns_sources for how virtual-chassis members are named.
+
+    Args:
+        nb (pynetbox.api): Netbox client.
+        devices (list): Device records returned by nb.dcim.devices.
+
+    Returns:
+        dict: Maps device id to its DNS name, or None when Netbox has no primary IPv4 for it.
+    """
+
+    return {
+        device_id: ip.dns_name if ip else None
+        for device_id, ip in get_device_dns_sources(nb, devices).items()
+    }
+
+
+# Device-type custom fields holding the SNMP OIDs used by the compliance checks
+SNMP_OID_FIELDS = (
+    "snmp_hwmodel_oid",
+    "snmp_sn_oid",
+    "snmp_swversion_oid",
+    "snmp_sysname_oid",
+    "snmp_sysuptime_oid",
+)
+
+# In-process device-type OID indexes, one per Netbox URL
+_devicetype_oid_indexes = {}
+_devicetype_oid_lock = threading.Lock()
+
+
+def load_devicetype_oid_index(
+    api_token: str,
+    url: str = "https://netbox.mke.cnty",
+    cache_path: str = None,
+    cache_ttl: float = 3600,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    refresh: bool = False,
+) -> dict:
+    """Fetches the SNMP OID custom fields of every device type in one paginated request.
+
+    The result is kept in-process for the rest of the run, or until it is reloaded with refresh,
+    which also forgets which models were validated. With a cache_path it is also written to disk,
+    and a cache file younger than cache_ttl is used instead of querying Netbox at all.
+
+    Args:
+        api_token (str): Netbox API Token
+        url (str, optional): Netbox URL. Defaults to "https://netbox.mke.cnty".
+        cache_path (str, optional): JSON file to read/write the index from/to. Defaults to None (no disk cache).
+        cache_ttl (float, optional): Seconds a disk cache stays valid. Defaults to 3600.
+        page_size (int, optional): Device types fetched per page. Defaults to DEFAULT_PAGE_SIZE.
+        refresh (bool, optional): Replace the in-process index, e.g. on a long-running daemon's inventory
+            refresh. Defaults to False.
+
+    Returns:
+        dict: {'by_id': {id: oids}, 'by_model': {model: oids}, 'models': {id: model}} where oids maps each
+            SNMP_OID_FIELDS name to its OID.
+    """
+
+    with _devicetype_oid_lock:
+        if url in _devicetype_oid_indexes and not refresh:
+            return _devicetype_oid_indexes[url]
+
+        device_types = _read_devicetype_cache(cache_path, url, cache_ttl) if cache_path else None
+
+        if device_types is None:
+            nb = get_netbox_client(url=url, api_token=api_token)
+            device_types = [
+                {
+                    "id": device_type.id,
+                    "model": device_type.model,
+                    "oids": {field: device_type.custom_fields.get(field) for field in SNMP_OID_FIELDS},
+                }
+                for device_type in nb.dcim.device_types.all(limit=page_size)
+            ]
+
+            if cache_path:
+                _write_devicetype_cache(cache_path, url, device_types)
+
+        index = {
+            "by_id": {device_type["id"]: device_type["oids"] for device_type in device_types},
+            "by_model": {device_type["model"]: device_type["oids"] for device_type in device_types},
+            "models": {device_type["id"]: device_type["model"] for device_type in device_types},
+            "validated": {},
+        }
+        _devicetype_oid_indexes[url] = index
+        return index
+
+
+def prime_devicetype_oid_index(url: str, device_types: list):
+    """Adds device types that were already fetched elsewhere (e.g. over GraphQL) to the OID index.
+
+    Args:
+        url (str): Netbox URL the device types came from.
+        device_types (list): Dicts with the device type's 'id', 'model' and 'custom_fields'.
+    """
+
+    with _devicetype_oid_lock:
+        index = _devicetype_oid_indexes.setdefault(url, {"by_id": {}, "by_model": {}, "models": {}, "validated": {}})
+
+        for device_type in device_types:
+            custom_fields = device_type.get("custom_fields") or {}
+            snmp_oids = {field: custom_fields.get(field) for field in SNMP_OID_FIELDS}
+            index["by_id"][device_type["id"]] = snmp_oids
+            index["by_model"][device_type["model"]] = snmp_oids
+            index["models"][device_type["id"]] = device_type["model"]
+
+
+def resolve_devicetype_oids(
+    device_type, api_token: str, url: str = "https://netbox.mke.cnty"
+) -> dict:
+    """Looks up the SNMP OIDs configured for a device type, without validating them.
+
+    Lookups are served from the device-type OID index (see load_devicetype_oid_index), so Netbox
+    is only queried for device types created after the index was loaded. Every device of a type
+    gets the same dict back, which must not be modified.
+
+    Args:
+        device_type (str): Device_type 'model' field from Netbox API documentation (dcim/device-types),
+            or the device's nested device_type record, in which case its id is used.
+        api_token (str): Netbox API Token
+        url (str, optional): Netbox URL. Defaults to "https://netbox.mke.cnty".
+
+    Returns:
+        dict: Maps each SNMP_OID_FIELDS name to its OID, or None where it is unset.
+    """
+
+    index = load_devicetype_oid_index(api_token=api_token, url=url)
+
+    device_type_id = getattr(device_type, "id", None)
+    model = getattr(device_type, "model", device_type)
+    snmp_oids = index["by_id"].get(device_type_id) or index["by_model"].get(str(model))
+
+    if snmp_oids is None:
+        # Device type created after the index was loaded
+        nb = get_netbox_client(url=url, api_token=api_token)
+        device_type_data = nb.dcim.device_types.get(model=str(model))
+        snmp_oids = {field: device_type_data.custom_fields.get(field) for field in SNMP_OID_FIELDS}
+        index["by_id"][device_type_data.id] = snmp_oids
+        index["by_model"][device_type_data.model] = snmp_oids
+        index["models"][device_type_data.id] = device_type_data.model
+
+    return snmp_oids
+
+
+def validate_devicetype_oids(model: str, snmp_oids: dict, url: str = "https://netbox.mke.cnty"):
+    """Checks that every SNMP OID is set for a device type, once per model and run.
+
+    Args:
+        model (str): Device type model the OIDs belong to.
+        snmp_oids (dict): OIDs as returned by resolve_devicetype_oids.
+        url (str, optional): Netbox URL the device type came from. Defaults to "https://netbox.mke.cnty".
+
+    Raises:
+        AssertionError: Some OIDs are missing for the device type.
+    """
+
+    with _devicetype_oid_lock:
+        index = _devicetype_oid_indexes.setdefault(url, {"by_id": {}, "by_model": {}, "models": {}, "validated": {}})
+
+    # Check if all values are not None, once per model
+    validated = index["validated"]
+    if str(model) not in validated:
+        validated[str(model)] = snmp_oids is not None and all(
+            value is not None for value in snmp_oids.values()
+        )
+        if not validated[str(model)]:
+            print(f"ERROR: Some SNMP OID values are missing for provide device_type: {model}")
+
+    assert validated[str(model)], f"Missing OIDs for {model}"
+
+
 def get_devicetype_oids(
     device_type: str, api_token:str, url: str = "https://netbox.mke.cnty"
 ) -> dict:
     """Retrieves all relevant SNMP OIDs for the given device_type from Netbox.
 
+    Lookups are served from the device-type OID index (see load_devicetype_oid_index), so Netbox
+    is queried once per run rather than once per device, and each model is validated only once.
+
     Args:
-        device_type (str): Device_type 'model' field from Netbox API documentation (dcim/device-types)
+        device_type (str): Device_type 'model' field from Netbox API documentation (dcim/device-types),
+            or the device's nested device_type record, in which case its id is used.
         api_token (str): Netbox API Token
         url (str, optional): Netbox URL. Defaults to "https://netbox.mke.cnty".
 
@@ -41,24 +489,23 @@ def get_devicetype_oids(
         dict: Returns a dict of all SNMP OIDs configured for the device_type on Netbox.
     """
 
-    nb = pynetbox.api(url=url, token=api_token)
+    snmp_oids = resolve_devicetype_oids(device_type=device_type, api_token=api_token, url=url)
+    validate_devicetype_oids(model=getattr(device_type, "model", device_type), snmp_oids=snmp_oids, url=url)
+    return snmp_oids
 
-    device_type_data = nb.dcim.device_types.get(model=device_type)
-
-    snmp_oids = {
-        "snmp_hwmodel_oid": device_type_data.custom_fields.get("snmp_hwmodel_oid"),
-        "snmp_sn_oid": device_type_data.custom_fields.get("snmp_sn_oid"),
-        "snmp_swversion_oid": device_type_data.custom_fields.get("snmp_swversion_oid"),
-        "snmp_sysname_oid": device_type_data.custom_fields.get("snmp_sysname_oid"),
-        "snmp_sysuptime_oid": device_type_data.custom_fields.get("snmp_sysuptime_oid"),
-    }
 
+def _read_devicetype_cache(cache_path: str, url: str, cache_ttl: float) -> list:
     try:
-        # Check if all values are not None
-        check_oid_existence = all(value is not None for value in snmp_oids.values())
-        assert check_oid_existence, f"Missing OIDs for {device_type}"
-        return snmp_oids
-    
-    except AssertionError as e:
-        print(f"ERROR: Some SNMP OID values are missing for provide device_type: {device_type}")
-        raise
+        with open(cache_path) as f:
+            payload = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+    if payload.get("url") != url or time.time() - payload.get("stored_at", 0) > cache_ttl:
+        return None
+    return payload["device_types"]
+
+
+def _write_devicetype_cache(cache_path: str, url: str, device_types: list):
+    payload = {"url": url, "stored_at": time.time(), "device_types": device_types}
+    file_utils.write_atomic(cache_path, json.dumps(payload), prefix=".devicetype_cache.")
@@ -0,0 +1,89 @@
+# Standard Library
+import queue
+import threading
+
+
+# Marks the end of the stream on a queue
+_DONE = object()
+
+
+def run_pipeline(source, worker, sink, workers: int = 10, queue_size: int = 100):
+    """Streams items from a producer through worker threads into a downstream sink.
+
+    One thread iterates `source` (e.g. a lazily paginated pynetbox RecordSet) into a bounded
+    queue, `workers` threads apply `worker` to items as soon as they arrive, and the calling
+    thread hands every outcome to `sink`. Both queues are bounded, so a slow stage pushes back
+    on the stages before it and memory stays flat no matter how large the source is. The first
+    result is available after the first item is produced, and producing and working overlap.
+
+    Args:
+        source (iterable): Items to process. Only iterated from the producer thread.
+        worker (callable): Called as worker(item) on a worker thread; its return value is the result.
+        sink (callable): Called as sink(item, result, exception) on the calling thread, in completion
+            order. Exactly one of result/exception is meaningful.
+        workers (int, optional): Number of worker threads. Defaults to 10.
+        queue_size (int, optional): Capacity of each queue. Defaults to 100.
+
+    Raises:
+        Exception: Whatever iterating `source` raised, re-raised once in-flight items are drained.
+    """
+
+    items = queue.Queue(maxsize=queue_size)
+    outcomes = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    producer_errors = []
+
+    def produce():
+        try:
+            for item in source:
+                if stop.is_set():
+                    break
+                items.put(item)
+        except Exception as e:
+            producer_errors.append(e)
+        finally:
+            for _ in range(workers):
+                items.put(_DONE)
+
+    def work():
+        while True:
+            item = items.get()
+            if item is _DONE:
+                outcomes.put(_DONE)
+                return
+            try:
+                outcomes.put((item, worker(item), None))
+            except Exception as e:
+                outcomes.put((item, None, e))
+
+    threads = [threading.Thread(target=produce, daemon=True)]
+    threads += [threading.Thread(target=work, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    running = workers
+    try:
+        while running:
+            outcome = outcomes.get()
+            if outcome is _DONE:
+                running -= 1
+                continue
+            sink(*outcome)
+
+    except BaseException:
+        # The sink gave up: stop producing and let the threads run dry in the background.
+        stop.set()
+        _drain(items)
+        raise
+
+    if producer_errors:
+        raise producer_errors[0]
+
+
+def _drain(items: queue.Queue):
+    # Unblock a producer waiting on a full queue so it can see the stop flag
+    try:
+        while True:
+            items.get_nowait()
+    except queue.Empty:
+        pass
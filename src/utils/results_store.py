@@ -0,0 +1,433 @@
+# Standard Library
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Custom imports
+import error_handling.custom_errors as err
+from utils import run_metrics
+
+# Error type of the report sent when a device no longer has a violation it had in the previous run
+RESOLVED_ERROR_TYPE = "ViolationResolved"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    url TEXT,
+    selection TEXT,
+    devices INTEGER NOT NULL DEFAULT 0,
+    non_compliant INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS runs_selection ON runs (url, selection, id);
+
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    device_id INTEGER NOT NULL,
+    device TEXT NOT NULL,
+    ip TEXT,
+    compliant INTEGER NOT NULL,
+    live_data TEXT,
+    seconds REAL,
+    PRIMARY KEY (run_id, device_id)
+);
+CREATE INDEX IF NOT EXISTS results_device ON results (device, run_id);
+
+CREATE TABLE IF NOT EXISTS violations (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    device_id INTEGER NOT NULL,
+    error_type TEXT NOT NULL,
+    message TEXT,
+    extra_data TEXT,
+    new INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS violations_run ON violations (run_id, device_id);
+CREATE INDEX IF NOT EXISTS violations_type ON violations (error_type, run_id);
+"""
+
+
+class ResultsStore:
+    """SQLite file keeping every run's per-device outcome: live values, violations and timings.
+
+    A violation is one error on one device, so a device failing three rules has three rows. It is
+    identified by the device, error_type and message, so e.g. a second interface going down on a
+    device is a new violation although its error_type is not. Runs are comparable when they checked the same Netbox with the same device selection; each
+    violation row records whether the previous comparable run had it too.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): Database file. Created, with its directory, if missing.
+        """
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        with self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    # Writing
+
+    def start_run(self, url: str = None, selection: dict = None) -> int:
+        """Opens a run.
+
+        Args:
+            url (str, optional): Netbox URL the devices came from. Defaults to None.
+            selection (dict, optional): Device filters of the run; only runs with equal selections are diffed. Defaults to None.
+
+        Returns:
+            int: The run's id.
+        """
+
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                "INSERT INTO runs (started_at, url, selection) VALUES (?, ?, ?)",
+                (time.time(), url, _dumps(selection, sort_keys=True)),
+            )
+            return cursor.lastrowid
+
+    def write(self, run_id: int, results: list, violations: list):
+        """Adds device outcomes to a run, in one transaction.
+
+        Args:
+            run_id (int): Run the outcomes belong to.
+            results (list): (device_id, device name, ip, compliant, live_data, seconds) tuples.
+            violations (list): (device_id, error_type, message, extra_data, new) tuples.
+        """
+
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO results (run_id, device_id, device, ip, compliant, live_data, seconds) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(run_id, device_id, name, ip, int(compliant), _dumps(live_data), seconds)
+                 for device_id, name, ip, compliant, live_data, seconds in results],
+            )
+            self._connection.executemany(
+                "INSERT INTO violations (run_id, device_id, error_type, message, extra_data, new) VALUES (?, ?, ?, ?, ?, ?)",
+                [(run_id, device_id, error_type, message, _dumps(extra_data), int(new))
+                 for device_id, error_type, message, extra_data, new in violations],
+            )
+
+    def finish_run(self, run_id: int):
+        """Closes a run and stores its device counts. Only finished runs are diffed against."""
+
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE runs SET finished_at = ?,"
+                " devices = (SELECT COUNT(*) FROM results WHERE run_id = ?),"
+                " non_compliant = (SELECT COUNT(*) FROM results WHERE run_id = ? AND NOT compliant)"
+                " WHERE id = ?",
+                (time.time(), run_id, run_id, run_id),
+            )
+
+    # Reading
+
+    def previous_run(self, run_id: int) -> int:
+        """Returns the id of the last finished run before run_id with the same URL and selection, or None."""
+
+        row = self._query_one(
+            "SELECT previous.id FROM runs AS previous JOIN runs AS current ON current.id = ?"
+            " WHERE previous.id < current.id AND previous.finished_at IS NOT NULL"
+            " AND previous.url IS current.url AND previous.selection IS current.selection"
+            " ORDER BY previous.id DESC LIMIT 1",
+            (run_id,),
+        )
+        return row["id"] if row else None
+
+    def violation_keys(self, run_id: int) -> set:
+        """Returns the violation_key() of every violation a run found."""
+
+        rows = self._query("SELECT device_id, error_type, message FROM violations WHERE run_id = ?", (run_id,))
+        return {violation_key(row["device_id"], row["error_type"], row["message"]) for row in rows}
+
+    def runs(self, limit: int = 20) -> list:
+        """Returns the latest runs, newest first."""
+
+        return self._query("SELECT * FROM runs ORDER BY id DESC LIMIT ?", (limit,))
+
+    def device_history(self, device: str, limit: int = 20) -> list:
+        """Returns a device's latest results, newest first, each with its violations' error types.
+
+        Args:
+            device (str): Device name.
+            limit (int, optional): Runs returned. Defaults to 20.
+        """
+
+        return self._query(
+            "SELECT results.*, GROUP_CONCAT(violations.error_type) AS error_types FROM results"
+            " LEFT JOIN violations ON violations.run_id = results.run_id AND violations.device_id = results.device_id"
+            " WHERE results.device = ? GROUP BY results.run_id ORDER BY results.run_id DESC LIMIT ?",
+            (device, limit),
+        )
+
+    def violations(self, run_id: int = None, error_type: str = None, device: str = None, new_only: bool = False) -> list:
+        """Returns violations, with the device name, filtered by any combination of run, error type and device.
+
+        Args:
+            run_id (int, optional): Run. Defaults to None (the latest run).
+            error_type (str, optional): Error type. Defaults to None (any).
+            device (str, optional): Device name. Defaults to None (any).
+            new_only (bool, optional): Only violations the previous comparable run didn't have. Defaults to False.
+        """
+
+        if run_id is None:
+            run_id = self._latest_run()
+        clauses, parameters = ["violations.run_id = ?"], [run_id]
+        if error_type is not None:
+            clauses.append("violations.error_type = ?")
+            parameters.append(error_type)
+        if device is not None:
+            clauses.append("results.device = ?")
+            parameters.append(device)
+        if new_only:
+            clauses.append("violations.new")
+
+        return self._query(
+            "SELECT violations.*, results.device, results.ip FROM violations"
+            " JOIN results ON results.run_id = violations.run_id AND results.device_id = violations.device_id"
+            f" WHERE {' AND '.join(clauses)} ORDER BY results.device, violations.error_type",
+            parameters,
+        )
+
+    def resolved(self, run_id: int = None) -> list:
+        """Returns the violations of the previous comparable run that a run no longer found on a device it polled.
+
+        Args:
+            run_id (int, optional): Run. Defaults to None (the latest run).
+        """
+
+        if run_id is None:
+            run_id = self._latest_run()
+        previous_id = self.previous_run(run_id)
+        if previous_id is None:
+            return []
+
+        return self._query(
+            "SELECT old.*, current.device, current.ip FROM violations AS old"
+            " JOIN results AS current ON current.run_id = ? AND current.device_id = old.device_id"
+            " AND current.live_data IS NOT NULL"
+            " WHERE old.run_id = ? AND NOT EXISTS ("
+            "  SELECT 1 FROM violations AS still WHERE still.run_id = ? AND still.device_id = old.device_id"
+            "  AND still.error_type = old.error_type AND still.message IS old.message)"
+            " ORDER BY current.device, old.error_type",
+            (run_id, previous_id, run_id),
+        )
+
+    def _latest_run(self) -> int:
+        row = self._query_one("SELECT MAX(id) AS id FROM runs", ())
+        return row["id"] if row else None
+
+    def _query(self, sql: str, parameters) -> list:
+        with self._lock:
+            return [dict(row) for row in self._connection.execute(sql, parameters)]
+
+    def _query_one(self, sql: str, parameters) -> dict:
+        rows = self._query(sql, parameters)
+        return rows[0] if rows else None
+
+
+class RunRecorder:
+    """Records one run's device outcomes into a ResultsStore and decides which errors get reported.
+
+    Outcomes are buffered and written a batch at a time. In changes-only mode, a device error
+    whose violation_key() the previous comparable run already had is stored but not
+    returned for reporting, and finish() returns one RESOLVED_ERROR_TYPE error per violation of
+    the previous run that a device no longer has. Only devices that were polled count: one that
+    timed out this time may still have last run's mismatches.
+    """
+
+    def __init__(self, store: ResultsStore, url: str = None, selection: dict = None, changes_only: bool = False, buffer_size: int = 500):
+        """
+        Args:
+            store (ResultsStore): Store to record into.
+            url (str, optional): Netbox URL the devices came from. Defaults to None.
+            selection (dict, optional): Device filters of the run. Defaults to None.
+            changes_only (bool, optional): Only report new and resolved violations. Defaults to False.
+            buffer_size (int, optional): Device outcomes written per transaction. Defaults to 500.
+        """
+
+        self.store = store
+        self.changes_only = changes_only
+        self.buffer_size = buffer_size
+        self.run_id = store.start_run(url=url, selection=selection)
+
+        previous_id = store.previous_run(self.run_id)
+        self.previous = store.violation_keys(previous_id) if previous_id is not None else set()
+
+        self._lock = threading.Lock()
+        self._timings = {}
+        self._polled = {}
+        self._found = set()
+        self._results = []
+        self._violations = []
+
+    def observe(self, device, seconds: float):
+        """Adds time spent checking a device; see timer()."""
+
+        with self._lock:
+            self._timings[device.id] = self._timings.get(device.id, 0.0) + seconds
+
+    def record(self, device, live_data: dict = None, errors: list = None) -> list:
+        """Records a device's outcome.
+
+        Args:
+            device (DeviceSnapshot): Checked device.
+            live_data (dict, optional): Values polled from it. Defaults to None (polling failed).
+            errors (list, optional): Its err.DataErrors; groups are flattened. Defaults to None (compliant).
+
+        Returns:
+            list: The errors to report: all of them, or in changes-only mode just the new ones.
+        """
+
+        errors = _flatten(errors or [])
+        to_report, violations = [], []
+        keys = []
+        for error in errors:
+            key = violation_key(device.id, error.error_type, str(error))
+            new = key not in self.previous
+            keys.append(key)
+            violations.append((device.id, error.error_type, str(error), error.extra_data, new))
+            if new or not self.changes_only:
+                to_report.append(error)
+
+        with self._lock:
+            if live_data is not None:
+                self._polled[device.id] = device
+            self._found.update(keys)
+            self._results.append(
+                (device.id, device.name, device.ip, not errors, live_data, self._timings.pop(device.id, None))
+            )
+            self._violations += violations
+            if len(self._results) >= self.buffer_size:
+                self._write()
+
+        return to_report
+
+    def flush(self):
+        """Writes what is buffered, without closing the run."""
+
+        with self._lock:
+            self._write()
+
+    def finish(self) -> list:
+        """Writes what is buffered and closes the run.
+
+        Returns:
+            list: In changes-only mode, one err.DataError per resolved violation; otherwise empty.
+        """
+
+        with self._lock:
+            self._write()
+            self.store.finish_run(self.run_id)
+
+            if not self.changes_only:
+                return []
+            return [
+                err.DataError(
+                    message=f"RESOLVED: {self._polled[device_id]} - {error_type} no longer occurs",
+                    error_type=RESOLVED_ERROR_TYPE,
+                    device=self._polled[device_id],
+                    extra_data={'resolved_error_type': error_type},
+                )
+                for device_id, error_type, _ in sorted(self.previous - self._found)
+                if device_id in self._polled
+            ]
+
+    def _write(self):
+        if self._results or self._violations:
+            self.store.write(self.run_id, self._results, self._violations)
+            self._results, self._violations = [], []
+
+
+def violation_key(device_id: int, error_type: str, message: str) -> tuple:
+    """Identifies a violation across runs: (device_id, error_type, digest of the message)."""
+
+    return device_id, error_type, hashlib.sha256(str(message).encode()).hexdigest()[:16]
+
+# RunRecorder of the running run, if results are stored. See enable().
+_active = None
+
+def enable(path: str, url: str = None, selection: dict = None, changes_only: bool = False) -> RunRecorder:
+    """Starts storing device outcomes for the rest of the run.
+
+    Args:
+        path (str): ResultsStore database file.
+        url (str, optional): Netbox URL the devices came from. Defaults to None.
+        selection (dict, optional): Device filters of the run. Defaults to None.
+        changes_only (bool, optional): Only report new and resolved violations. Defaults to False.
+
+    Returns:
+        RunRecorder: The recorder every record() and timer() goes to.
+    """
+
+    global _active
+
+    _active = RunRecorder(ResultsStore(path), url=url, selection=selection, changes_only=changes_only)
+    return _active
+
+def disable(finish: bool = True) -> list:
+    """Stops storing. Does nothing when not storing.
+
+    Args:
+        finish (bool, optional): Close the run, making it the one the next run is diffed against. An aborted
+            run's outcomes are kept but it stays unfinished. Defaults to True.
+
+    Returns:
+        list: Resolved-violation errors to report, see RunRecorder.finish().
+    """
+
+    global _active
+
+    recorder, _active = _active, None
+    if recorder is None:
+        return []
+    try:
+        if finish:
+            return recorder.finish()
+        recorder.flush()
+        return []
+    finally:
+        recorder.store.close()
+
+def timer(device):
+    """Context manager adding the enclosed time to the device's stored timing. A no-op while not storing."""
+
+    recorder = _active
+    return run_metrics.observed_timer(recorder.observe if recorder is not None else None, device=device)
+
+def record(device, live_data: dict = None, errors: list = None) -> list:
+    """Records a device's outcome with the active RunRecorder, see RunRecorder.record().
+
+    Returns:
+        list: The errors to report. All of them while not storing.
+    """
+
+    recorder = _active
+    if recorder is None:
+        return list(errors or [])
+    return recorder.record(device, live_data, errors)
+
+def _flatten(errors: list) -> list:
+    flat = []
+    for error in errors:
+        flat += _flatten(error.errors) if hasattr(error, 'errors') else [error]
+    return flat
+
+def _dumps(value, sort_keys: bool = False) -> str:
+    if value is None:
+        return None
+    return json.dumps(value, sort_keys=sort_keys, default=str)
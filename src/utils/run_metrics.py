@@ -0,0 +1,260 @@
+# Standard Library
+import bisect
+import json
+import threading
+import time
+
+# Custom imports
+from utils import file_utils
+
+# Upper bounds, in seconds, of the latency histogram buckets (Prometheus 'le' labels)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Prefix of every exported Prometheus metric
+METRIC_PREFIX = "netbox_compliance"
+
+
+class RunMetrics:
+    """Collects latency histograms per stage, per-device totals and error counters for one run.
+
+    Stages are free-form names, e.g. 'netbox_fetch', 'snmp_get' or 'compare'. Every observation
+    costs one lock and a bisect, so workers on several threads can record into the same instance.
+    """
+
+    def __init__(self, slowest: int = 10):
+        """
+        Args:
+            slowest (int, optional): Devices listed in the summary's slowest-devices table. Defaults to 10.
+        """
+
+        self.slowest = slowest
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._devices = {}
+        self._counters = {}
+
+    def observe(self, stage: str, seconds: float, device=None):
+        """Records one timed step.
+
+        Args:
+            stage (str): Stage the time was spent in.
+            seconds (float): Duration of the step.
+            device (DeviceSnapshot, optional): Device the step was for; its total is tracked. Defaults to None.
+        """
+
+        with self._lock:
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = {"buckets": [0] * (len(BUCKETS) + 1), "sum": 0.0, "count": 0, "max": 0.0}
+            histogram["buckets"][bisect.bisect_left(BUCKETS, seconds)] += 1
+            histogram["sum"] += seconds
+            histogram["count"] += 1
+            histogram["max"] = max(histogram["max"], seconds)
+
+            if device is not None:
+                name = str(device)
+                self._devices[name] = self._devices.get(name, 0.0) + seconds
+
+    def count(self, counter: str, label: str, amount: int = 1):
+        """Increments a labelled counter, e.g. count('errors', 'SNMPTimeout').
+
+        Args:
+            counter (str): Counter name.
+            label (str): Label value the counter is kept per.
+            amount (int, optional): Increment. Defaults to 1.
+        """
+
+        with self._lock:
+            values = self._counters.setdefault(counter, {})
+            values[label] = values.get(label, 0) + amount
+
+    def summary(self) -> dict:
+        """Returns the run's metrics as a JSON-serializable dict.
+
+        Returns:
+            dict: Run timing, per-stage histograms, counters and the slowest devices.
+        """
+
+        with self._lock:
+            stages = {
+                stage: {
+                    "count": histogram["count"],
+                    "sum": histogram["sum"],
+                    "mean": histogram["sum"] / histogram["count"],
+                    "max": histogram["max"],
+                    "buckets": dict(zip([*map(str, BUCKETS), "+Inf"], histogram["buckets"])),
+                }
+                for stage, histogram in self._stages.items()
+            }
+            slowest = sorted(self._devices.items(), key=lambda item: item[1], reverse=True)[:self.slowest]
+            counters = {counter: dict(values) for counter, values in self._counters.items()}
+
+        return {
+            "started_at": self.started_at,
+            "duration": time.time() - self.started_at,
+            "devices": len(self._devices),
+            "stages": stages,
+            "counters": counters,
+            "slowest_devices": [{"device": name, "seconds": seconds} for name, seconds in slowest],
+        }
+
+    def write_json(self, path: str):
+        """Writes summary() to a JSON file.
+
+        Args:
+            path (str): Summary file. Replaced atomically.
+        """
+
+        file_utils.write_atomic(path, json.dumps(self.summary(), indent=2), prefix=".metrics.")
+
+    def write_prometheus(self, path: str):
+        """Writes the metrics in Prometheus text format, for node_exporter's textfile collector.
+
+        Args:
+            path (str): Output file, normally '<collector directory>/<name>.prom'. Replaced atomically,
+                so the collector never reads a half-written file.
+        """
+
+        summary = self.summary()
+        lines = [
+            f"# HELP {METRIC_PREFIX}_stage_seconds Time spent per step of each stage of the compliance run.",
+            f"# TYPE {METRIC_PREFIX}_stage_seconds histogram",
+        ]
+        for stage, histogram in sorted(summary["stages"].items()):
+            cumulative = 0
+            for bound, bucket_count in histogram["buckets"].items():
+                cumulative += bucket_count
+                lines.append(f'{METRIC_PREFIX}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{METRIC_PREFIX}_stage_seconds_sum{{stage="{stage}"}} {histogram["sum"]}')
+            lines.append(f'{METRIC_PREFIX}_stage_seconds_count{{stage="{stage}"}} {histogram["count"]}')
+
+        for counter, values in sorted(summary["counters"].items()):
+            lines.append(f"# HELP {METRIC_PREFIX}_{counter}_total Occurrences per {counter[:-1]} type during the compliance run.")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{counter}_total counter")
+            for label, value in sorted(values.items()):
+                lines.append(f'{METRIC_PREFIX}_{counter}_total{{type="{label}"}} {value}')
+
+        lines += [
+            f"# HELP {METRIC_PREFIX}_run_duration_seconds Wall-clock duration of the last compliance run.",
+            f"# TYPE {METRIC_PREFIX}_run_duration_seconds gauge",
+            f"{METRIC_PREFIX}_run_duration_seconds {summary['duration']}",
+            f"# HELP {METRIC_PREFIX}_devices Devices timed during the last compliance run.",
+            f"# TYPE {METRIC_PREFIX}_devices gauge",
+            f"{METRIC_PREFIX}_devices {summary['devices']}",
+            f"# HELP {METRIC_PREFIX}_last_run_timestamp_seconds Start of the last compliance run.",
+            f"# TYPE {METRIC_PREFIX}_last_run_timestamp_seconds gauge",
+            f"{METRIC_PREFIX}_last_run_timestamp_seconds {summary['started_at']}",
+        ]
+        file_utils.write_atomic(path, "\n".join(lines) + "\n", prefix=".metrics.")
+
+
+class _Timer:
+    __slots__ = ("observe", "arguments", "started")
+
+    def __init__(self, observe, arguments: dict):
+        self.observe = observe
+        self.arguments = arguments
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.observe(seconds=time.perf_counter() - self.started, **self.arguments)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return None
+
+_NULL_TIMER = _NullTimer()
+
+# RunMetrics of the running run, if instrumentation is on. See enable().
+_active = None
+
+def enable(**options) -> RunMetrics:
+    """Turns instrumentation on for the rest of the process.
+
+    Args:
+        **options: RunMetrics arguments.
+
+    Returns:
+        RunMetrics: The instance every timer() and count() records into.
+    """
+
+    global _active
+
+    _active = RunMetrics(**options)
+    return _active
+
+def disable():
+    """Turns instrumentation off again; timer() and count() go back to doing nothing."""
+
+    global _active
+
+    _active = None
+
+def timer(stage: str, device=None):
+    """Context manager timing the enclosed step into the active RunMetrics.
+
+    While instrumentation is off this returns one shared no-op context manager.
+
+    Args:
+        stage (str): Stage the time is spent in.
+        device (DeviceSnapshot, optional): Device the step is for. Defaults to None.
+    """
+
+    metrics = _active
+    return observed_timer(metrics.observe if metrics is not None else None, stage=stage, device=device)
+
+def observed_timer(observe, **arguments):
+    """Context manager passing the time the enclosed block took to observe(seconds=..., **arguments).
+
+    Shared by timer() and other per-run recorders (e.g. utils.results_store), so every
+    instrumentation hook costs the same when it is off.
+
+    Args:
+        observe (callable): Receives the duration as 'seconds', or None for the shared no-op context manager.
+        **arguments: Passed along to observe.
+    """
+
+    if observe is None:
+        return _NULL_TIMER
+    return _Timer(observe, arguments)
+
+def count(counter: str, label: str, amount: int = 1):
+    """Increments a labelled counter of the active RunMetrics, if any. See RunMetrics.count()."""
+
+    metrics = _active
+    if metrics is not None:
+        metrics.count(counter, label, amount)
+
+def timed_iter(stage: str, iterable):
+    """Wraps an iterator so the time spent producing each item is recorded under stage.
+
+    Used for lazily paginated Netbox results, where the fetching happens inside next().
+
+    Args:
+        stage (str): Stage the time is spent in.
+        iterable (iterable): Items to pass through.
+
+    Returns:
+        iterator: The same items. The iterable itself when instrumentation is off.
+    """
+
+    if _active is None:
+        return iterable
+    return _timed_iter(stage, iter(iterable))
+
+def _timed_iter(stage: str, iterator):
+    while True:
+        with timer(stage):
+            try: item = next(iterator)
+            except StopIteration: return
+        yield item
@@ -0,0 +1,274 @@
+# Standard Library
+import hashlib
+import json
+import threading
+import time
+
+# Custom imports
+from utils import file_utils
+
+
+class SnmpUsmCache:
+    """Opt-in on-disk cache of SNMPv3 agent state, keyed by (host, credential fingerprint).
+
+    For every agent it remembers the discovered authoritative engine ID, the engine boots/time
+    seen in the last authenticated response and the auth/priv keys localized to that engine ID.
+    Seeding a fresh SnmpEngine from an entry lets the first request go out fully authenticated,
+    skipping both the engine-ID discovery round trip and the password-to-key localization.
+
+    The file holds localized keys, which are credentials for the cached agents, so it is written
+    with owner-only permissions.
+    """
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, path: str, ttl: float = 86400):
+        """
+        Args:
+            path (str): Location of the cache file. It is created on the first save.
+            ttl (float, optional): Seconds an entry stays valid after it was stored. Defaults to 86400 (one day).
+        """
+
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._entries = self._load()
+
+    @staticmethod
+    def credential_fingerprint(user_data) -> str:
+        """Builds a short, non-reversible fingerprint of a set of SNMPv3 credentials.
+
+        Args:
+            user_data (snmp_utils.SnmpUser): Credentials the poller authenticates with.
+
+        Returns:
+            str: Hex digest that changes whenever any credential or protocol changes.
+        """
+
+        material = "|".join(
+            str(part) for part in (
+                user_data.userName,
+                user_data.authKey,
+                user_data.privKey,
+                user_data.authProtocol,
+                user_data.privProtocol,
+            )
+        )
+        return hashlib.sha256(material.encode()).hexdigest()[:32]
+
+    def get(self, host: str, fingerprint: str) -> dict:
+        """Returns the cached entry for an agent, or None if it is missing or expired.
+
+        Args:
+            host (str): IP address of the agent.
+            fingerprint (str): Credential fingerprint from credential_fingerprint().
+
+        Returns:
+            dict: Entry with 'engine_id', 'boots', 'time', 'stored_at', 'auth_key' and 'priv_key'.
+        """
+
+        with self._lock:
+            entry = self._entries.get(self._key(host, fingerprint))
+
+        if entry is None or time.time() - entry["stored_at"] > self.ttl:
+            return None
+        return entry
+
+    def put(self, host: str, fingerprint: str, entry: dict):
+        """Stores (or replaces) the entry for an agent. Call save() to persist it.
+
+        Args:
+            host (str): IP address of the agent.
+            fingerprint (str): Credential fingerprint from credential_fingerprint().
+            entry (dict): Entry as returned by harvest_engine().
+        """
+
+        with self._lock:
+            self._entries[self._key(host, fingerprint)] = entry
+            self._dirty = True
+
+    def invalidate(self, host: str, fingerprint: str):
+        """Drops the entry for an agent, e.g. after it rejected our digest.
+
+        Args:
+            host (str): IP address of the agent.
+            fingerprint (str): Credential fingerprint from credential_fingerprint().
+        """
+
+        with self._lock:
+            if self._entries.pop(self._key(host, fingerprint), None) is not None:
+                self._dirty = True
+
+    def save(self):
+        """Atomically writes the cache to disk if anything changed since it was loaded."""
+
+        with self._lock:
+            if not self._dirty:
+                return
+
+            now = time.time()
+            payload = {
+                "version": self.FORMAT_VERSION,
+                "entries": {
+                    key: entry for key, entry in self._entries.items()
+                    if now - entry["stored_at"] <= self.ttl
+                },
+            }
+            file_utils.write_atomic(self.path, json.dumps(payload), prefix=".snmp_cache.", mode=0o600)
+
+            self._dirty = False
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path) as f:
+                payload = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+        # Unknown layouts are ignored and rebuilt rather than misread.
+        if payload.get("version") != self.FORMAT_VERSION:
+            return {}
+        return payload.get("entries", {})
+
+    @staticmethod
+    def _key(host: str, fingerprint: str) -> str:
+        return f"{host}|{fingerprint}"
+
+
+# The helpers below reach into pysnmp's message-processing and USM internals (pinned to the
+# 4.4 series in requirements.txt), which expose no public API for pre-loading peer state.
+# They only run once a poller exists, so pysnmp is imported there rather than with this module.
+
+def _engine_id_cache(snmp_engine) -> dict:
+    return snmp_engine.messageProcessingSubsystems[3]._SnmpV3MessageProcessingModel__engineIdCache
+
+def _usm_timeline(snmp_engine) -> dict:
+    return snmp_engine.securityModels[3]._SnmpUSMSecurityModel__timeline
+
+def supports_engine(snmp_engine) -> bool:
+    """Checks that an SnmpEngine keeps its peer state where the helpers below expect it.
+
+    Pollers call this before using a cache, so a pysnmp release that moved these internals
+    disables the cache (with a message) instead of failing every request.
+
+    Args:
+        snmp_engine (pysnmp.entity.engine.SnmpEngine): Freshly configured engine.
+
+    Returns:
+        bool: True if engine IDs and timelines can be seeded and harvested.
+    """
+
+    try:
+        supported = isinstance(_engine_id_cache(snmp_engine), dict) and isinstance(_usm_timeline(snmp_engine), dict)
+    except (AttributeError, KeyError, IndexError):
+        supported = False
+
+    if not supported:
+        print("ERROR: This pysnmp release keeps SNMPv3 engine state elsewhere; the SNMPv3 cache is disabled.")
+    return supported
+
+def seed_engine(snmp_engine, transport_target, user_data, entry: dict):
+    """Pre-loads an SnmpEngine with a cached agent's engine ID, timeline and localized keys.
+
+    Args:
+        snmp_engine (pysnmp.entity.engine.SnmpEngine): Engine the next request to the agent will use.
+        transport_target: The agent's target, with its transportDomain and transportAddr.
+        user_data (snmp_utils.SnmpUser): Credentials the poller authenticates with.
+        entry (dict): Cache entry as returned by SnmpUsmCache.get().
+    """
+
+    from pyasn1.type import univ
+    from pysnmp.entity import config
+
+    engine_id = univ.OctetString(hexValue=entry["engine_id"])
+
+    config.addV3User(
+        snmp_engine,
+        user_data.userName,
+        user_data.authProtocol, bytes.fromhex(entry["auth_key"]),
+        user_data.privProtocol, bytes.fromhex(entry["priv_key"]),
+        securityEngineId=engine_id,
+        authKeyType=config.usmKeyTypeLocalized,
+        privKeyType=config.usmKeyTypeLocalized,
+    )
+
+    _engine_id_cache(snmp_engine)[(transport_target.transportDomain, transport_target.transportAddr)] = {
+        "securityEngineId": engine_id,
+        "contextEngineId": engine_id,
+        "contextName": univ.OctetString(""),
+    }
+
+    # The agent's clock kept running while we were away; an estimate that is still off
+    # (e.g. after a reboot) just costs one notInTimeWindow report and pysnmp resynchronizes.
+    engine_time = entry["time"] + int(time.time() - entry["stored_at"])
+    _usm_timeline(snmp_engine)[engine_id] = (
+        univ.Integer(entry["boots"]),
+        univ.Integer(engine_time),
+        univ.Integer(engine_time),
+        int(time.time()),
+    )
+
+def unseed_engine(snmp_engine, transport_target, user_data):
+    """Forgets the agent's engine ID and keys so the next request to it starts a fresh discovery.
+
+    Args:
+        snmp_engine (pysnmp.entity.engine.SnmpEngine): Engine that was seeded with seed_engine().
+        transport_target: The agent's target, with its transportDomain and transportAddr.
+        user_data (snmp_utils.SnmpUser): Credentials the poller authenticates with.
+    """
+
+    from pysnmp.entity import config
+
+    peer = _engine_id_cache(snmp_engine).pop(
+        (transport_target.transportDomain, transport_target.transportAddr), None
+    )
+    if peer is not None:
+        _usm_timeline(snmp_engine).pop(peer["securityEngineId"], None)
+        config.delV3User(snmp_engine, user_data.userName, securityEngineId=peer["securityEngineId"])
+
+def harvest_engine(snmp_engine, transport_target, user_data) -> dict:
+    """Reads the state pysnmp learned about an agent after a successful request.
+
+    Args:
+        snmp_engine (pysnmp.entity.engine.SnmpEngine): Engine that just talked to the agent.
+        transport_target: The agent's target, with its transportDomain and transportAddr.
+        user_data (snmp_utils.SnmpUser): Credentials the poller authenticates with.
+
+    Returns:
+        dict: Cache entry for SnmpUsmCache.put(), or None if the engine holds no state for the agent.
+    """
+
+    from pysnmp.smi.error import NoSuchInstanceError
+
+    peer = _engine_id_cache(snmp_engine).get(
+        (transport_target.transportDomain, transport_target.transportAddr)
+    )
+    if peer is None:
+        return None
+
+    engine_id = peer["securityEngineId"]
+    timeline = _usm_timeline(snmp_engine).get(engine_id)
+    if timeline is None:
+        return None
+
+    mib_builder = snmp_engine.msgAndPduDsp.mibInstrumController.mibBuilder
+    usm_user_entry, = mib_builder.importSymbols("SNMP-USER-BASED-SM-MIB", "usmUserEntry")
+    usm_key_entry, = mib_builder.importSymbols("PYSNMP-USM-MIB", "pysnmpUsmKeyEntry")
+    index = usm_user_entry.getInstIdFromIndices(engine_id, user_data.userName)
+
+    try:
+        auth_key = usm_key_entry.getNode(usm_key_entry.name + (1,) + index).syntax
+        priv_key = usm_key_entry.getNode(usm_key_entry.name + (2,) + index).syntax
+    except NoSuchInstanceError:
+        return None
+
+    boots, engine_time, _, updated_at = timeline
+    return {
+        "engine_id": engine_id.asOctets().hex(),
+        "boots": int(boots),
+        "time": int(engine_time) + int(time.time() - updated_at),
+        "stored_at": time.time(),
+        "auth_key": auth_key.asOctets().hex(),
+        "priv_key": priv_key.asOctets().hex(),
+    }
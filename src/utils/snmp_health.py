@@ -0,0 +1,177 @@
+# Standard Library
+import json
+import threading
+import time
+
+# Custom imports
+from utils import file_utils
+
+
+class SnmpHealthTracker:
+    """Per-device SNMP latency and failure bookkeeping, optionally persisted between runs.
+
+    Round-trip times feed a smoothed RTT and RTT variance (the TCP retransmission-timer estimator,
+    RFC 6298), from which each device gets its own first timeout. Retries double that timeout up
+    to max_timeout. Devices that keep timing out lose their retries and, after failure_threshold
+    consecutive failed polls, get their circuit opened: they are skipped until an exponentially
+    growing backoff has passed, after which a single cheap GET probes whether they are back.
+    """
+
+    FORMAT_VERSION = 1
+
+    def __init__(
+        self,
+        path: str = None,
+        initial_timeout: float = 1.0,
+        min_timeout: float = 0.3,
+        max_timeout: float = 8.0,
+        retries: int = 2,
+        failure_threshold: int = 2,
+        base_backoff: float = 3600,
+        max_backoff: float = 86400,
+    ):
+        """
+        Args:
+            path (str, optional): File persisting the state between runs. Defaults to None (this run only).
+            initial_timeout (float, optional): First timeout, in seconds, for devices without RTT samples. Defaults to 1.0.
+            min_timeout (float, optional): Lower bound of derived timeouts. Defaults to 0.3.
+            max_timeout (float, optional): Upper bound of any timeout, including backed-off retries. Defaults to 8.0.
+            retries (int, optional): Retries of a healthy device's request. Defaults to 2.
+            failure_threshold (int, optional): Consecutive failed polls that open a device's circuit. Defaults to 2.
+            base_backoff (float, optional): Seconds an opened circuit stays open the first time. Defaults to 3600.
+            max_backoff (float, optional): Upper bound of the doubling open period. Defaults to 86400.
+        """
+
+        self.path = path
+        self.initial_timeout = initial_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.retries = retries
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._entries = self._load()
+
+    def timeouts(self, host: str) -> list:
+        """Returns the timeout of every attempt a request to the device may make.
+
+        Args:
+            host (str): IP address of the device.
+
+        Returns:
+            list: Seconds to wait for each attempt, doubling from the device's RTT-derived timeout.
+        """
+
+        with self._lock:
+            entry = self._entries.get(host, {})
+
+        if entry.get("srtt") is None:
+            timeout = self.initial_timeout
+        else:
+            timeout = entry["srtt"] + 4 * entry["rttvar"]
+        timeout = min(max(timeout, self.min_timeout), self.max_timeout)
+
+        # A device that failed its last poll only gets one attempt
+        retries = 0 if entry.get("failures") else self.retries
+        return [min(timeout * 2 ** attempt, self.max_timeout) for attempt in range(retries + 1)]
+
+    def state(self, host: str) -> str:
+        """Returns the device's circuit state.
+
+        Args:
+            host (str): IP address of the device.
+
+        Returns:
+            str: 'closed' (poll normally), 'open' (skip it) or 'half-open' (probe it first).
+        """
+
+        with self._lock:
+            entry = self._entries.get(host, {})
+
+        if entry.get("failures", 0) < self.failure_threshold:
+            return "closed"
+        if time.time() < entry.get("open_until", 0):
+            return "open"
+        return "half-open"
+
+    def retry_at(self, host: str) -> float:
+        """Returns the epoch time an open circuit will be probed again (0 when it isn't open)."""
+
+        with self._lock:
+            return self._entries.get(host, {}).get("open_until", 0)
+
+    def record_success(self, host: str, rtt: float = None):
+        """Records an answered request, closing the device's circuit.
+
+        Args:
+            host (str): IP address of the device.
+            rtt (float, optional): Seconds between sending the request and receiving the answer.
+                None when the exchange isn't a fair sample (e.g. it included engine discovery).
+        """
+
+        with self._lock:
+            entry = self._entries.setdefault(host, {"srtt": None, "rttvar": None})
+            if rtt is not None and entry["srtt"] is None:
+                entry["srtt"], entry["rttvar"] = rtt, rtt / 2
+            elif rtt is not None:
+                entry["rttvar"] = 0.75 * entry["rttvar"] + 0.25 * abs(entry["srtt"] - rtt)
+                entry["srtt"] = 0.875 * entry["srtt"] + 0.125 * rtt
+            entry["failures"] = 0
+            entry["open_until"] = 0
+            self._dirty = True
+
+    def record_failure(self, host: str):
+        """Records a poll that got no answer, opening the circuit once failure_threshold is reached.
+
+        Args:
+            host (str): IP address of the device.
+        """
+
+        with self._lock:
+            entry = self._entries.setdefault(host, {"srtt": None, "rttvar": None})
+            entry["failures"] = entry.get("failures", 0) + 1
+            if entry["failures"] >= self.failure_threshold:
+                backoff = self.base_backoff * 2 ** (entry["failures"] - self.failure_threshold)
+                entry["open_until"] = time.time() + min(backoff, self.max_backoff)
+            self._dirty = True
+
+    def priority(self, host: str) -> int:
+        """Sort key that moves devices which recently failed behind healthy ones.
+
+        Args:
+            host (str): IP address of the device.
+
+        Returns:
+            int: The device's consecutive failures.
+        """
+
+        with self._lock:
+            return self._entries.get(host, {}).get("failures", 0)
+
+    def save(self):
+        """Atomically writes the state to disk if anything changed since it was loaded."""
+
+        with self._lock:
+            if self.path is None or not self._dirty:
+                return
+
+            payload = {"version": self.FORMAT_VERSION, "entries": self._entries}
+            file_utils.write_atomic(self.path, json.dumps(payload), prefix=".snmp_health.", mode=0o600)
+
+            self._dirty = False
+
+    def _load(self) -> dict:
+        if self.path is None:
+            return {}
+        try:
+            with open(self.path) as f:
+                payload = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+        # Unknown layouts are ignored and rebuilt rather than misread.
+        if payload.get("version") != self.FORMAT_VERSION:
+            return {}
+        return payload.get("entries", {})
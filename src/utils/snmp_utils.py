@@ -1,63 +1,513 @@
 # Standard Library
+import collections
+import functools
 import os
 from pprint import pprint 
+import re
+import socket
+import threading
+import time
 
 # Non-Standard Library
 from dotenv import load_dotenv
-import pysnmp
-from pysnmp.hlapi import *
 
 # Custom imports
 import error_handling.custom_errors as err
+from utils import run_metrics, snmp_cache, snmp_health
 
-def get_snmp_data(target_host: str, oid: str) -> str:
+# pysnmp's native (v3arch) API, imported by _import_pysnmp() when the first poller is created, so
+# entry points and code paths that never poll don't pay for it. Requests are built from numeric
+# OIDs and never touch pysnmp.hlapi, whose MIB resolution builds a MIB compiler for every engine.
+config = engine = cmdgen = udp = errind = rfc1902 = v2c = None
+
+# pysnmp's UdpTransportTarget default: a 1 second timeout and 5 retries
+DEFAULT_TIMEOUTS = [1.0] * 6
+
+# sysUpTime.0, answered by every agent; probes devices whose circuit is half-open
+PROBE_OID = "1.3.6.1.2.1.1.3.0"
+
+# Rows per GETBULK response when walking tables; see SnmpPoller.walk
+DEFAULT_MAX_REPETITIONS = 25
+
+# ifTable/ifXTable columns collected for interface compliance, walked side by side
+IF_TABLE_COLUMNS = {
+    "descr": "1.3.6.1.2.1.2.2.1.2",          # ifDescr, e.g. GigabitEthernet1/0/1
+    "type": "1.3.6.1.2.1.2.2.1.3",           # ifType, 6 = ethernetCsmacd
+    "admin_status": "1.3.6.1.2.1.2.2.1.7",   # ifAdminStatus, 1 = up
+    "oper_status": "1.3.6.1.2.1.2.2.1.8",    # ifOperStatus, 1 = up
+    "name": "1.3.6.1.2.1.31.1.1.1.1",        # ifName, e.g. Gi1/0/1
+    "speed": "1.3.6.1.2.1.31.1.1.1.15",      # ifHighSpeed, Mbps
+    "alias": "1.3.6.1.2.1.31.1.1.1.18",      # ifAlias, the configured description
+}
+
+# Name of the target parameters (user, authPriv, SNMPv3) every request of an engine goes out with
+TARGET_PARAMS = "compliance"
+
+# A numeric OID, e.g. "1.3.6.1.2.1.1.5.0"; a leading dot is accepted
+NUMERIC_OID = re.compile(r"\.?\d+(\.\d+)+")
+
+def _import_pysnmp():
+    global config, engine, cmdgen, udp, errind, rfc1902, v2c
+
+    if v2c is None:
+        from pysnmp.carrier.asyncore.dgram import udp
+        from pysnmp.entity import config, engine
+        from pysnmp.entity.rfc3413 import cmdgen
+        from pysnmp.proto import errind, rfc1902
+        from pysnmp.proto.api import v2c
+
+@functools.lru_cache(maxsize=None)
+def parse_oid(oid: str) -> tuple:
+    """Validates a numeric OID, e.g. from a Netbox custom field, and splits it into its sub-identifiers.
+
+    Results are cached, so every distinct OID (and with it every device type's OIDs) is parsed once per run.
+
+    Args:
+        oid (str): OID in dotted numeric form. Symbolic names (e.g. "SNMPv2-MIB::sysName.0") are rejected.
+
+    Raises:
+        ValueError: The OID is not in dotted numeric form.
+
+    Returns:
+        tuple: The OID's sub-identifiers as ints.
+    """
+
+    if not isinstance(oid, str) or not NUMERIC_OID.fullmatch(oid.strip()):
+        raise ValueError(f"Not a numeric OID: {oid!r}")
+    return tuple(int(part) for part in oid.strip().lstrip(".").split("."))
+
+@functools.lru_cache(maxsize=None)
+def _request_var_binds(oids: tuple) -> tuple:
+    # (ObjectName, Null) pairs for a request, built once per set of OIDs, i.e. once per device type
+    return tuple((rfc1902.ObjectName(parse_oid(oid)), v2c.null) for oid in oids)
+
+# SNMPv3 credentials, named like the pysnmp.hlapi.UsmUserData attributes snmp_cache reads
+SnmpUser = collections.namedtuple("SnmpUser", ["userName", "authKey", "privKey", "authProtocol", "privProtocol"])
+
+class _Target:
+    """One agent as seen by an engine: its SNMP-TARGET-MIB row and the transport address snmp_cache keys on."""
+
+    def __init__(self, name: str, transport_address: tuple, timeout: float):
+        self.name = name
+        self.transportDomain = udp.domainName
+        self.transportAddr = transport_address
+        self.timeout = timeout
+
+class SnmpPoller:
+    """Long-lived SNMPv3 poller that is created once per run and shared by every compliance worker.
+
+    Credentials are read from the environment once and the USM user is built once. Each worker
+    thread lazily gets its own SnmpEngine (and transport dispatcher), which it keeps for the rest
+    of the run, because a pysnmp engine must not be driven from several threads at once. A
+    sequential run therefore uses exactly one engine, and engine-ID discovery and key localization
+    happen once per device instead of once per request.
+
+    With a usm_cache, that per-device discovery and localization is also skipped across runs.
+
+    With a health tracker, every device gets timeouts derived from its own round-trip times, and
+    devices that keep timing out are skipped (or probed with one cheap GET) instead of polled.
+    """
+
+    def __init__(
+        self,
+        user: str = None,
+        auth_key: str = None,
+        priv_key: str = None,
+        port: int = 161,
+        usm_cache: snmp_cache.SnmpUsmCache = None,
+        health: snmp_health.SnmpHealthTracker = None,
+        max_repetitions: int = DEFAULT_MAX_REPETITIONS,
+    ):
+        """
+        Args:
+            user (str, optional): SNMPv3 username. Defaults to the 'snmp_user' environment variable.
+            auth_key (str, optional): SHA authentication passphrase. Defaults to the 'snmp_auth' environment variable.
+            priv_key (str, optional): AES privacy passphrase. Defaults to the 'snmp_priv' environment variable.
+            port (int, optional): UDP port the agents listen on. Defaults to 161.
+            usm_cache (snmp_cache.SnmpUsmCache, optional): Persistent engine-ID/localized-key cache. Defaults to None (disabled).
+            health (snmp_health.SnmpHealthTracker, optional): Per-device RTT and circuit-breaker state.
+                Defaults to None (pysnmp's fixed timeout and retries for every device).
+            max_repetitions (int, optional): Rows requested per GETBULK PDU by walk(). Defaults to DEFAULT_MAX_REPETITIONS.
+        """
+
+        load_dotenv()
+        _import_pysnmp()
+
+        self.port = port
+        self.max_repetitions = max_repetitions
+        self.snmp_user = SnmpUser(
+            userName=user or os.getenv("snmp_user"),
+            authKey=auth_key or os.getenv("snmp_auth"),
+            privKey=priv_key or os.getenv("snmp_priv"),
+            authProtocol=config.usmHMACSHAAuthProtocol,
+            privProtocol=config.usmAesCfb128Protocol,
+        )
+        self.usm_cache = usm_cache
+        self.credential_fingerprint = (
+            snmp_cache.SnmpUsmCache.credential_fingerprint(self.snmp_user) if usm_cache else None
+        )
+        self.health = health
+        self._local = threading.local()
+
+    @property
+    def snmp_engine(self):
+        """SnmpEngine owned by the calling thread, created and configured with the USM user on first use."""
+
+        snmp_engine = getattr(self._local, "snmp_engine", None)
+        if snmp_engine is None:
+            snmp_engine = engine.SnmpEngine()
+            config.addTransport(snmp_engine, udp.domainName, udp.UdpTransport().openClientMode())
+            config.addV3User(
+                snmp_engine,
+                self.snmp_user.userName,
+                self.snmp_user.authProtocol, self.snmp_user.authKey,
+                self.snmp_user.privProtocol, self.snmp_user.privKey,
+            )
+            config.addTargetParams(snmp_engine, TARGET_PARAMS, self.snmp_user.userName, "authPriv")
+            # Every PDU handed to the transport, including the resend after engine discovery
+            snmp_engine.observer.registerObserver(self._pdu_sent, "rfc3412.sendPdu")
+            if self.usm_cache is not None and not snmp_cache.supports_engine(snmp_engine):
+                self.usm_cache = None
+
+            self._local.snmp_engine = snmp_engine
+            self._local.targets = {}
+            self._local.cached_hosts = set()
+            self._local.sent_at = None
+            self._local.rtts = []
+        return snmp_engine
+
+    def _pdu_sent(self, snmp_engine, execpoint, variables, context):
+        self._local.sent_at = time.monotonic()
+
+    def _target(self, target_host: str, timeout: float) -> _Target:
+        """Returns this thread's engine's target for an agent, (re)configured for the given timeout."""
+
+        snmp_engine = self.snmp_engine
+        target = self._local.targets.get(target_host)
+        if target is not None and target.timeout == timeout:
+            return target
+
+        if target is None:
+            # Resolved once, like pysnmp.hlapi.UdpTransportTarget does for every request
+            transport_address = socket.getaddrinfo(target_host, self.port, socket.AF_INET, socket.SOCK_DGRAM)[0][4][:2]
+            target = self._local.targets[target_host] = _Target(f"t{len(self._local.targets)}", transport_address, timeout)
+        target.timeout = timeout
+
+        # One attempt per timeout; _request does the retrying
+        config.addTargetAddr(
+            snmp_engine, target.name, udp.domainName, target.transportAddr, TARGET_PARAMS,
+            timeout=int(round(timeout * 100)), retryCount=0,
+        )
+        return target
+
+    def _exchange(self, send_pdu) -> tuple:
+        """Sends one PDU and runs this thread's dispatcher until its response arrives or it times out.
+
+        An answered exchange adds its round-trip time to this thread's samples. It is measured from the
+        last time the PDU went out, so engine discovery and key localization before it don't count.
+
+        Args:
+            send_pdu (callable): Called with the response callback; sends the PDU with a pysnmp command generator.
+
+        Returns:
+            tuple: (error_indication, error_status, var_binds) of the response.
+        """
+
+        response = {}
+
+        def callback(snmp_engine, handle, error_indication, error_status, error_index, var_binds, context):
+            if not error_indication:
+                self._local.rtts.append(time.monotonic() - self._local.sent_at)
+            response.update(error_indication=error_indication, error_status=error_status, var_binds=var_binds)
+
+        send_pdu(callback)
+        self.snmp_engine.transportDispatcher.runDispatcher()
+        return response["error_indication"], response["error_status"], response["var_binds"]
+
+    def _seed_from_cache(self, target_host: str, transport_target) -> bool:
+        """Seeds this thread's engine with the cached state of an agent, once per engine.
+
+        Returns:
+            bool: True if the engine's state for the agent came from the cache.
+        """
+
+        snmp_engine = self.snmp_engine
+        if target_host in self._local.cached_hosts:
+            return True
+
+        entry = self.usm_cache.get(target_host, self.credential_fingerprint)
+        if entry is None:
+            return False
+
+        snmp_cache.seed_engine(snmp_engine, transport_target, self.snmp_user, entry)
+        self._local.cached_hosts.add(target_host)
+        return True
+
+    def get(self, target_host: str, oid_mapping: dict) -> dict:
+        """Collects several OIDs from the given IP address with a single SNMP GET.
+
+        All OIDs are packed into one PDU, so the whole mapping costs one request/response
+        exchange instead of one per OID.
+
+        Args:
+            target_host (str): IP address of the host you want to query.
+            oid_mapping (dict): Maps caller-defined keys to the full OIDs you want to collect.
+
+        Raises:
+            err.CircuitOpenError: The device's circuit is open after repeated timeouts, so it was not polled.
+            err.RequestTimedOutError: The device did not answer in time.
+            err.WrongSNMPDigest: The device rejected the SNMPv3 credentials.
+            err.WrongSNMPOid: One of the OIDs does not exist on the device. The offending key and OID are attached.
+            err.OtherSNMPError: Any other SNMP failure.
+
+        Returns:
+            dict: Maps each key from oid_mapping to its OID value.
+        """
+
+        with run_metrics.timer("snmp_get"):
+            return self._with_health(target_host, lambda timeouts: self._get(target_host, oid_mapping, timeouts))
+
+    def walk(self, target_host: str, columns: dict, max_repetitions: int = None) -> dict:
+        """Walks table columns side by side with GETBULK, e.g. IF_TABLE_COLUMNS.
+
+        Every PDU asks for the next `max_repetitions` rows of all columns at once, so a 48-port
+        switch's interface table costs a few exchanges instead of one GET per cell. Columns of
+        different tables sharing an index (ifTable and ifXTable) can be walked together.
+
+        Args:
+            target_host (str): IP address of the host you want to query.
+            columns (dict): Maps caller-defined keys to the OIDs of the table columns.
+            max_repetitions (int, optional): Rows per GETBULK response. Defaults to the poller's max_repetitions.
+
+        Raises:
+            err.CircuitOpenError: The device's circuit is open after repeated timeouts, so it was not polled.
+            err.RequestTimedOutError: The device did not answer in time.
+            err.WrongSNMPDigest: The device rejected the SNMPv3 credentials.
+            err.OtherSNMPError: Any other SNMP failure.
+
+        Returns:
+            dict: Maps each row index (the OID suffix, an int for single-index tables) to a dict of the row's
+                values keyed like columns. Columns the agent doesn't implement are missing from the rows.
+                OctetStrings come back as str, numbers as int.
+        """
+
+        max_repetitions = max_repetitions or self.max_repetitions
+        with run_metrics.timer("snmp_walk"):
+            return self._with_health(
+                target_host, lambda timeouts: self._walk(target_host, columns, max_repetitions, timeouts)
+            )
+
+    def _with_health(self, target_host: str, request) -> dict:
+        if self.health is None:
+            return request(DEFAULT_TIMEOUTS)
+
+        state = self.health.state(target_host)
+        if state == "open":
+            raise err.CircuitOpenError(
+                "SNMP circuit open after repeated timeouts", retry_at=self.health.retry_at(target_host)
+            )
+
+        timeouts = self.health.timeouts(target_host)
+        try:
+            if state == "half-open":
+                # One attempt at a single OID before spending the full budget on the real request
+                self._get(target_host, {"probe": PROBE_OID}, timeouts[:1])
+                timeouts = self.health.timeouts(target_host)
+            return request(timeouts)
+        except err.RequestTimedOutError:
+            self.health.record_failure(target_host)
+            raise
+
+    def _get(self, target_host: str, oid_mapping: dict, timeouts: list) -> dict:
+        keys = list(oid_mapping.keys())
+
+        # Netbox OIDs are sent as they are: validated and converted once, never looked up in a MIB
+        for key in keys:
+            try:
+                parse_oid(oid_mapping[key])
+            except ValueError:
+                raise err.WrongSNMPOid("OID is not in numeric form", oid_key=key, oid=oid_mapping[key])
+        request_var_binds = _request_var_binds(tuple(oid_mapping[key] for key in keys))
+
+        def send(target):
+            error_indication, error_status, var_binds = self._exchange(
+                lambda callback: cmdgen.GetCommandGenerator().sendVarBinds(
+                    self.snmp_engine, target.name, None, "", request_var_binds, callback
+                )
+            )
+            return error_indication, error_status, var_binds
+
+        var_binds = self._request(target_host, send, timeouts)
+
+        # This print is helpful for figuring out the var_binds obj_types below.
+        # https://pysnmp.readthedocs.io/en/latest/docs/api-reference.html#pysnmp.proto.rfc1902.OctetString
+        # print(type(var_binds[0][1]))
+
+        # Extract and return the results, keyed the same way as the request
+        snmp_data = {}
+        for key, var_bind in zip(keys, var_binds):
+            value = var_bind[1]
+
+            if isinstance(value, (v2c.NoSuchObject, v2c.NoSuchInstance)):
+                raise err.WrongSNMPOid("Incorrect OID passed to device", oid_key=key, oid=oid_mapping[key])
+
+            if isinstance(value, (v2c.OctetString, v2c.TimeTicks)):
+                snmp_data[key] = str(value) # pysnmp.proto.rfc1902.OctetString
+            else:
+                print(type(value))
+                raise err.OtherSNMPError("Unknown SNMP error, see snmp_utils.py")
+
+        return snmp_data
+
+    def _walk(self, target_host: str, columns: dict, max_repetitions: int, timeouts: list) -> dict:
+        keys = list(columns.keys())
+        prefixes = [rfc1902.ObjectName(parse_oid(columns[key])) for key in keys]
+
+        def send(target):
+            # (column, name, value) of every cell inside its column, across all GETBULK exchanges
+            cells = []
+            names = list(prefixes)
+            walking = [True] * len(keys)
+            while any(walking):
+                error_indication, error_status, var_binds = self._exchange(
+                    lambda callback: cmdgen.BulkCommandGeneratorSingleRun().sendVarBinds(
+                        self.snmp_engine, target.name, None, "", 0, max_repetitions,
+                        [(name, v2c.null) for name in names], callback,
+                    )
+                )
+                if error_indication or error_status:
+                    return error_indication, error_status, cells
+
+                # Responses are row-major; an agent may truncate the last row to fit its message size
+                rows = [var_binds[start:start + len(keys)] for start in range(0, len(var_binds) - len(keys) + 1, len(keys))]
+                if not rows:
+                    break
+                for row in rows:
+                    for column, (name, value) in enumerate(row):
+                        if not walking[column]:
+                            continue
+                        # A column ends where the agent leaves it; a non-increasing OID would loop forever
+                        if (
+                            isinstance(value, (v2c.EndOfMibView, v2c.NoSuchObject, v2c.NoSuchInstance))
+                            or not prefixes[column].isPrefixOf(name)
+                            or name <= names[column]
+                        ):
+                            walking[column] = False
+                            continue
+                        cells.append((column, name, value))
+                        names[column] = name
+            return None, None, cells
+
+        table = {}
+        for column, name, value in self._request(target_host, send, timeouts):
+            suffix = tuple(name)[len(prefixes[column]):]
+            index = suffix[0] if len(suffix) == 1 else suffix
+            if isinstance(value, v2c.OctetString):
+                value = str(value)
+            else:
+                value = int(value)
+            table.setdefault(index, {})[keys[column]] = value
+
+        return table
+
+    def _request(self, target_host: str, send, timeouts: list, _retry: bool = True):
+        """Runs one SNMP exchange with the poller's timeouts, USM cache and health bookkeeping.
+
+        Args:
+            target_host (str): IP address of the host you want to query.
+            send (callable): Called with the _Target of each attempt; returns
+                (error_indication, error_status, payload).
+            timeouts (list): Timeout of every attempt.
+
+        Returns:
+            The payload of the successful attempt.
+        """
+
+        # One attempt per timeout; pysnmp's own retries would reuse the first timeout
+        for attempt, timeout in enumerate(timeouts):
+            transport_target = self._target(target_host, timeout)
+            from_cache = self.usm_cache is not None and self._seed_from_cache(target_host, transport_target)
+
+            # Create SNMP request
+            self._local.rtts = []
+            error_indication, error_status, payload = send(transport_target)
+
+            # Cached keys may have gone stale (e.g. the device was replaced and has a new engine ID).
+            # Agents either report a wrong digest or silently drop such requests, so on either
+            # failure forget the cached state and retry once with a fresh discovery.
+            if from_cache and isinstance(error_indication, (errind.RequestTimedOut, errind.WrongDigest)):
+                self.usm_cache.invalidate(target_host, self.credential_fingerprint)
+                snmp_cache.unseed_engine(self.snmp_engine, transport_target, self.snmp_user)
+                self._local.cached_hosts.discard(target_host)
+                if _retry:
+                    return self._request(target_host, send, timeouts[attempt:], _retry=False)
+
+            if not isinstance(error_indication, errind.RequestTimedOut):
+                break
+
+        # Check for errors
+        if isinstance(error_indication, errind.RequestTimedOut):
+            raise err.RequestTimedOutError("SNMP request timed out")
+        if isinstance(error_indication, errind.WrongDigest):
+            raise err.WrongSNMPDigest("SNMP Digest incorrect - possibly incorrect credentials")
+        if error_indication or error_status:
+            raise err.OtherSNMPError(f"Unknown SNMP error, see snmp_utils.py: {error_indication or error_status.prettyPrint()}")
+
+        if self.health is not None:
+            rtts = self._local.rtts
+            self.health.record_success(target_host, sum(rtts) / len(rtts) if rtts else None)
+
+        if self.usm_cache is not None and not from_cache:
+            entry = snmp_cache.harvest_engine(self.snmp_engine, transport_target, self.snmp_user)
+            if entry is not None:
+                self.usm_cache.put(target_host, self.credential_fingerprint, entry)
+                self._local.cached_hosts.add(target_host)
+
+        return payload
+
+_default_poller = None
+_default_poller_lock = threading.Lock()
+
+def get_default_poller() -> SnmpPoller:
+    """Returns the process-wide SnmpPoller, creating it on first use.
+
+    Returns:
+        SnmpPoller: Shared poller built from the environment's SNMP credentials.
+    """
+
+    global _default_poller
+
+    with _default_poller_lock:
+        if _default_poller is None:
+            _default_poller = SnmpPoller()
+        return _default_poller
+
+def get_snmp_data(target_host: str, oid: str, poller: SnmpPoller = None) -> str:
     """Basic SNMP function that collects the given OID from the given IP address.
 
     Args:
         target_host (str): IP address of the host you want to query.
         oid (str): Full OID you want to collect. 
+        poller (SnmpPoller, optional): Poller to send the request with. Defaults to the shared poller.
 
     Returns:
         str: OID value. 
     """
-    
-    load_dotenv()
-
-    snmp_engine = SnmpEngine()
-    snmp_user = UsmUserData(
-        userName=os.getenv("snmp_user"),
-        authKey=os.getenv("snmp_auth"),
-        privKey=os.getenv("snmp_priv"),
-        authProtocol=usmHMACSHAAuthProtocol,
-        privProtocol=usmAesCfb128Protocol,
-    )
-    
-    # Create SNMP request
-    error_indication, error_status, error_index, var_binds = next(
-        getCmd(
-            snmp_engine,
-            snmp_user,
-            UdpTransportTarget((target_host, 161)),
-            ContextData(),
-            ObjectType(ObjectIdentity(oid)),
-        )
-    )
-
-    # This print is helpful for figuring out the var_binds obj_types below.
-    # https://pysnmp.readthedocs.io/en/latest/docs/api-reference.html#pysnmp.proto.rfc1902.OctetString
-    # print(type(var_binds[0][1]))
-
-    # Check for errors
-    if isinstance(error_indication, pysnmp.proto.errind.RequestTimedOut):
-        raise err.RequestTimedOutError("SNMP request timed out")
-    if isinstance(error_indication, pysnmp.proto.errind.WrongDigest):
-        raise err.WrongSNMPDigest("SNMP Digest incorrect - possibly incorrect credentials")
-    if isinstance(var_binds[0][1], pysnmp.proto.rfc1905.NoSuchObject) or isinstance(var_binds[0][1], pysnmp.proto.rfc1905.NoSuchInstance):
-        raise err.WrongSNMPOid("Incorrect OID passed to device")
-    
-    # Extract and return the result
-    if isinstance(var_binds[0][1], pysnmp.proto.rfc1902.OctetString) or isinstance(var_binds[0][1], pysnmp.proto.rfc1902.TimeTicks):
-        return str(var_binds[0][1]) # pysnmp.proto.rfc1902.OctetString
-    else:
-        print(type(var_binds[0][1]))
-        raise err.OtherSNMPError("Unknown SNMP error, see snmp_utils.py")
\ No newline at end of file
+
+    return get_snmp_data_many(target_host, {oid: oid}, poller=poller)[oid]
+
+def get_snmp_data_many(target_host: str, oid_mapping: dict, poller: SnmpPoller = None) -> dict:
+    """Collects several OIDs from the given IP address with a single SNMP GET.
+
+    Args:
+        target_host (str): IP address of the host you want to query.
+        oid_mapping (dict): Maps caller-defined keys to the full OIDs you want to collect.
+        poller (SnmpPoller, optional): Poller to send the request with. Defaults to the shared poller.
+
+    Returns:
+        dict: Maps each key from oid_mapping to its OID value. See SnmpPoller.get for raised errors.
+    """
+
+    poller = poller or get_default_poller()
+
+    return poller.get(target_host, oid_mapping)
@@ -0,0 +1,15 @@
+"""Setup shared by the test modules: puts src/ and benchmarks/ on sys.path and builds test devices."""
+
+import os
+import sys
+
+REPO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(REPO_PATH, "src"))
+sys.path.insert(0, os.path.join(REPO_PATH, "benchmarks"))
+
+from utils.device_snapshot import DeviceSnapshot
+
+
+def make_device(number, **fields):
+    """Returns DeviceSnapshot test-sw<number> at 10.0.0.<number>, with any other fields given."""
+    return DeviceSnapshot(id=number, name=f"test-sw{number:02}", primary_ip4=f"10.0.0.{number}/24", **fields)
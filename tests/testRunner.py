@@ -1,9 +1,13 @@
 # tests/test_script1.py
+import os
 import unittest
 
+TESTS_PATH = os.path.dirname(os.path.abspath(__file__))
+
 def run_tests():
     test_loader = unittest.TestLoader()
-    test_suite = test_loader.discover('', pattern='test_*.py')
+    # Discovered from the repository root, so the tests can import the shared tests.helpers module
+    test_suite = test_loader.discover(TESTS_PATH, pattern='test_*.py', top_level_dir=os.path.dirname(TESTS_PATH))
     test_runner = unittest.TextTestRunner()
     return test_runner.run(test_suite)
 
@@ -0,0 +1,218 @@
+import asyncio
+import multiprocessing
+import os
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from tests.helpers import make_device
+
+import base_compliancy
+import error_handling.custom_errors as err
+import error_handling.error_reporting as err_report
+import fleet
+import snmp_fleet
+import standin_netbox
+from utils import netbox_utils, results_store
+
+FLEET_SIZE = 30
+
+
+class SlowCheck:
+    """Stands in for check_device: sleeps per device and records how many checks overlap."""
+
+    def __init__(self, seconds: dict):
+        self.seconds = seconds
+        self.lock = threading.Lock()
+        self.running = 0
+        self.most_running = 0
+
+    def __call__(self, device, *args):
+        with self.lock:
+            self.running += 1
+            self.most_running = max(self.most_running, self.running)
+        try:
+            time.sleep(self.seconds.get(device.id, 0.05))
+            return {"system_name": device.name}
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+class RunAsyncTestFunctions(unittest.TestCase):
+
+    def run_async(self, devices, check, **options):
+        with mock.patch.object(base_compliancy, "check_device", check):
+            return asyncio.run(base_compliancy.run_async(devices, api_token="token", url="https://netbox", **options))
+
+    def test_results_keep_device_order(self):
+        devices = [make_device(number) for number in range(1, 9)]
+        check = SlowCheck({number: 0.01 * (9 - number) for number in range(1, 9)})
+
+        results = self.run_async(devices, check, concurrency=4)
+
+        self.assertEqual([result["system_name"] for result in results], [device.name for device in devices])
+
+    def test_check_errors_are_returned_per_device(self):
+        devices = [make_device(number) for number in range(1, 4)]
+
+        def check(device, *args):
+            if device.id == 2:
+                raise err.DataError(message=f"ERROR: {device} - SNMP Timeout", error_type="SNMPTimeout", device=device)
+            return {"system_name": device.name}
+
+        results = self.run_async(devices, check, concurrency=2)
+
+        self.assertEqual(results[0], {"system_name": "test-sw01"})
+        self.assertEqual(results[1].error_type, "SNMPTimeout")
+        self.assertEqual(results[2], {"system_name": "test-sw03"})
+
+    def test_timeout_starts_when_the_check_starts(self):
+        # Device 1 overruns and keeps the only worker; the others must not time out while they wait
+        devices = [make_device(number) for number in range(1, 4)]
+        check = SlowCheck({1: 0.8, 2: 0.1, 3: 0.1})
+
+        results = self.run_async(devices, check, concurrency=1, device_timeout=0.3)
+
+        self.assertIsInstance(results[0], err.DataError)
+        self.assertEqual(results[0].error_type, "SNMPTimeout")
+        self.assertEqual(results[1:], [{"system_name": "test-sw02"}, {"system_name": "test-sw03"}])
+
+    def test_timed_out_checks_keep_their_slot(self):
+        devices = [make_device(number) for number in range(1, 11)]
+        check = SlowCheck({1: 0.5, 2: 0.5})
+
+        results = self.run_async(devices, check, concurrency=3, device_timeout=0.2)
+
+        self.assertEqual([result.error_type for result in results[:2]], ["SNMPTimeout", "SNMPTimeout"])
+        self.assertTrue(all(isinstance(result, dict) for result in results[2:]))
+        self.assertLessEqual(check.most_running, 3)
+
+    def test_timed_out_checks_finish_before_returning(self):
+        devices = [make_device(number) for number in range(1, 4)]
+        check = SlowCheck({1: 0.5})
+
+        results = self.run_async(devices, check, concurrency=3, device_timeout=0.1)
+
+        self.assertEqual(results[0].error_type, "SNMPTimeout")
+        self.assertEqual(check.running, 0)
+
+
+class CollectNbDevicesTestFunctions(unittest.TestCase):
+
+    def test_netbox_failure_is_raised_while_iterating(self):
+        # Nothing listens there; pages are only requested once the devices are read
+        devices = base_compliancy.collect_nb_devices(url="http://127.0.0.1:9", api_token="token", limit=5)
+
+        with self.assertRaises(err.DataError):
+            list(devices)
+
+    def test_stream_raises_producer_failure_after_draining(self):
+        checked = []
+
+        def devices():
+            yield make_device(1)
+            yield make_device(2)
+            raise err.DataError(message="ERROR: Netbox Request error.")
+
+        batch = mock.Mock()
+        with mock.patch.object(base_compliancy, "check_device", side_effect=lambda device, *args, **kwargs: checked.append(device.id)):
+            with self.assertRaises(err.DataError):
+                base_compliancy.run_stream(devices(), api_token="token", url="https://netbox", concurrency=2, batch=batch)
+
+        self.assertEqual(sorted(checked), [1, 2])
+        self.assertEqual(batch.add.call_count, 2)
+
+
+class FailedRunTestFunctions(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_netbox_failure_still_writes_metrics_and_closes_the_store(self):
+        metrics_path = os.path.join(self.tmp_dir.name, "metrics.json")
+        failure = err.DataError(message="ERROR: Netbox Request error.")
+
+        with mock.patch.object(netbox_utils, "load_devicetype_oid_index", side_effect=failure), \
+                mock.patch.object(err_report, "api_reporter", lambda DataError: None):
+            with self.assertRaises(SystemExit):
+                base_compliancy.main(
+                    "http://127.0.0.1:9",
+                    "token",
+                    metrics_json_path=metrics_path,
+                    results_db_path=os.path.join(self.tmp_dir.name, "results.db"),
+                )
+
+        self.assertTrue(os.path.exists(metrics_path))
+        self.assertIsNone(results_store._active)
+        self.assertIsNone(err_report._worker)
+
+    def test_unreachable_netbox_is_reported(self):
+        reported = []
+
+        # Nothing listens there: the device-type prefetch fails with a requests ConnectionError
+        with mock.patch.object(err_report, "api_reporter", reported.append):
+            with self.assertRaises(SystemExit):
+                base_compliancy.main("http://127.0.0.1:9", "token")
+
+        self.assertEqual([str(error) for error in reported], ["ERROR: Netbox Request error."])
+
+
+class MainTestFunctions(unittest.TestCase):
+    """Runs whole compliance checks against a stand-in Netbox and a simulated SNMP fleet (benchmarks/)."""
+
+    @classmethod
+    def setUpClass(cls):
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.bind(("127.0.0.1", 0))
+            cls.snmp_port = sock.getsockname()[1]
+        cls.options = snmp_fleet.FleetOptions(mismatch=0.2, no_such_oid=0.1)
+        cls.agent = multiprocessing.get_context("spawn").Process(target=snmp_fleet.serve, args=(cls.snmp_port, cls.options), daemon=True)
+        cls.agent.start()
+
+        cls.netbox = standin_netbox.StandInNetbox(0, FLEET_SIZE)
+        threading.Thread(target=cls.netbox.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.netbox.server_port}"
+        time.sleep(2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.agent.terminate()
+        cls.agent.join()
+        cls.netbox.shutdown()
+        cls.netbox.server_close()
+
+    def run_main(self, **options) -> list:
+        reported = []
+        credentials = {"snmp_user": fleet.SNMP_USER, "snmp_auth": fleet.SNMP_AUTH, "snmp_priv": fleet.SNMP_PRIV}
+        with mock.patch.dict(os.environ, credentials), mock.patch.object(err_report, "api_reporter", reported.append):
+            base_compliancy.main(
+                self.url,
+                "token",
+                snmp_port=self.snmp_port,
+                filters=netbox_utils.build_device_filters(roles=[fleet.ROLE]),
+                **options,
+            )
+        return sorted((error.device.id, error.error_type) for error in reported)
+
+    def test_every_mode_reports_the_injected_faults(self):
+        expected_types = {"mismatch": "SerialNumberMismatch", "no_such_oid": "SNMPBadOID"}
+        expected = sorted(
+            (number, expected_types[self.options.device_fault(number)])
+            for number in range(1, FLEET_SIZE + 1) if self.options.device_fault(number)
+        )
+        self.assertTrue(expected)
+
+        for mode in ("async", "sync", "stream"):
+            with self.subTest(mode=mode):
+                self.assertEqual(self.run_main(mode=mode, concurrency=5), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
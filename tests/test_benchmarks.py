@@ -0,0 +1,31 @@
+import os
+import shutil
+import subprocess
+import unittest
+
+from tests import helpers
+
+import run_benchmarks
+
+
+def working_tree_status():
+    return subprocess.run(
+        ["git", "status", "--porcelain", "--untracked-files=all"],
+        cwd=helpers.REPO_PATH, capture_output=True, text=True, check=True,
+    ).stdout
+
+
+@unittest.skipUnless(shutil.which("git") and os.path.isdir(os.path.join(helpers.REPO_PATH, ".git")), "needs a git checkout")
+class BenchmarksTestFunctions(unittest.TestCase):
+
+    def test_benchmark_leaves_working_tree_clean(self):
+        before = working_tree_status()
+
+        result = run_benchmarks.run_benchmark("ssh_config", 20)
+
+        self.assertGreater(result["http_requests"], 0)
+        self.assertEqual(working_tree_status(), before)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from tests import helpers  # noqa: F401 - puts src/ and benchmarks/ on sys.path
+
+import base_compliancy
+import compliance_daemon
+import error_handling.error_reporting as err_report
+import fleet
+import standin_netbox
+from utils import netbox_utils
+
+FLEET_SIZE = 30
+INTERVAL = 900
+
+
+class ComplianceDaemonTestFunctions(unittest.TestCase):
+    """Runs the daemon's refreshes against a stand-in Netbox (benchmarks/standin_netbox.py)."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.netbox = standin_netbox.StandInNetbox(0, FLEET_SIZE)
+        threading.Thread(target=cls.netbox.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.netbox.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.netbox.shutdown()
+        cls.netbox.server_close()
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.reported = []
+        patcher = mock.patch.object(err_report, "api_reporter", self.reported.append)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        netbox_utils._devicetype_oid_indexes.clear()
+        self.tmp_dir.cleanup()
+
+    def make_daemon(self, url=None, **options):
+        return compliance_daemon.ComplianceDaemon(
+            url=url or self.url,
+            api_token="token",
+            state_path=os.path.join(self.tmp_dir.name, "state.jsonl"),
+            filters=netbox_utils.build_device_filters(roles=[fleet.ROLE]),
+            interval=INTERVAL,
+            jitter=0,
+            **options,
+        )
+
+    def test_refresh_schedules_every_device_once_per_interval(self):
+        daemon = self.make_daemon()
+        start = 10 * INTERVAL
+
+        daemon.refresh_inventory(now=start)
+
+        self.assertEqual(daemon.status()["devices"], FLEET_SIZE)
+        self.assertEqual(daemon._devices[1].model, fleet.MODELS[fleet.model_id(1) - 1])
+        self.assertEqual(daemon.scheduler.pop_due(start), [])
+        first_half = daemon.scheduler.pop_due(start + INTERVAL / 2)
+        second_half = daemon.scheduler.pop_due(start + INTERVAL)
+        self.assertEqual(sorted(first_half + second_half), list(range(1, FLEET_SIZE + 1)))
+        self.assertLess(abs(len(first_half) - len(second_half)), 4)
+
+    def test_run_checks_every_device(self):
+        daemon = self.make_daemon()
+        daemon.scheduler.interval = 1
+        checked = []
+        stop = threading.Event()
+
+        with mock.patch.object(base_compliancy, "check_device", side_effect=lambda device, *args, **kwargs: checked.append(device.id)), \
+                mock.patch.object(base_compliancy, "compare_data"):
+            runner = threading.Thread(target=daemon.run, args=(stop,))
+            runner.start()
+            stop.wait(2.5)
+            stop.set()
+            runner.join()
+
+        self.assertEqual(set(checked), set(range(1, FLEET_SIZE + 1)))
+        self.assertEqual(len(daemon.results()), FLEET_SIZE)
+        self.assertTrue(all(result["compliant"] for result in daemon.results()))
+
+    def test_limit_selects_at_most_limit_devices(self):
+        daemon = self.make_daemon(limit=5)
+
+        daemon.refresh_inventory(now=1000)
+        daemon.refresh_inventory(now=1300)
+
+        self.assertEqual(sorted(daemon._devices), [1, 2, 3, 4, 5])
+        self.assertEqual(len(daemon.scheduler), 5)
+
+    def test_refresh_failure_keeps_previous_inventory(self):
+        daemon = self.make_daemon()
+        daemon.refresh_inventory(now=1000)
+        devices = daemon._devices
+
+        # Nothing listens there: the request fails with a requests ConnectionError
+        daemon.url = "http://127.0.0.1:9"
+        daemon.refresh_inventory(now=1300)
+
+        self.assertIs(daemon._devices, devices)
+        self.assertEqual(daemon.status()["inventory_refreshed_at"], 1000)
+        self.assertEqual([error.error_type for error in self.reported], [""])
+
+    def test_refresh_reloads_devicetype_index(self):
+        daemon = self.make_daemon()
+        daemon.refresh_inventory(now=1000)
+        index = netbox_utils.load_devicetype_oid_index(api_token="token", url=self.url)
+        index["validated"][fleet.MODELS[0]] = False
+
+        daemon.refresh_inventory(now=1300)
+
+        reloaded = netbox_utils.load_devicetype_oid_index(api_token="token", url=self.url)
+        self.assertIsNot(reloaded, index)
+        self.assertEqual(reloaded["validated"], {})
+
+    def test_unexpected_check_failure_is_reported(self):
+        daemon = self.make_daemon()
+        daemon.refresh_inventory(now=1000)
+        device = daemon._devices[1]
+
+        with mock.patch.object(base_compliancy, "check_device", side_effect=RuntimeError("boom")):
+            result = daemon.check(device)
+
+        self.assertFalse(result["compliant"])
+        self.assertEqual([error["type"] for error in result["errors"]], ["CheckFailed"])
+        self.assertEqual([error.error_type for error in self.reported], ["CheckFailed"])
+        self.assertEqual(daemon.status()["in_flight"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+
+from tests import helpers
+
+import error_handling.custom_errors as err
+from utils import compliance_rules
+
+
+def make_device(number, serial="SN1"):
+    return helpers.make_device(number, serial=serial, model="C9300-48P", platform="17.9.4")
+
+
+def make_live_row(number, serial="SN1", uptime="100"):
+    return {
+        "serial_number": serial,
+        "system_name": f"test-sw{number:02}.domain",
+        "hardware_model": "C9300-48P ",
+        "sw_version": "17.9.4",
+        "sys_uptime": uptime,
+    }
+
+
+class ComplianceRulesTestFunctions(unittest.TestCase):
+
+    def setUp(self):
+        self.rules = compliance_rules.load_rules()
+
+    def test_compliant_devices(self):
+        devices = [make_device(n) for n in range(1, 4)]
+        live_rows = [make_live_row(n) for n in range(1, 4)]
+
+        self.assertEqual(compliance_rules.evaluate(self.rules, devices, live_rows), [[], [], []])
+
+    def test_every_violation_is_found(self):
+        devices = [make_device(1), make_device(2, serial=None)]
+        live_rows = [make_live_row(1, serial="SN2", uptime="3153600001"), make_live_row(2)]
+
+        violations = compliance_rules.evaluate(self.rules, devices, live_rows)
+
+        self.assertEqual([rule.name for rule, _, _ in violations[0]], ["SerialNumberMismatch", "LongUptime"])
+        self.assertIn("MissingDataSerialNumber", [rule.name for rule, _, _ in violations[1]])
+
+    def test_live_rules_skipped_without_live_data(self):
+        violations = compliance_rules.evaluate(self.rules, [make_device(1, serial=None)])
+
+        self.assertEqual([rule.name for rule, _, _ in violations[0]], ["MissingDataSerialNumber"])
+
+    def test_rule_from_config_only(self):
+        rule = compliance_rules.Rule(
+            {"name": "LegacySoftware", "live_field": "sw_version", "comparator": "regex", "expected": r"^17\."}
+        )
+
+        violations = compliance_rules.evaluate([rule], [make_device(1)], [{"sw_version": "16.12.4"}])
+
+        self.assertEqual(violations, [[(rule, "16.12.4", r"^17\.")]])
+
+    def test_invalid_rule_is_rejected(self):
+        with self.assertRaises(err.DataError):
+            compliance_rules.Rule({"name": "Broken", "live_field": "sw_version", "comparator": "roughly"})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+
+from tests import helpers  # noqa: F401 - puts src/ and benchmarks/ on sys.path
+
+from utils import device_scheduler
+
+
+class DeviceSchedulerTestFunctions(unittest.TestCase):
+
+    def test_polls_spread_evenly_over_interval(self):
+        scheduler = device_scheduler.DeviceScheduler(interval=600, jitter=0.05, seed=1)
+        for device_id in range(1, 1001):
+            scheduler.add(device_id, now=0)
+
+        per_minute = [len(scheduler.pop_due(minute * 60)) for minute in range(1, 11)]
+
+        # 1000 devices over 10 minutes: about 100 per minute, never a burst
+        self.assertTrue(all(80 <= count <= 120 for count in per_minute[1:-1]), per_minute)
+
+    def test_each_device_polled_once_per_interval(self):
+        scheduler = device_scheduler.DeviceScheduler(interval=100, jitter=0.1, seed=1)
+        for device_id in range(1, 51):
+            scheduler.add(device_id, now=0)
+
+        polls = {}
+        for second in range(0, 1000):
+            for device_id in scheduler.pop_due(second):
+                polls.setdefault(device_id, []).append(second)
+
+        for times in polls.values():
+            gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+            # Jitter moves single polls by up to 10s, but never accumulates
+            self.assertTrue(all(80 <= gap <= 120 for gap in gaps), gaps)
+            self.assertLessEqual(abs(times[-1] - times[0] - 100 * (len(times) - 1)), 20)
+
+    def test_slots_survive_restart(self):
+        first = device_scheduler.DeviceScheduler(interval=300, jitter=0)
+        second = device_scheduler.DeviceScheduler(interval=300, jitter=0)
+        first.add(42, now=1000)
+        second.add(42, now=5000)
+
+        self.assertAlmostEqual(first.next_due() % 300, second.next_due() % 300)
+
+    def test_removed_device_not_polled(self):
+        scheduler = device_scheduler.DeviceScheduler(interval=60, jitter=0)
+        scheduler.add(1, now=0)
+        scheduler.add(2, now=0)
+        scheduler.remove(1)
+
+        self.assertEqual(scheduler.pop_due(60), [2])
+        self.assertNotIn(1, scheduler)
+
+    def test_late_device_polled_once(self):
+        scheduler = device_scheduler.DeviceScheduler(interval=60, jitter=0)
+        scheduler.add(7, now=0)
+
+        self.assertEqual(scheduler.pop_due(1000), [7])
+        self.assertEqual(scheduler.pop_due(1000), [])
+        self.assertGreater(scheduler.next_due(), 1000)
+
+
+if __name__ == "__main__":
+    unittest.main()
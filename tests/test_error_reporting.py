@@ -0,0 +1,110 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+from tests import helpers  # noqa: F401 - puts src/ and benchmarks/ on sys.path
+
+import error_handling.custom_errors as err
+import error_handling.error_reporting as err_report
+
+
+def make_error(number):
+    return err.DataError(message=f"ERROR: test-sw{number:02} - SNMP Timeout", error_type="SNMPTimeout")
+
+
+def make_device_error(number, error_type="SNMPBadDigest"):
+    return err.DataError(
+        message=f"ERROR: test-sw{number:02} - SNMP Wrong Digest, check credentials (10.0.0.{number})",
+        error_type=error_type,
+        device=f"test-sw{number:02}",
+    )
+
+
+class ErrorReportingTestFunctions(unittest.TestCase):
+
+    def setUp(self):
+        self.batches = []
+
+    def tearDown(self):
+        err_report.stop_worker()
+
+    def test_reports_are_batched_and_drained(self):
+        with mock.patch.object(err_report, "api_reporter_batch", self.batches.append):
+            err_report.start_worker(batch_size=3, flush_interval=60)
+            for number in range(7):
+                err_report.log_parser(make_error(number))
+            err_report.stop_worker()
+
+        self.assertEqual([len(batch) for batch in self.batches], [3, 3, 1])
+
+    def test_partial_batch_flushed_after_interval(self):
+        with mock.patch.object(err_report, "api_reporter_batch", self.batches.append):
+            err_report.start_worker(batch_size=100, flush_interval=0.05)
+            err_report.log_parser(make_error(1))
+            time.sleep(0.5)
+
+            self.assertEqual(len(self.batches), 1)
+
+    def test_slow_reporter_does_not_block_caller(self):
+        release = threading.Event()
+        with mock.patch.object(err_report, "api_reporter_batch", lambda batch: release.wait(5)):
+            err_report.start_worker(batch_size=1)
+            started = time.monotonic()
+            for number in range(20):
+                err_report.log_parser(make_error(number))
+
+            self.assertLess(time.monotonic() - started, 1)
+            release.set()
+
+    def test_failed_send_is_retried(self):
+        attempts = []
+
+        def flaky(batch):
+            attempts.append(batch)
+            if len(attempts) < 3:
+                raise ConnectionError("destination unavailable")
+
+        with mock.patch.object(err_report, "api_reporter_batch", flaky):
+            err_report.start_worker(batch_size=1, retry_delay=0.01)
+            err_report.log_parser(make_error(1))
+            err_report.stop_worker()
+
+        self.assertEqual(len(attempts), 3)
+
+    def test_retry_skips_delivered_reports(self):
+        delivered = []
+
+        def flaky(DataError):
+            if len(delivered) == 2 and not getattr(flaky, "failed", False):
+                flaky.failed = True
+                raise ConnectionError("destination unavailable")
+            delivered.append(str(DataError))
+
+        with mock.patch.object(err_report, "api_reporter", flaky):
+            err_report.start_worker(batch_size=5, flush_interval=60, retry_delay=0.01)
+            for number in range(5):
+                err_report.log_parser(make_error(number))
+            err_report.stop_worker()
+
+        self.assertEqual(delivered, [str(make_error(number)) for number in range(5)])
+
+    def test_repeats_are_collapsed(self):
+        with mock.patch.object(err_report, "api_reporter_batch", self.batches.append):
+            err_report.start_worker(aggregate_window=60, aggregate_samples=2)
+            for number in range(1000):
+                err_report.log_parser(make_device_error(number))
+            err_report.log_parser(make_device_error(1, error_type="SNMPTimeout"))
+            err_report.stop_worker()
+
+        reports = [report for batch in self.batches for report in batch]
+        self.assertEqual(len(reports), 2)
+        self.assertIsInstance(reports[0], err.AggregatedDataError)
+        self.assertEqual(reports[0].count, 1000)
+        self.assertEqual(len(reports[0].devices), 1000)
+        self.assertEqual([str(sample.device) for sample in reports[0].samples], ["test-sw998", "test-sw999"])
+        self.assertNotIsInstance(reports[1], err.AggregatedDataError)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import os
+import stat
+import tempfile
+import unittest
+
+from tests import helpers  # noqa: F401 - puts src/ and benchmarks/ on sys.path
+
+from utils import file_utils
+
+
+class FileUtilsTestFunctions(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "out", "file.txt")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def read(self):
+        with open(self.path) as f:
+            return f.read()
+
+    def test_chunks_are_written_with_the_given_mode(self):
+        self.assertTrue(file_utils.write_atomic(self.path, iter(["a", "b", "c"]), mode=0o600))
+
+        self.assertEqual(self.read(), "abc")
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+
+    def test_declined_content_leaves_the_file_untouched(self):
+        file_utils.write_atomic(self.path, "old")
+
+        self.assertFalse(file_utils.write_atomic(self.path, "new", replace_if=lambda: False))
+        self.assertEqual(self.read(), "old")
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ["file.txt"])
+
+    def test_failed_write_removes_the_temporary_file(self):
+        file_utils.write_atomic(self.path, "old")
+
+        def chunks():
+            yield "partial"
+            raise ValueError("render failed")
+
+        with self.assertRaises(ValueError):
+            file_utils.write_atomic(self.path, chunks())
+        self.assertEqual(self.read(), "old")
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ["file.txt"])
+
+
+if __name__ == "__main__":
+    unittest.main()
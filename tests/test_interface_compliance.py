@@ -0,0 +1,77 @@
+import unittest
+
+from tests.helpers import make_device
+
+from utils import interface_compliance
+
+
+def netbox_interface(name, enabled=True, description="", speed=1000000, connected=True):
+    return {"name": name, "enabled": enabled, "description": description, "speed": speed, "type": "1000base-t", "connected": connected}
+
+
+def live_row(descr, name, admin_status=1, oper_status=1, speed=1000, alias="", if_type=6):
+    return {"descr": descr, "name": name, "type": if_type, "admin_status": admin_status, "oper_status": oper_status, "speed": speed, "alias": alias}
+
+
+class InterfaceComplianceTestFunctions(unittest.TestCase):
+
+    def setUp(self):
+        self.device = make_device(1)
+
+    def test_compliant_device_has_no_errors(self):
+        netbox = [netbox_interface("GigabitEthernet1/0/1", description="uplink")]
+        live = {1: live_row("GigabitEthernet1/0/1", "Gi1/0/1", alias="uplink")}
+
+        self.assertEqual(interface_compliance.evaluate(self.device, netbox, live), [])
+
+    def test_matches_short_names(self):
+        netbox = [netbox_interface("Gi1/0/1")]
+        live = {1: live_row("GigabitEthernet1/0/1", "Gi1/0/1")}
+
+        pairs, missing, unknown = interface_compliance.match_interfaces(netbox, live)
+
+        self.assertEqual(len(pairs), 1)
+        self.assertEqual((missing, unknown), ([], []))
+
+    def test_one_error_per_type_listing_every_interface(self):
+        netbox = [
+            netbox_interface("GigabitEthernet1/0/1", enabled=False),
+            netbox_interface("GigabitEthernet1/0/2", enabled=False),
+            netbox_interface("GigabitEthernet1/0/3", speed=10000000),
+            netbox_interface("GigabitEthernet1/0/4", description="printer"),
+            netbox_interface("GigabitEthernet1/0/5"),
+            netbox_interface("GigabitEthernet1/0/9"),
+        ]
+        live = {
+            1: live_row("GigabitEthernet1/0/1", "Gi1/0/1"),
+            2: live_row("GigabitEthernet1/0/2", "Gi1/0/2"),
+            3: live_row("GigabitEthernet1/0/3", "Gi1/0/3"),
+            4: live_row("GigabitEthernet1/0/4", "Gi1/0/4", alias="camera"),
+            5: live_row("GigabitEthernet1/0/5", "Gi1/0/5", oper_status=2),
+            6: live_row("GigabitEthernet1/0/6", "Gi1/0/6"),
+            7: live_row("Vlan10", "Vl10", if_type=53),
+        }
+
+        errors = {error.error_type: error for error in interface_compliance.evaluate(self.device, netbox, live)}
+
+        self.assertEqual(set(errors), {
+            "InterfaceAdminStatusMismatch", "InterfaceSpeedMismatch", "InterfaceDescriptionMismatch",
+            "InterfaceOperDown", "InterfaceMissing", "InterfaceNotInNetbox",
+        })
+        self.assertEqual(
+            [interface["name"] for interface in errors["InterfaceAdminStatusMismatch"].extra_data["interfaces"]],
+            ["GigabitEthernet1/0/1", "GigabitEthernet1/0/2"],
+        )
+        self.assertEqual(errors["InterfaceMissing"].extra_data["interfaces"], [{"name": "GigabitEthernet1/0/9"}])
+        # Only Ethernet ports are expected in Netbox, not SVIs
+        self.assertEqual(errors["InterfaceNotInNetbox"].extra_data["interfaces"], [{"name": "GigabitEthernet1/0/6"}])
+
+    def test_down_ports_skip_speed_and_uncabled_ports_may_be_down(self):
+        netbox = [netbox_interface("GigabitEthernet1/0/1", speed=100000, connected=False)]
+        live = {1: live_row("GigabitEthernet1/0/1", "Gi1/0/1", oper_status=2)}
+
+        self.assertEqual(interface_compliance.evaluate(self.device, netbox, live), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
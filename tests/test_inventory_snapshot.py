@@ -0,0 +1,97 @@
+import json
+import os
+import tempfile
+import unittest
+
+from tests import helpers  # noqa: F401 - puts src/ and benchmarks/ on sys.path
+
+import error_handling.custom_errors as err
+import openssh_config
+from utils import inventory_snapshot, netbox_utils
+from utils.netbox_graphql import GraphQLRecord
+
+
+OIDS = {
+    "snmp_hwmodel_oid": "1.3.6.1.2.1.47.1.1.1.1.13.1",
+    "snmp_sn_oid": "1.3.6.1.2.1.47.1.1.1.1.11.1",
+    "snmp_swversion_oid": "1.3.6.1.2.1.47.1.1.1.1.10.1",
+    "snmp_sysname_oid": "1.3.6.1.2.1.1.5.0",
+    "snmp_sysuptime_oid": "1.3.6.1.2.1.1.3.0",
+}
+
+
+def make_record(number, role="production-switches", tags=()):
+    return GraphQLRecord({
+        "id": str(number),
+        "name": f"test-sw{number:02}",
+        "serial": f"SN{number}",
+        "primary_ip4": {"id": str(number), "address": f"10.0.0.{number}/24"},
+        "device_type": {"id": "1", "model": "C9300-48P"},
+        "platform": {"id": "1", "name": "17.9.4"},
+        "status": "ACTIVE",
+        "role": {"slug": role},
+        "site": {"slug": "hq"},
+        "tenant": None,
+        "tags": [{"slug": tag} for tag in tags],
+    })
+
+
+class InventorySnapshotTestFunctions(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "inventory.jsonl.gz")
+
+        records = [
+            make_record(1),
+            make_record(2, tags=["core"]),
+            make_record(3, role="sw"),
+        ]
+        device_type = inventory_snapshot.device_type_entry(records[0].device_type, OIDS)
+        devices = [
+            inventory_snapshot.device_entry(record, dns_name=f"{record.name}.domain" if record.id != "2" else None)
+            for record in records
+        ]
+        inventory_snapshot.write_inventory(self.path, url="https://netbox", device_types=[device_type], devices=devices)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_round_trip(self):
+        devices = list(inventory_snapshot.read_inventory(self.path))
+
+        self.assertEqual([device.name for device in devices], ["test-sw01", "test-sw02", "test-sw03"])
+        self.assertEqual(devices[0].ip, "10.0.0.1")
+        self.assertEqual(devices[0].model, "C9300-48P")
+        self.assertEqual(devices[0].oids, OIDS)
+        self.assertIs(devices[0].oids, devices[1].oids)
+
+    def test_filters_apply_offline(self):
+        filters = netbox_utils.build_device_filters(roles=["production-switches"], tags=["core"])
+
+        devices = list(inventory_snapshot.read_inventory(self.path, filters=filters))
+
+        self.assertEqual([device.name for device in devices], ["test-sw02"])
+
+    def test_limit(self):
+        devices = list(inventory_snapshot.read_inventory(self.path, limit=2))
+
+        self.assertEqual(len(devices), 2)
+
+    def test_ssh_config_without_netbox(self):
+        devices = openssh_config.collect_nb_devices(url=None, api_token=None, snapshot_path=self.path)
+
+        dns_names = {str(device): device.dns_name for device in devices}
+        self.assertEqual(dns_names, {"test-sw01": "test-sw01.domain", "test-sw02": "FIX_ME_IN_NETBOX"})
+
+    def test_unknown_version_raises_data_error(self):
+        path = os.path.join(self.tmp_dir.name, "old.jsonl")
+        with open(path, "w") as f:
+            f.write(json.dumps({"format": inventory_snapshot.FORMAT_NAME, "version": 0}) + "\n")
+
+        with self.assertRaises(err.DataError):
+            inventory_snapshot.read_inventory(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from tests import helpers  # noqa: F401 - puts src/ and benchmarks/ on sys.path
+
+from utils import inventory_sync, netbox_utils
+
+
+class StandInEndpoint:
+    """Serves filter()/count() from an in-memory list, recording every call."""
+
+    def __init__(self, objects, calls):
+        self.objects = objects
+        self.calls = calls
+
+    def filter(self, **filters):
+        self.calls.append(filters)
+        objects = self.objects
+        if "id" in filters:
+            objects = [obj for obj in objects if obj.id in filters["id"]]
+        if "last_updated__gte" in filters:
+            objects = [obj for obj in objects if obj.last_updated >= filters["last_updated__gte"]]
+        return list(objects)
+
+    def count(self, **filters):
+        self.calls.append(filters)
+        return len(self.objects)
+
+
+def make_device(number, updated="2026-01-01"):
+    return SimpleNamespace(
+        id=number,
+        name=f"test-sw{number:02}",
+        serial=f"SN{number}",
+        primary_ip4=SimpleNamespace(id=number, address=f"10.0.0.{number}/24"),
+        device_type=SimpleNamespace(id=1, model="C9300-48P"),
+        platform=SimpleNamespace(id=1, name="17.9.4"),
+        virtual_chassis=None,
+        status=SimpleNamespace(value="active"),
+        last_updated=updated,
+    )
+
+
+def make_ip(number, updated="2026-01-01"):
+    return SimpleNamespace(id=number, dns_name=f"test-sw{number:02}.domain", last_updated=updated)
+
+
+class InventorySyncTestFunctions(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.state_path = os.path.join(self.tmp_dir.name, "state.jsonl")
+        self.filters = netbox_utils.build_device_filters(roles=["production-switches"])
+        self.calls = []
+
+        self.devices = [make_device(n) for n in range(1, 6)]
+        self.ips = [make_ip(n) for n in range(1, 6)]
+        self.nb = SimpleNamespace(
+            dcim=SimpleNamespace(
+                devices=StandInEndpoint(self.devices, self.calls),
+                virtual_chassis=StandInEndpoint([], self.calls),
+            ),
+            ipam=SimpleNamespace(ip_addresses=StandInEndpoint(self.ips, self.calls)),
+        )
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def sync(self):
+        self.calls.clear()
+        entries, changed = inventory_sync.sync_inventory(
+            self.nb, url="https://netbox", state_path=self.state_path, filters=self.filters
+        )
+        return {entry["name"]: entry["dns_name"] for entry in entries}, changed
+
+    def test_rerun_without_changes(self):
+        self.sync()
+
+        devices, changed = self.sync()
+
+        self.assertFalse(changed)
+        self.assertEqual(len(devices), 5)
+        self.assertTrue(all("last_updated__gte" in call or "id" in call or call == self.filters for call in self.calls))
+
+    def test_changed_device_and_dns_name(self):
+        self.sync()
+        self.devices[0].name = "renamed-sw01"
+        self.devices[0].last_updated = "2026-02-01"
+        self.ips[2].dns_name = "moved.domain"
+        self.ips[2].last_updated = "2026-02-01"
+
+        devices, changed = self.sync()
+
+        self.assertTrue(changed)
+        self.assertIn("renamed-sw01", devices)
+        self.assertEqual(devices["test-sw03"], "moved.domain")
+
+    def test_deleted_device(self):
+        self.sync()
+        del self.devices[4]
+
+        devices, changed = self.sync()
+
+        self.assertTrue(changed)
+        self.assertNotIn("test-sw05", devices)
+
+    def test_different_selection_does_full_pull(self):
+        self.sync()
+        self.filters = netbox_utils.build_device_filters(roles=["production-routers"])
+
+        self.sync()
+
+        self.assertNotIn("last_updated__gte", self.calls[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from tests import helpers  # noqa: F401 - puts src/ and benchmarks/ on sys.path
+
+import error_handling.custom_errors as err
+import openssh_config
+from utils import netbox_graphql, netbox_utils
+from utils.device_snapshot import DeviceSnapshot
+
+
+OIDS = {
+    "snmp_hwmodel_oid": "1.3.6.1.2.1.47.1.1.1.1.13.1",
+    "snmp_sn_oid": "1.3.6.1.2.1.47.1.1.1.1.11.1",
+    "snmp_swversion_oid": "1.3.6.1.2.1.47.1.1.1.1.10.1",
+    "snmp_sysname_oid": "1.3.6.1.2.1.1.5.0",
+    "snmp_sysuptime_oid": "1.3.6.1.2.1.1.3.0",
+}
+
+
+def make_device(number, vc_master=None):
+    return {
+        "id": str(number),
+        "name": f"test-sw{number:02}",
+        "serial": f"SN{number}",
+        "primary_ip4": {"id": str(number), "address": f"10.0.0.{number}/24", "dns_name": f"test-sw{number:02}.domain"},
+        "device_type": {"id": "1", "model": "C9300-48P", "custom_fields": OIDS},
+        "platform": {"id": "1", "name": "17.9.4"},
+        "virtual_chassis": vc_master and {"id": "1", "master": vc_master},
+    }
+
+
+class StandInNetbox(BaseHTTPRequestHandler):
+    """Answers Netbox GraphQL device_list queries from an in-memory list."""
+
+    devices = []
+    requests = []
+    errors = None
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        type(self).requests.append((self.path, self.headers["Authorization"], body))
+
+        if self.errors:
+            payload = {"data": None, "errors": self.errors}
+        else:
+            variables = body["variables"]
+            page = self.devices[variables["offset"]:variables["offset"] + variables["limit"]]
+            payload = {"data": {"device_list": page}}
+
+        data = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class NetboxGraphQLTestFunctions(unittest.TestCase):
+
+    def setUp(self):
+        master = make_device(1)
+        StandInNetbox.devices = [master] + [
+            make_device(2, vc_master={"id": "1", "name": master["name"], "primary_ip4": master["primary_ip4"]}),
+            make_device(3),
+            make_device(4),
+            make_device(5),
+        ]
+        StandInNetbox.requests = []
+        StandInNetbox.errors = None
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StandInNetbox)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_fetch_devices_paginates(self):
+        devices = netbox_graphql.fetch_devices(url=self.url, api_token="token", page_size=2)
+
+        self.assertEqual([str(device) for device in devices], [f"test-sw0{n}" for n in range(1, 6)])
+        self.assertEqual(len(StandInNetbox.requests), 3)
+        path, authorization, body = StandInNetbox.requests[-1]
+        self.assertEqual(path, "/graphql/")
+        self.assertEqual(authorization, "Token token")
+        self.assertEqual(body["variables"]["offset"], 4)
+
+    def test_iter_devices_fetches_pages_as_consumed(self):
+        devices = netbox_graphql.iter_devices(url=self.url, api_token="token", page_size=2)
+
+        self.assertEqual(str(next(devices)), "test-sw01")
+        self.assertEqual(len(StandInNetbox.requests), 1)
+        self.assertEqual([str(device) for device in devices], [f"test-sw0{n}" for n in range(2, 6)])
+        self.assertEqual(len(StandInNetbox.requests), 3)
+
+    def test_iter_devices_stops_at_limit(self):
+        devices = list(netbox_graphql.iter_devices(url=self.url, api_token="token", limit=3, page_size=2))
+
+        self.assertEqual([str(device) for device in devices], ["test-sw01", "test-sw02", "test-sw03"])
+        self.assertEqual(len(StandInNetbox.requests), 2)
+
+    def test_device_fields(self):
+        device = netbox_graphql.fetch_devices(url=self.url, api_token="token")[2]
+
+        self.assertEqual(str(device.primary_ip4).split("/")[0], "10.0.0.3")
+        self.assertEqual(device.serial, "SN3")
+        self.assertEqual(device.device_type.model, "C9300-48P")
+        self.assertEqual(device.platform.name, "17.9.4")
+
+    def test_devicetype_oids_need_no_extra_request(self):
+        device = netbox_graphql.fetch_devices(url=self.url, api_token="token")[0]
+
+        oids = netbox_utils.get_devicetype_oids(device.device_type, api_token="token", url=self.url)
+
+        self.assertEqual(oids, OIDS)
+        self.assertEqual(len(StandInNetbox.requests), 1)
+
+    def test_vc_member_uses_master_dns_name(self):
+        devices = openssh_config.collect_nb_devices(url=self.url, api_token="token", backend="graphql")
+
+        dns_names = {str(device): device.dns_name for device in devices}
+        self.assertEqual(dns_names["test-sw02"], "test-sw01.domain")
+        self.assertEqual(dns_names["test-sw03"], "test-sw03.domain")
+
+    def test_collect_returns_frozen_snapshots(self):
+        devices = openssh_config.collect_nb_devices(url=self.url, api_token="token", backend="graphql")
+        device = {str(device): device for device in devices}["test-sw03"]
+
+        self.assertIsInstance(device, DeviceSnapshot)
+        self.assertEqual((device.id, device.ip, device.model, device.platform), (3, "10.0.0.3", "C9300-48P", "17.9.4"))
+        with self.assertRaises(AttributeError):
+            device.dns_name = "other.domain"
+
+    def test_graphql_errors_raise_data_error(self):
+        StandInNetbox.errors = [{"message": "Cannot query field 'serial'"}]
+
+        with self.assertRaises(err.DataError):
+            netbox_graphql.fetch_devices(url=self.url, api_token="token")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from tests import helpers  # noqa: F401 - puts src/ and benchmarks/ on sys.path
+
+import fleet
+import standin_netbox
+from utils import netbox_utils
+
+FLEET_SIZE = 500
+
+
+class NetboxUtilsTestFunctions(unittest.TestCase):
+    """Queries a stand-in Netbox (benchmarks/standin_netbox.py) that counts the requests it answers."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.counters = {"requests": multiprocessing.Value("i", 0)}
+        cls.netbox = standin_netbox.StandInNetbox(0, FLEET_SIZE, cls.counters)
+        threading.Thread(target=cls.netbox.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.netbox.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.netbox.shutdown()
+        cls.netbox.server_close()
+
+    def setUp(self):
+        self.nb = netbox_utils.get_netbox_client(url=self.url, api_token="token")
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.counters["requests"].value = 0
+
+    def tearDown(self):
+        netbox_utils._devicetype_oid_indexes.clear()
+        self.tmp_dir.cleanup()
+
+    def requests_sent(self) -> int:
+        return self.counters["requests"].value
+
+    def test_records_by_id_take_one_request_per_chunk(self):
+        ids = list(range(1, 451)) + [1, None]
+
+        records = netbox_utils.get_records_by_id(self.nb.dcim.devices, ids, chunk_size=200)
+
+        self.assertEqual(sorted(records), list(range(1, 451)))
+        self.assertEqual(records[450].name, "bench-sw00450")
+        self.assertEqual(self.requests_sent(), 3)
+
+    def test_records_by_id_without_ids_sends_nothing(self):
+        self.assertEqual(netbox_utils.get_records_by_id(self.nb.dcim.devices, [None]), {})
+        self.assertEqual(self.requests_sent(), 0)
+
+    def test_devicetype_index_takes_one_request_and_serves_every_lookup(self):
+        devices = list(self.nb.dcim.devices.filter(id=list(range(1, 31)), limit=30))
+        self.counters["requests"].value = 0
+
+        index = netbox_utils.load_devicetype_oid_index(api_token="token", url=self.url)
+        for device in devices:
+            self.assertEqual(netbox_utils.get_devicetype_oids(device.device_type, api_token="token", url=self.url), fleet.OIDS)
+
+        self.assertEqual(sorted(index["by_model"]), sorted(fleet.MODELS))
+        self.assertEqual(self.requests_sent(), 1)
+
+    def test_devicetype_cache_file_skips_netbox_until_it_expires(self):
+        cache_path = os.path.join(self.tmp_dir.name, "devicetypes.json")
+        netbox_utils.load_devicetype_oid_index(api_token="token", url=self.url, cache_path=cache_path)
+        netbox_utils._devicetype_oid_indexes.clear()
+
+        index = netbox_utils.load_devicetype_oid_index(api_token="token", url=self.url, cache_path=cache_path)
+        self.assertEqual(self.requests_sent(), 1)
+        self.assertEqual(index["by_model"][fleet.MODELS[0]], fleet.OIDS)
+        self.assertEqual(os.listdir(self.tmp_dir.name), ["devicetypes.json"])
+
+        netbox_utils._devicetype_oid_indexes.clear()
+        netbox_utils.load_devicetype_oid_index(api_token="token", url=self.url, cache_path=cache_path, cache_ttl=0)
+        self.assertEqual(self.requests_sent(), 2)
+
+    def test_devicetype_cache_of_another_netbox_is_ignored(self):
+        cache_path = os.path.join(self.tmp_dir.name, "devicetypes.json")
+        with open(cache_path, "w") as f:
+            json.dump({"url": "https://other-netbox", "stored_at": 2e9, "device_types": []}, f)
+
+        index = netbox_utils.load_devicetype_oid_index(api_token="token", url=self.url, cache_path=cache_path)
+
+        self.assertEqual(len(index["by_id"]), len(fleet.MODELS))
+        self.assertEqual(self.requests_sent(), 1)
+
+    def test_missing_oids_are_reported_once_per_model(self):
+        oids = dict(fleet.OIDS, snmp_sn_oid=None)
+
+        with mock.patch("builtins.print") as printed:
+            for _ in range(3):
+                with self.assertRaises(AssertionError):
+                    netbox_utils.validate_devicetype_oids("C9300-48P", oids, url=self.url)
+            netbox_utils.validate_devicetype_oids("C9200L-24T", fleet.OIDS, url=self.url)
+
+        self.assertEqual(printed.call_count, 1)
+        self.assertIn("C9300-48P", printed.call_args[0][0])
+
+    def test_client_is_shared_per_netbox(self):
+        client = netbox_utils.get_netbox_client(url=self.url, api_token="token")
+
+        self.assertIs(client, self.nb)
+        self.assertIsNot(netbox_utils.get_netbox_client(url=self.url, api_token="token", threaded=True), client)
+        self.assertEqual(client.http_session.get_adapter(self.url)._pool_maxsize, 10)
+
+    def test_pages_reuse_one_connection(self):
+        with mock.patch.object(self.netbox, "process_request", wraps=self.netbox.process_request) as connections:
+            devices = list(netbox_utils.filter_devices(self.nb, {"role": [fleet.ROLE]}, page_size=50))
+
+        self.assertEqual(len(devices), FLEET_SIZE)
+        self.assertEqual(self.requests_sent(), FLEET_SIZE // 50)
+        self.assertLessEqual(connections.call_count, 1)
+
+    def test_populated_cert_bundle_is_verified_against(self):
+        certs_path = os.path.join(self.tmp_dir.name, "trusted-ssl-certs")
+        with open(certs_path, "w") as f:
+            f.write("-----BEGIN CERTIFICATE-----\n-----END CERTIFICATE-----\n")
+
+        with mock.patch.object(netbox_utils, "TRUSTED_CERTS_PATH", certs_path), \
+                mock.patch.dict(netbox_utils._netbox_clients, clear=True):
+            client = netbox_utils.get_netbox_client(url="https://netbox.example", api_token="token")
+
+        self.assertEqual(client.http_session.verify, certs_path)
+        # The checked-in placeholder leaves requests' default CA bundle in place
+        self.assertIs(self.nb.http_session.verify, True)
+
+    def test_selection_arguments_become_server_side_filters(self):
+        parser = argparse.ArgumentParser()
+        netbox_utils.add_device_selection_arguments(parser, default_roles=["production-switches"])
+        args = parser.parse_args(["-site", "hq", "branch", "-tag", "pci", "-name_regex", "^core-", "-limit", "5"])
+
+        filters = netbox_utils.build_device_filters(
+            roles=args.role, sites=args.site, tags=args.tag, tenants=args.tenant, name_regex=args.name_regex
+        )
+
+        self.assertEqual(filters, {
+            "status": ["active"],
+            "role": ["production-switches"],
+            "site": ["hq", "branch"],
+            "tag": ["pci"],
+            "name__regex": "^core-",
+        })
+        self.assertEqual(args.limit, 5)
+
+    def test_limit_fetches_a_single_short_page(self):
+        devices = list(netbox_utils.filter_devices(self.nb, {"role": [fleet.ROLE]}, limit=7, page_size=50))
+
+        self.assertEqual([device.id for device in devices], list(range(1, 8)))
+        self.assertEqual(self.requests_sent(), 1)
+
+    def test_selection_happens_server_side(self):
+        filters = netbox_utils.build_device_filters(roles=[fleet.ROLE], name_regex="^bench-sw0001[0-4]$")
+
+        devices = list(netbox_utils.filter_devices(self.nb, filters))
+
+        self.assertEqual([device.name for device in devices], [f"bench-sw0001{n}" for n in range(5)])
+        self.assertEqual(self.requests_sent(), 1)
+        self.assertEqual(list(netbox_utils.filter_devices(self.nb, netbox_utils.build_device_filters(sites=["elsewhere"]))), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import os
+import tempfile
+import unittest
+
+from tests import helpers
+
+import error_handling.custom_errors as err
+import openssh_config
+
+
+def make_devices(numbers):
+    return {
+        helpers.make_device(number, dns_name=f"test-sw{number:02}.domain")
+        for number in numbers
+    }
+
+
+class OpenSSHConfigTestFunctions(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "config")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_hosts_are_sorted(self):
+        ssh_conf = "".join(openssh_config.render_ssh_conf(make_devices([3, 1, 2]), ssh_user="admin.a"))
+
+        hosts = [line.split()[1] for line in ssh_conf.splitlines() if line.startswith("Host ")]
+        self.assertEqual(hosts, ["test-sw01", "test-sw02", "test-sw03"])
+
+    def test_unchanged_config_is_not_rewritten(self):
+        devices = make_devices(range(1, 20))
+        self.assertTrue(openssh_config.write_to_file(openssh_config.render_ssh_conf(devices, "admin.a"), self.path))
+        inode = os.stat(self.path).st_ino
+
+        written = openssh_config.write_to_file(openssh_config.render_ssh_conf(set(devices), "admin.a"), self.path)
+
+        self.assertFalse(written)
+        self.assertEqual(os.stat(self.path).st_ino, inode)
+        self.assertEqual(os.listdir(self.tmp_dir.name), ["config"])
+
+    def test_changed_config_is_replaced(self):
+        openssh_config.write_to_file(openssh_config.render_ssh_conf(make_devices([1]), "admin.a"), self.path)
+
+        written = openssh_config.write_to_file(openssh_config.render_ssh_conf(make_devices([1, 2]), "admin.a"), self.path)
+
+        self.assertTrue(written)
+        with open(self.path) as f:
+            self.assertIn("HostName test-sw02.domain", f.read())
+
+    def test_one_config_per_user(self):
+        results = openssh_config.write_user_configs(
+            make_devices([1, 2]), ssh_users=["alice.a", "bob.a"], out_dir=self.tmp_dir.name, workers=2
+        )
+
+        self.assertEqual(results, {"alice.a": True, "bob.a": True})
+        for ssh_user in ("alice.a", "bob.a"):
+            with open(os.path.join(self.tmp_dir.name, ssh_user, "config")) as f:
+                ssh_conf = f.read()
+            self.assertEqual(ssh_conf.count(f"User {ssh_user}"), 2)
+            self.assertNotIn(openssh_config.SSH_USER_PLACEHOLDER, ssh_conf)
+
+    def test_unreachable_netbox_in_incremental_mode_raises_data_error(self):
+        # Nothing listens there: the request fails with a requests ConnectionError
+        with self.assertRaises(err.DataError):
+            openssh_config.collect_nb_devices_incremental(
+                url="http://127.0.0.1:9", api_token="token", state_path=os.path.join(self.tmp_dir.name, "state.jsonl"), ssh_user="admin.a"
+            )
+
+    def test_unsafe_username_is_rejected(self):
+        with self.assertRaises(ValueError):
+            openssh_config.user_config_path(self.tmp_dir.name, "../admin.a")
+
+
+if __name__ == '__main__':
+    unittest.main()
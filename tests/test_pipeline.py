@@ -0,0 +1,95 @@
+import threading
+import time
+import unittest
+
+from tests import helpers  # noqa: F401 - puts src/ and benchmarks/ on sys.path
+
+from utils import pipeline
+
+
+class CountingSource:
+    """Yields 0..total-1, counting how many items were pulled, and optionally fails after `fail_after`."""
+
+    def __init__(self, total: int, fail_after: int = None):
+        self.total = total
+        self.fail_after = fail_after
+        self.produced = 0
+
+    def __iter__(self):
+        for item in range(self.total):
+            if item == self.fail_after:
+                raise ValueError("page request failed")
+            self.produced += 1
+            yield item
+
+
+class PipelineTestFunctions(unittest.TestCase):
+
+    def test_every_item_reaches_the_sink(self):
+        outcomes = []
+
+        pipeline.run_pipeline(
+            source=range(100), worker=lambda item: item * 2, sink=lambda *outcome: outcomes.append(outcome), workers=4, queue_size=5
+        )
+
+        self.assertEqual(sorted(outcomes), [(item, item * 2, None) for item in range(100)])
+
+    def test_worker_errors_go_to_the_sink(self):
+        outcomes = []
+
+        def worker(item):
+            if item == 3:
+                raise ValueError("poll failed")
+            return item
+
+        pipeline.run_pipeline(source=range(5), worker=worker, sink=lambda *outcome: outcomes.append(outcome), workers=2)
+
+        failed = [(item, str(exception)) for item, _, exception in outcomes if exception is not None]
+        self.assertEqual(failed, [(3, "poll failed")])
+        self.assertEqual(len(outcomes), 5)
+
+    def test_slow_sink_pushes_back_on_the_producer(self):
+        source = CountingSource(1000)
+        release = threading.Event()
+        sunk = []
+
+        def sink(item, result, exception):
+            release.wait()
+            sunk.append(item)
+
+        runner = threading.Thread(
+            target=pipeline.run_pipeline, kwargs={"source": source, "worker": lambda item: item, "sink": sink, "workers": 1, "queue_size": 2}
+        )
+        runner.start()
+        time.sleep(0.3)
+
+        # Two queues of 2, one item per worker, sink and blocked producer
+        self.assertLessEqual(source.produced, 8)
+        release.set()
+        runner.join()
+        self.assertEqual(len(sunk), 1000)
+
+    def test_producer_error_is_raised_after_draining(self):
+        source = CountingSource(10, fail_after=4)
+        sunk = []
+
+        with self.assertRaises(ValueError):
+            pipeline.run_pipeline(source=source, worker=lambda item: item, sink=lambda item, *_: sunk.append(item), workers=2)
+
+        self.assertEqual(sorted(sunk), [0, 1, 2, 3])
+
+    def test_sink_error_stops_the_producer(self):
+        source = CountingSource(10000)
+
+        def sink(item, result, exception):
+            raise RuntimeError("compare failed")
+
+        with self.assertRaises(RuntimeError):
+            pipeline.run_pipeline(source=source, worker=lambda item: item, sink=sink, workers=2, queue_size=2)
+
+        time.sleep(0.2)
+        self.assertLess(source.produced, 100)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import os
+import tempfile
+import unittest
+
+from tests.helpers import make_device
+
+import error_handling.custom_errors as err
+from utils import results_store
+
+
+def make_error(device, error_type):
+    return err.DataError(message=f"ERROR: {device} - {error_type}", error_type=error_type, device=device)
+
+
+class ResultsStoreTestFunctions(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "results.db")
+        self.devices = [make_device(number) for number in range(1, 4)]
+
+    def tearDown(self):
+        results_store.disable(finish=False)
+        self.tmp_dir.cleanup()
+
+    def run_once(self, outcomes, changes_only=True, selection=None):
+        """Records one run; outcomes maps device number to its error types, None for a failed poll."""
+        recorder = results_store.enable(self.path, url="https://netbox", selection=selection or {"role": ["sw"]}, changes_only=changes_only)
+        reported = []
+        for device in self.devices:
+            error_types = outcomes.get(device.id, [])
+            errors = [make_error(device, error_type) for error_type in error_types or ["SNMPTimeout"]] if error_types is None or error_types else None
+            live_data = None if error_types is None else {"serial_number": "SN"}
+            with results_store.timer(device):
+                pass
+            reported += results_store.record(device, live_data, errors)
+        reported += results_store.disable()
+        return recorder.run_id, [(error.device.id, error.error_type) for error in reported]
+
+    def test_without_store_everything_is_reported(self):
+        device = self.devices[0]
+        errors = [make_error(device, "SerialNumberMismatch")]
+
+        self.assertEqual(results_store.record(device, {}, errors), errors)
+
+    def test_changes_only_reports_new_and_resolved(self):
+        _, first = self.run_once({1: ["SerialNumberMismatch"], 2: ["HostnameMismatch"]})
+        _, second = self.run_once({1: ["SerialNumberMismatch"], 3: ["LongUptime"]})
+
+        self.assertEqual(first, [(1, "SerialNumberMismatch"), (2, "HostnameMismatch")])
+        self.assertEqual(second, [(3, "LongUptime"), (2, "ViolationResolved")])
+
+    def test_changed_message_is_a_new_violation(self):
+        device = self.devices[0]
+        reported = []
+        for interface in ("Gi1/0/1", "Gi1/0/2"):
+            results_store.enable(self.path, url="https://netbox", selection={"role": ["sw"]}, changes_only=True)
+            error = err.DataError(message=f"ERROR: {device} - {interface} is down", error_type="InterfaceDown", device=device)
+            reported.append(results_store.record(device, {"serial_number": "SN"}, [error]) + results_store.disable())
+
+        self.assertEqual([str(error) for error in reported[1]][0], f"ERROR: {device} - Gi1/0/2 is down")
+        self.assertEqual([error.error_type for error in reported[1]], ["InterfaceDown", "ViolationResolved"])
+
+    def test_failed_poll_does_not_resolve(self):
+        self.run_once({1: ["SerialNumberMismatch"]})
+        _, second = self.run_once({1: None})
+
+        # The timeout is new; the mismatch may still be there
+        self.assertEqual(second, [(1, "SNMPTimeout")])
+
+    def test_other_selection_is_not_diffed(self):
+        self.run_once({1: ["SerialNumberMismatch"]})
+        _, other = self.run_once({1: ["SerialNumberMismatch"]}, selection={"role": ["router"]})
+
+        self.assertEqual(other, [(1, "SerialNumberMismatch")])
+
+    def test_queries_by_device_error_type_and_run(self):
+        first_run, _ = self.run_once({1: ["SerialNumberMismatch"], 2: ["HostnameMismatch"]}, changes_only=False)
+        second_run, _ = self.run_once({1: ["SerialNumberMismatch", "LongUptime"]}, changes_only=False)
+
+        store = results_store.ResultsStore(self.path)
+        try:
+            self.assertEqual([row["device"] for row in store.violations(error_type="SerialNumberMismatch")], ["test-sw01"])
+            self.assertEqual([row["error_type"] for row in store.violations(new_only=True)], ["LongUptime"])
+            self.assertEqual([row["error_type"] for row in store.violations(run_id=first_run, device="test-sw02")], ["HostnameMismatch"])
+            self.assertEqual([(row["device"], row["error_type"]) for row in store.resolved(second_run)], [("test-sw02", "HostnameMismatch")])
+            history = store.device_history("test-sw01")
+            self.assertEqual([row["run_id"] for row in history], [second_run, first_run])
+            self.assertIsNotNone(history[0]["seconds"])
+            self.assertEqual([(run["devices"], run["non_compliant"]) for run in store.runs()], [(3, 1), (3, 2)])
+        finally:
+            store.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import json
+import os
+import tempfile
+import unittest
+
+from tests import helpers  # noqa: F401 - puts src/ and benchmarks/ on sys.path
+
+from utils import run_metrics
+
+
+class RunMetricsTestFunctions(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        run_metrics.disable()
+        self.tmp_dir.cleanup()
+
+    def test_disabled_records_nothing(self):
+        items = [1, 2, 3]
+
+        self.assertIs(run_metrics.timer("snmp_get"), run_metrics.timer("compare"))
+        self.assertIs(run_metrics.timed_iter("netbox_fetch", items), items)
+        run_metrics.count("errors", "SNMPTimeout")
+
+    def test_summary(self):
+        metrics = run_metrics.enable(slowest=2)
+        metrics.observe("device", 0.3, device="test-sw01")
+        metrics.observe("device", 2.0, device="test-sw02")
+        metrics.observe("device", 0.1, device="test-sw03")
+        run_metrics.count("errors", "SNMPTimeout")
+        run_metrics.count("errors", "SNMPTimeout")
+        self.assertEqual(list(run_metrics.timed_iter("netbox_fetch", [1, 2])), [1, 2])
+
+        summary = metrics.summary()
+
+        self.assertEqual(summary["stages"]["device"]["count"], 3)
+        self.assertEqual(summary["stages"]["device"]["max"], 2.0)
+        self.assertEqual(summary["stages"]["device"]["buckets"]["0.5"], 1)
+        self.assertEqual(summary["stages"]["netbox_fetch"]["count"], 3)
+        self.assertEqual(summary["counters"], {"errors": {"SNMPTimeout": 2}})
+        self.assertEqual([row["device"] for row in summary["slowest_devices"]], ["test-sw02", "test-sw01"])
+
+    def test_exports(self):
+        metrics = run_metrics.enable()
+        metrics.observe("snmp_get", 0.02)
+        metrics.observe("snmp_get", 0.2)
+        json_path = os.path.join(self.tmp_dir.name, "run.json")
+        prom_path = os.path.join(self.tmp_dir.name, "compliance.prom")
+
+        metrics.write_json(json_path)
+        metrics.write_prometheus(prom_path)
+
+        with open(json_path) as f:
+            self.assertEqual(json.load(f)["stages"]["snmp_get"]["count"], 2)
+        with open(prom_path) as f:
+            lines = f.read().splitlines()
+        self.assertIn('netbox_compliance_stage_seconds_bucket{stage="snmp_get",le="0.025"} 1', lines)
+        self.assertIn('netbox_compliance_stage_seconds_bucket{stage="snmp_get",le="+Inf"} 2', lines)
+        self.assertIn('netbox_compliance_stage_seconds_count{stage="snmp_get"} 2', lines)
+
+
+if __name__ == '__main__':
+    unittest.main()
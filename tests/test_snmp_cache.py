@@ -0,0 +1,154 @@
+import multiprocessing
+import os
+import socket
+import stat
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from tests import helpers  # noqa: F401 - puts src/ and benchmarks/ on sys.path
+
+import fleet
+import snmp_fleet
+from utils import snmp_cache, snmp_utils
+
+
+def make_entry(stored_at=None):
+    return {
+        "engine_id": "80001f8880aabbccdd",
+        "boots": 3,
+        "time": 1000,
+        "stored_at": time.time() if stored_at is None else stored_at,
+        "auth_key": "00" * 20,
+        "priv_key": "11" * 16,
+    }
+
+
+class SnmpUsmCacheTestFunctions(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "snmp_cache.json")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_save_and_load_round_trip(self):
+        cache = snmp_cache.SnmpUsmCache(self.path)
+        cache.put("10.0.0.1", "fingerprint", make_entry())
+        cache.save()
+
+        reloaded = snmp_cache.SnmpUsmCache(self.path)
+
+        self.assertEqual(reloaded.get("10.0.0.1", "fingerprint")["engine_id"], "80001f8880aabbccdd")
+        self.assertIsNone(reloaded.get("10.0.0.1", "other-credentials"))
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+
+    def test_expired_entries_are_ignored_and_dropped(self):
+        cache = snmp_cache.SnmpUsmCache(self.path, ttl=60)
+        cache.put("10.0.0.1", "fingerprint", make_entry(stored_at=time.time() - 120))
+        cache.put("10.0.0.2", "fingerprint", make_entry())
+        cache.save()
+
+        reloaded = snmp_cache.SnmpUsmCache(self.path, ttl=60)
+
+        self.assertIsNone(reloaded.get("10.0.0.1", "fingerprint"))
+        self.assertEqual(list(reloaded._entries), ["10.0.0.2|fingerprint"])
+
+    def test_fingerprint_changes_with_credentials(self):
+        user = snmp_utils.SnmpUser("user", "authpassword", "privpassword", "sha", "aes")
+
+        self.assertNotEqual(
+            snmp_cache.SnmpUsmCache.credential_fingerprint(user),
+            snmp_cache.SnmpUsmCache.credential_fingerprint(user._replace(privKey="otherpassword")),
+        )
+
+    def test_unexpected_engine_layout_disables_cache(self):
+        poller = snmp_utils.SnmpPoller(
+            user="user", auth_key="authpassword", priv_key="privpassword", usm_cache=snmp_cache.SnmpUsmCache(self.path)
+        )
+
+        with mock.patch.object(snmp_cache, "_engine_id_cache", side_effect=AttributeError("moved")), \
+                mock.patch("builtins.print") as printed:
+            poller.snmp_engine
+
+        self.assertIsNone(poller.usm_cache)
+        self.assertIn("SNMPv3 cache is disabled", printed.call_args[0][0])
+
+
+class SnmpUsmCacheAgentTestFunctions(unittest.TestCase):
+    """Harvests, saves, loads and seeds agent state against a simulated agent (benchmarks/snmp_fleet.py)."""
+
+    @classmethod
+    def setUpClass(cls):
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.bind(("127.0.0.1", 0))
+            cls.port = sock.getsockname()[1]
+        cls.agent = multiprocessing.get_context("spawn").Process(
+            target=snmp_fleet.serve, args=(cls.port, snmp_fleet.FleetOptions()), daemon=True
+        )
+        cls.agent.start()
+        time.sleep(2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.agent.terminate()
+        cls.agent.join()
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "snmp_cache.json")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def make_poller(self):
+        """Returns a fresh poller on the cache file, and the list every PDU its engine sends is counted in."""
+        poller = snmp_utils.SnmpPoller(
+            user=fleet.SNMP_USER, auth_key=fleet.SNMP_AUTH, priv_key=fleet.SNMP_PRIV, port=self.port,
+            usm_cache=snmp_cache.SnmpUsmCache(self.path),
+        )
+        sent = []
+        poller.snmp_engine.observer.registerObserver(lambda *args: sent.append(args[1]), "rfc3412.sendPdu")
+        return poller, sent
+
+    def poll(self, poller, number):
+        snmp_data = poller.get(fleet.device_ip(number), dict(fleet.OIDS))
+        self.assertEqual(snmp_data["snmp_sysname_oid"], fleet.device_values(number)["snmp_sysname_oid"])
+
+    def test_cold_poll_discovers_the_engine(self):
+        poller, sent = self.make_poller()
+
+        self.poll(poller, 1)
+
+        # Engine-ID discovery and time synchronization go out before the request itself
+        self.assertGreater(len(sent), 1)
+
+    def test_seeded_poll_skips_discovery(self):
+        first, _ = self.make_poller()
+        self.poll(first, 1)
+        first.usm_cache.save()
+
+        second, sent = self.make_poller()
+        self.poll(second, 1)
+
+        self.assertEqual(len(sent), 1)
+        self.assertIsNotNone(second.usm_cache.get(fleet.device_ip(1), second.credential_fingerprint))
+
+    def test_stale_entry_is_rediscovered(self):
+        first, _ = self.make_poller()
+        self.poll(first, 1)
+        fingerprint = first.credential_fingerprint
+        entry = dict(first.usm_cache.get(fleet.device_ip(1), fingerprint), auth_key="00" * 20)
+        first.usm_cache.put(fleet.device_ip(1), fingerprint, entry)
+        first.usm_cache.save()
+
+        second, _ = self.make_poller()
+        self.poll(second, 1)
+
+        self.assertNotEqual(second.usm_cache.get(fleet.device_ip(1), fingerprint)["auth_key"], "00" * 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from tests import helpers  # noqa: F401 - puts src/ and benchmarks/ on sys.path
+
+from utils import snmp_health
+
+
+class SnmpHealthTestFunctions(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "health.json")
+        self.health = snmp_health.SnmpHealthTracker(self.path, max_timeout=8.0, retries=2)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_timeouts_follow_rtt(self):
+        for rtt in (0.2, 0.2, 0.2):
+            self.health.record_success("10.0.0.1", rtt)
+
+        timeouts = self.health.timeouts("10.0.0.1")
+
+        self.assertLess(timeouts[0], self.health.initial_timeout)
+        self.assertEqual(timeouts, [timeouts[0], timeouts[0] * 2, timeouts[0] * 4])
+
+    def test_backoff_is_capped(self):
+        self.health.record_success("10.0.0.1", 3.0)
+
+        self.assertEqual(self.health.timeouts("10.0.0.1")[-1], 8.0)
+
+    def test_repeated_failures_open_circuit(self):
+        self.health.record_failure("10.0.0.1")
+        self.assertEqual(self.health.state("10.0.0.1"), "closed")
+        self.assertEqual(len(self.health.timeouts("10.0.0.1")), 1)
+
+        self.health.record_failure("10.0.0.1")
+        self.assertEqual(self.health.state("10.0.0.1"), "open")
+
+        with mock.patch("time.time", return_value=self.health.retry_at("10.0.0.1") + 1):
+            self.assertEqual(self.health.state("10.0.0.1"), "half-open")
+
+    def test_state_survives_runs(self):
+        self.health.record_failure("10.0.0.1")
+        self.health.record_failure("10.0.0.1")
+        self.health.save()
+
+        reloaded = snmp_health.SnmpHealthTracker(self.path)
+
+        self.assertEqual(reloaded.state("10.0.0.1"), "open")
+        reloaded.record_success("10.0.0.1", 0.1)
+        self.assertEqual(reloaded.state("10.0.0.1"), "closed")
+
+
+if __name__ == '__main__':
+    unittest.main()
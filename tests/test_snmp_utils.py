@@ -0,0 +1,159 @@
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+from tests import helpers
+
+import error_handling.custom_errors as err
+import fleet
+import snmp_fleet
+from utils import snmp_health, snmp_utils
+
+# Seconds the simulated agent holds every packet
+AGENT_LATENCY = 0.1
+
+
+class SnmpUtilsTestFunctions(unittest.TestCase):
+
+    def test_parse_oid(self):
+        self.assertEqual(snmp_utils.parse_oid("1.3.6.1.2.1.1.5.0"), (1, 3, 6, 1, 2, 1, 1, 5, 0))
+        self.assertEqual(snmp_utils.parse_oid(".1.3.6.1.2.1.1.5.0"), (1, 3, 6, 1, 2, 1, 1, 5, 0))
+
+    def test_parse_oid_rejects_non_numeric_oids(self):
+        for oid in ("SNMPv2-MIB::sysName.0", "1.3.6.x.1", "1", "", None):
+            with self.assertRaises(ValueError):
+                snmp_utils.parse_oid(oid)
+
+    def test_bad_oid_is_reported_before_polling(self):
+        # Nothing listens on the port; a request would time out instead
+        poller = snmp_utils.SnmpPoller(user="user", auth_key="authpassword", priv_key="privpassword", port=9)
+
+        with self.assertRaises(err.WrongSNMPOid) as raised:
+            poller.get("127.0.0.1", {"serial_number": "1.3.6.1.2.1.47.1.1.1.1.11.1", "system_name": "sysName.0"})
+
+        self.assertEqual((raised.exception.oid_key, raised.exception.oid), ("system_name", "sysName.0"))
+
+    def test_import_defers_pysnmp(self):
+        code = "import sys; import base_compliancy; print(sorted(m for m in ('pysnmp', 'jinja2') if m in sys.modules))"
+        output = subprocess.run([sys.executable, "-c", code], cwd=os.path.join(helpers.REPO_PATH, "src"), capture_output=True, text=True, check=True).stdout
+
+        self.assertEqual(output.strip(), "[]")
+
+
+class SnmpPollerAgentTestFunctions(unittest.TestCase):
+    """Polls a simulated agent (benchmarks/snmp_fleet.py) over loopback."""
+
+    @classmethod
+    def setUpClass(cls):
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.bind(("127.0.0.1", 0))
+            cls.port = sock.getsockname()[1]
+        cls.agent = multiprocessing.get_context("spawn").Process(
+            target=snmp_fleet.serve, args=(cls.port, snmp_fleet.FleetOptions(latency=AGENT_LATENCY)), daemon=True
+        )
+        cls.agent.start()
+        time.sleep(2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.agent.terminate()
+        cls.agent.join()
+
+    def setUp(self):
+        self.health = snmp_health.SnmpHealthTracker()
+        self.poller = snmp_utils.SnmpPoller(
+            user=fleet.SNMP_USER, auth_key=fleet.SNMP_AUTH, priv_key=fleet.SNMP_PRIV, port=self.port, health=self.health
+        )
+
+    def test_cold_poll_samples_rtt_without_discovery(self):
+        host = fleet.device_ip(1)
+
+        snmp_data = self.poller.get(host, dict(fleet.OIDS))
+
+        self.assertEqual(snmp_data["snmp_sysname_oid"], fleet.device_values(1)["snmp_sysname_oid"])
+        entry = self.health._entries[host]
+        self.assertIsNotNone(entry["rttvar"])
+        # Engine discovery is a second round trip; the sample only covers the request itself
+        self.assertGreaterEqual(entry["srtt"], AGENT_LATENCY)
+        self.assertLess(entry["srtt"], 2 * AGENT_LATENCY)
+        self.assertLess(self.health.timeouts(host)[0], self.health.initial_timeout)
+
+    def count_sent_pdus(self) -> list:
+        sent = []
+        self.poller.snmp_engine.observer.registerObserver(lambda *args: sent.append(args[1]), "rfc3412.sendPdu")
+        return sent
+
+    def test_get_collects_every_oid_in_one_request(self):
+        host = fleet.device_ip(3)
+        self.poller.get(host, {"system_name": fleet.OIDS["snmp_sysname_oid"]})
+        sent = self.count_sent_pdus()
+
+        snmp_data = self.poller.get(host, dict(fleet.OIDS))
+
+        self.assertEqual(snmp_data, {key: str(value) for key, value in fleet.device_values(3).items()})
+        self.assertEqual(len(sent), 1)
+
+    def test_missing_oid_is_reported_for_its_key(self):
+        oids = dict(fleet.OIDS, sys_descr="1.3.6.1.2.1.1.1.0")
+
+        with self.assertRaises(err.WrongSNMPOid) as raised:
+            self.poller.get(fleet.device_ip(4), oids)
+
+        self.assertEqual((raised.exception.oid_key, raised.exception.oid), ("sys_descr", "1.3.6.1.2.1.1.1.0"))
+
+    def test_engine_and_credentials_are_reused_across_polls(self):
+        host = fleet.device_ip(5)
+        with mock.patch.object(snmp_utils, "load_dotenv") as load_dotenv:
+            poller = snmp_utils.SnmpPoller(port=self.port, user=fleet.SNMP_USER, auth_key=fleet.SNMP_AUTH, priv_key=fleet.SNMP_PRIV)
+            poller.get(host, dict(fleet.OIDS))
+            snmp_engine = poller.snmp_engine
+            sent = []
+            snmp_engine.observer.registerObserver(lambda *args: sent.append(args[1]), "rfc3412.sendPdu")
+
+            for _ in range(3):
+                poller.get(host, dict(fleet.OIDS))
+
+        self.assertIs(poller.snmp_engine, snmp_engine)
+        # Discovery and key localization happened once; every later poll is one request
+        self.assertEqual(len(sent), 3)
+        self.assertEqual(load_dotenv.call_count, 1)
+
+    def test_shared_poller_serves_concurrent_workers(self):
+        engines = {}
+        failures = []
+
+        def work(number):
+            try:
+                snmp_data = self.poller.get(fleet.device_ip(number), dict(fleet.OIDS))
+                self.assertEqual(snmp_data["snmp_sn_oid"], fleet.device_values(number)["snmp_sn_oid"])
+                engines[number] = self.poller.snmp_engine
+            except Exception as e:
+                failures.append(e)
+
+        workers = [threading.Thread(target=work, args=(number,)) for number in range(10, 14)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(failures, [])
+        # Each thread drives its own engine and dispatcher
+        self.assertEqual(len({id(snmp_engine) for snmp_engine in engines.values()}), 4)
+
+    def test_walk_samples_rtt(self):
+        host = fleet.device_ip(2)
+
+        table = self.poller.walk(host, snmp_utils.IF_TABLE_COLUMNS, max_repetitions=10)
+
+        self.assertEqual(len(table), fleet.PORTS)
+        self.assertLess(self.health._entries[host]["srtt"], 2 * AGENT_LATENCY)
+
+
+if __name__ == "__main__":
+    unittest.main()